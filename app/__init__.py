@@ -5,6 +5,11 @@ import calendar
 from flask import Flask
 from config import Config
 from .models import db, User, Facility, FacilityApp, CNSDFacility, ATCPersonnel
+from .instrumentation import init_instrumentation
+from .templating import init_templating
+from .compression import init_compression, compress_static_command
+from .reference import refresh_reference_version
+from .live import init_live, upgrade_change_event_table
 from flask_login import LoginManager
 
 # ... (fungsi month_name_filter tidak berubah) ...
@@ -34,18 +39,61 @@ def create_app(config_class=Config):
     login_manager.login_message_category = "warning"
 
     app.jinja_env.filters['month_name'] = month_name_filter
+    init_instrumentation(app)
+    init_templating(app)
+    init_compression(app)
+    init_live(app)
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return db.session.get(User, int(user_id))
 
     with app.app_context():
         from . import routes
         from . import auth
+        from . import api
+        from . import export
+        from . import importer
+        from . import synthetic
+        from . import benchmark
+        from . import querybudget
+        from . import archive
+        from . import sharding
+        from . import prefork
+        from . import personalpdf
+        from . import facilitystatus
+        from . import loadtest
+        from . import dutytime
+        from . import snapshot
+        from . import textstore
         app.register_blueprint(routes.main_bp)
         app.register_blueprint(auth.auth_bp)
+        app.register_blueprint(api.api_bp)
+        app.register_blueprint(export.export_bp)
+        app.cli.add_command(importer.import_logbooks_command)
+        app.cli.add_command(synthetic.seed_synthetic_command)
+        app.cli.add_command(benchmark.benchmark_command)
+        app.cli.add_command(querybudget.check_query_budgets_command)
+        app.cli.add_command(compress_static_command)
+        app.cli.add_command(archive.archive_logbooks_command)
+        app.cli.add_command(sharding.shard_cnsd_logbooks_command)
+        app.cli.add_command(prefork.memory_report_command)
+        app.cli.add_command(personalpdf.export_personal_logbooks_command)
+        app.cli.add_command(facilitystatus.compact_facility_statuses_command)
+        app.cli.add_command(loadtest.load_test_command)
+        app.cli.add_command(dutytime.duty_time_command)
+        app.cli.add_command(dutytime.rebuild_duty_intervals_command)
+        app.cli.add_command(snapshot.build_report_snapshots_command)
+        app.cli.add_command(textstore.dedupe_texts_command)
+        app.cli.add_command(textstore.migrate_texts_command)
         
         db.create_all()
+        upgrade_change_event_table(db.engine)
+        sharding.init_sharding(app)
+        textstore.init_text_store(app)
+        facilitystatus.init_facility_statuses()
+        dutytime.init_duty_intervals()
+        snapshot.init_report_snapshots(app)
 
         create_initial_users()
         seed_initial_data()
@@ -56,6 +104,7 @@ def create_app(config_class=Config):
         seed_adi_soemarmo_facilities()
         seed_tunggul_wulung_facilities()
         seed_atc_personnel()
+        refresh_reference_version(app)
 
         return app
 
@@ -0,0 +1,423 @@
+# app/api.py
+
+import base64
+import hashlib
+import json
+from datetime import datetime
+from functools import wraps
+
+import sqlalchemy as sa
+from flask import Blueprint, request, jsonify, current_app, session
+from flask_login import current_user
+from sqlalchemy.orm import selectinload
+
+from .models import (db, User, LogbookEntry, Facility, FacilityApp, CNSDLogbook, CNSDFacilityStatus)
+from .dutytime import duty_time_status
+from .compression import RequestTooLarge, decompress_request_body
+from .offlinesync import submit_batch
+from .archive import archives_in_range, archive_session, get_with_archive
+from .sharding import fan_out_all, get_from_shards
+from .shardrouting import use_cnsd_shard
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class APIError(Exception):
+    """Error yang dikembalikan ke klien API sebagai JSON."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+@api_bp.errorhandler(APIError)
+def handle_api_error(error):
+    return jsonify({'error': error.message}), error.status_code
+
+
+def api_auth_required(view):
+    """Mengizinkan pengguna yang sudah login atau klien dengan header X-API-Key yang valid."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if _is_api_key_request() or current_user.is_authenticated:
+            return view(*args, **kwargs)
+        raise APIError('Authentication required.', 401)
+    return wrapped
+
+
+def _is_api_key_request():
+    api_key = request.headers.get('X-API-Key')
+    return bool(api_key) and api_key in current_app.config['API_KEYS']
+
+
+# --- PARAMETER QUERY ---
+
+def _parse_date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise APIError(f"Invalid '{name}', expected YYYY-MM-DD.")
+
+
+def _parse_limit():
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    if limit is None or limit < 1:
+        raise APIError("Invalid 'limit'.")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def _parse_fields(available):
+    """Mengembalikan daftar field yang diminta lewat ?fields=a,b,c (default: semua)."""
+    fields_arg = request.args.get('fields')
+    if not fields_arg:
+        return list(available)
+    fields = [f.strip() for f in fields_arg.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in available]
+    if unknown:
+        raise APIError(f"Unknown fields: {', '.join(unknown)}.")
+    # 'id' selalu disertakan agar klien bisa mengidentifikasi setiap item
+    return ['id'] + [f for f in fields if f != 'id']
+
+
+def encode_cursor(log_date, log_id):
+    raw = f"{log_date.isoformat()}:{log_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date_str, id_str = base64.urlsafe_b64decode(padded.encode()).decode().split(':')
+        return datetime.strptime(date_str, '%Y-%m-%d').date(), int(id_str)
+    except (ValueError, UnicodeDecodeError):
+        raise APIError("Invalid 'cursor'.")
+
+
+def paginate_keyset(query, model, limit, archive_range=None, fan_out=False):
+    """Keyset pagination berurutan (log_date DESC, id DESC) berdasarkan ?cursor=.
+
+    Jika archive_range (start_date, end_date) diberikan, halaman yang belum penuh dilanjutkan ke arsip.
+    Dengan fan_out, halaman diambil dari setiap shard CNSD lalu digabung sesuai urutan yang sama.
+    """
+    cursor = request.args.get('cursor')
+    if cursor:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        query = query.filter(sa.or_(
+            model.log_date < cursor_date,
+            sa.and_(model.log_date == cursor_date, model.id < cursor_id)
+        ))
+    query = query.order_by(model.log_date.desc(), model.id.desc())
+    if fan_out:
+        rows = sorted(fan_out_all(query.limit(limit + 1)), key=lambda row: (row.log_date, row.id), reverse=True)
+        rows = rows[:limit + 1]
+    else:
+        rows = query.limit(limit + 1).all()
+    if archive_range is not None:
+        for archive in archives_in_range(*archive_range):
+            if len(rows) > limit:
+                break
+            with archive_session(archive) as session:
+                rows.extend(query.limit(limit + 1 - len(rows)).with_session(session).all())
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].log_date, rows[-1].id)
+    return rows, next_cursor
+
+
+# --- SERIALISASI ---
+
+def _facility_lookup():
+    """Memuat fasilitas TWR dan APP sekali per request untuk menghindari query per status."""
+    return {
+        'TWR': {f.id: f for f in Facility.query.all()},
+        'APP': {f.id: f for f in FacilityApp.query.all()},
+    }
+
+
+def _signature_flags(log, fields):
+    return {name: bool(getattr(log, name)) for name in fields}
+
+
+LOGBOOK_FIELDS = {
+    'id': (None, lambda log, ctx: log.id),
+    'logbook_type': (None, lambda log, ctx: log.logbook_type),
+    'log_date': (None, lambda log, ctx: log.log_date.isoformat()),
+    'shift': (None, lambda log, ctx: log.shift),
+    'notam': (None, lambda log, ctx: log.notam),
+    'created_at': (None, lambda log, ctx: log.created_at.isoformat() if log.created_at else None),
+    'created_by': (
+        lambda: selectinload(LogbookEntry.creator),
+        lambda log, ctx: log.creator.username if log.creator else None
+    ),
+    'personnel': (
+        lambda: selectinload(LogbookEntry.atc_on_duty_personnel),
+        lambda log, ctx: [p.name for p in log.atc_on_duty_personnel]
+    ),
+    'position_headers': (
+        lambda: selectinload(LogbookEntry.atc_position_header),
+        lambda log, ctx: [getattr(log.atc_position_header, f'header_{i}') for i in range(1, 7)]
+        if log.atc_position_header else []
+    ),
+    'positions': (
+        lambda: selectinload(LogbookEntry.atc_positions),
+        lambda log, ctx: [
+            {'position_name': pos.position_name,
+             'time_slots': [getattr(pos, f'time_slot_{i}') for i in range(1, 7)]}
+            for pos in log.atc_positions
+        ]
+    ),
+    'facility_statuses': (
+        lambda: selectinload(LogbookEntry.facility_status_history),
+        lambda log, ctx: [
+            {'facility_id': status.facility_id,
+             'facility_type': status.facility_type,
+             'facility_name': getattr(ctx['facilities'][status.facility_type].get(status.facility_id), 'name', None),
+             'condition': status.condition.value,
+             'notes': status.notes}
+            for status in log.facility_statuses
+        ]
+    ),
+    'operational_logs': (
+        lambda: selectinload(LogbookEntry.operational_logs),
+        lambda log, ctx: [
+            {'event_time': op.event_time.strftime('%H:%M'),
+             'description': op.description,
+             'remarks': op.remarks}
+            for op in log.operational_logs
+        ]
+    ),
+    'signatures': (None, lambda log, ctx: _signature_flags(
+        log, ['controller_signature_1', 'controller_signature_2', 'manager_signature'])),
+}
+
+CNSD_FIELDS = {
+    'id': (None, lambda log, ctx: log.id),
+    'airport': (None, lambda log, ctx: log.airport),
+    'log_date': (None, lambda log, ctx: log.log_date.isoformat()),
+    'shift': (None, lambda log, ctx: log.shift),
+    'created_at': (None, lambda log, ctx: log.created_at.isoformat() if log.created_at else None),
+    'created_by': (
+        lambda: selectinload(CNSDLogbook.user),
+        lambda log, ctx: log.user.username if log.user else None
+    ),
+    'personnel': (
+        lambda: selectinload(CNSDLogbook.personnel),
+        lambda log, ctx: [{'name': p.name, 'has_signature': bool(p.signature_path)} for p in log.personnel]
+    ),
+    'facility_statuses': (
+        lambda: selectinload(CNSDLogbook.facility_status_history).selectinload(CNSDFacilityStatus.facility),
+        lambda log, ctx: [
+            {'facility_id': status.cnsd_facility_id,
+             'facility_name': status.facility.name if status.facility else None,
+             'sub_name': status.facility.sub_name if status.facility else None,
+             'category': status.facility.category if status.facility else None,
+             'condition': status.condition}
+            for status in log.facility_statuses
+        ]
+    ),
+    'activities': (
+        lambda: selectinload(CNSDLogbook.uraian_kegiatan),
+        lambda log, ctx: [{'event_time': u.event_time, 'description': u.description} for u in log.uraian_kegiatan]
+    ),
+    'signatures': (None, lambda log, ctx: _signature_flags(log, ['manager_signature'])),
+}
+
+
+def _load_options(field_spec, fields):
+    return [field_spec[f][0]() for f in fields if field_spec[f][0] is not None]
+
+
+def _serialize(obj, field_spec, fields, ctx):
+    return {f: field_spec[f][1](obj, ctx) for f in fields}
+
+
+# --- RESPONS: ETAG ---
+
+def json_response(payload):
+    """Membuat respons JSON dengan ETag, mendukung If-None-Match (304); kompresi diurus app/compression.py."""
+    body = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    response = current_app.response_class(body, mimetype='application/json')
+    # ETag weak agar tetap valid untuk varian brotli/gzip dari representasi yang sama
+    response.set_etag(hashlib.sha1(body).hexdigest(), weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.make_conditional(request)
+    return response
+
+
+# --- ENDPOINT LOGBOOK OPERASI (TWR/APP) ---
+
+@api_bp.route('/logbooks')
+@api_auth_required
+def list_logbooks():
+    fields = _parse_fields(LOGBOOK_FIELDS)
+    limit = _parse_limit()
+    query = LogbookEntry.query.options(*_load_options(LOGBOOK_FIELDS, fields))
+
+    if logbook_type := request.args.get('type'):
+        if logbook_type not in ['TWR', 'APP']:
+            raise APIError("Invalid 'type', expected TWR or APP.")
+        query = query.filter(LogbookEntry.logbook_type == logbook_type)
+    if start_date := _parse_date_arg('start_date'):
+        query = query.filter(LogbookEntry.log_date >= start_date)
+    if end_date := _parse_date_arg('end_date'):
+        query = query.filter(LogbookEntry.log_date <= end_date)
+
+    logs, next_cursor = paginate_keyset(query, LogbookEntry, limit,
+                                        (start_date, end_date) if start_date or end_date else None)
+    ctx = {'facilities': _facility_lookup() if 'facility_statuses' in fields else {}}
+    return json_response({
+        'data': [_serialize(log, LOGBOOK_FIELDS, fields, ctx) for log in logs],
+        'next_cursor': next_cursor,
+        'limit': limit,
+    })
+
+
+@api_bp.route('/logbooks/<int:log_id>')
+@api_auth_required
+def get_logbook(log_id):
+    fields = _parse_fields(LOGBOOK_FIELDS)
+    log = get_with_archive(LogbookEntry, log_id, _load_options(LOGBOOK_FIELDS, fields))
+    if log is None:
+        raise APIError('Logbook entry not found.', 404)
+    ctx = {'facilities': _facility_lookup() if 'facility_statuses' in fields else {}}
+    return json_response({'data': _serialize(log, LOGBOOK_FIELDS, fields, ctx)})
+
+
+# --- ENDPOINT LOGBOOK CNSD ---
+
+def _allowed_cnsd_airport(airport_code):
+    """Pengguna sesi hanya boleh membaca bandara yang sudah dibuka; API key boleh semua."""
+    if _is_api_key_request():
+        return True
+    return session.get('unlocked_airport') == airport_code
+
+
+@api_bp.route('/cnsd-logbooks')
+@api_auth_required
+def list_cnsd_logbooks():
+    fields = _parse_fields(CNSD_FIELDS)
+    limit = _parse_limit()
+    query = CNSDLogbook.query.options(*_load_options(CNSD_FIELDS, fields))
+
+    # Tanpa ?airport=, pengguna sesi melihat bandara yang sedang dibuka; API key melihat semua
+    airport_code = request.args.get('airport')
+    if not airport_code and not _is_api_key_request():
+        airport_code = session.get('unlocked_airport')
+        if not airport_code:
+            raise APIError('No airport logbook is unlocked.', 403)
+    if airport_code:
+        if not _allowed_cnsd_airport(airport_code):
+            raise APIError('Airport logbook is locked.', 403)
+        query = query.filter(CNSDLogbook.airport == airport_code)
+    if start_date := _parse_date_arg('start_date'):
+        query = query.filter(CNSDLogbook.log_date >= start_date)
+    if end_date := _parse_date_arg('end_date'):
+        query = query.filter(CNSDLogbook.log_date <= end_date)
+
+    archive_range = (start_date, end_date) if start_date or end_date else None
+    if airport_code:
+        with use_cnsd_shard(airport_code):
+            logs, next_cursor = paginate_keyset(query, CNSDLogbook, limit, archive_range)
+    else:
+        # API key tanpa ?airport=: laporan lintas bandara dibaca dari semua shard
+        logs, next_cursor = paginate_keyset(query, CNSDLogbook, limit, archive_range, fan_out=True)
+    return json_response({
+        'data': [_serialize(log, CNSD_FIELDS, fields, {}) for log in logs],
+        'next_cursor': next_cursor,
+        'limit': limit,
+    })
+
+
+@api_bp.route('/cnsd-logbooks/<int:log_id>')
+@api_auth_required
+def get_cnsd_logbook(log_id):
+    fields = _parse_fields(CNSD_FIELDS)
+    options = _load_options(CNSD_FIELDS, fields)
+    if _is_api_key_request():
+        # Tanpa bandara yang dibuka di sesi, logbook dicari di semua shard
+        log = get_from_shards(CNSDLogbook, log_id, options) or \
+            get_with_archive(CNSDLogbook, log_id, options, include_hot=False)
+    else:
+        log = get_with_archive(CNSDLogbook, log_id, options)
+    if log is None or not _allowed_cnsd_airport(log.airport):
+        raise APIError('CNSD logbook not found.', 404)
+    return json_response({'data': _serialize(log, CNSD_FIELDS, fields, {})})
+
+
+# --- ENDPOINT WAKTU DINAS ---
+
+@api_bp.route('/duty-time')
+@api_auth_required
+def duty_time():
+    """Jam dinas bergulir (24 jam, 7 hari, 28 hari) & istirahat roster; default hanya yang mendekati batas."""
+    as_of = None
+    if value := request.args.get('as_of'):
+        try:
+            as_of = datetime.fromisoformat(value)
+        except ValueError:
+            raise APIError("Invalid 'as_of', expected YYYY-MM-DDTHH:MM.")
+    show_all = request.args.get('all') == '1'
+    return json_response({
+        'as_of': (as_of or datetime.now()).isoformat(timespec='minutes'),
+        'limits': {**current_app.config['DUTY_LIMIT_HOURS'], 'min_rest': current_app.config['DUTY_MIN_REST_HOURS']},
+        'data': duty_time_status(as_of, only_flagged=not show_all),
+    })
+
+
+# --- ENDPOINT SINKRONISASI OFFLINE ---
+
+def _sync_submitter():
+    """(pengguna, bandara) kunci SYNC_API_KEYS 'username@BANDARA' untuk /sync; None untuk pengguna login."""
+    api_key = request.headers.get('X-API-Key')
+    if not api_key:
+        if not current_user.is_authenticated:
+            raise APIError('Authentication required.', 401)
+        return None
+    if api_key not in current_app.config['SYNC_API_KEYS']:
+        # Kunci API_KEYS hanya untuk baca
+        raise APIError('This API key cannot submit logbooks.', 403)
+    username, _, airport_code = current_app.config['SYNC_API_KEYS'][api_key].partition('@')
+    user = db.session.execute(sa.select(User).filter_by(username=username)).scalar()
+    if user is None:
+        raise APIError(f"User '{username}' of this API key does not exist.", 403)
+    return user, airport_code or None
+
+
+@api_bp.route('/sync', methods=['POST'])
+def sync_logbooks():
+    """Menerima batch logbook lengkap (format import-logbooks + paraf base64) dari stasiun yang koneksinya putus.
+
+    Body: {"items": [{"idempotency_key", "record", "signatures"}]}, boleh dengan Content-Encoding: gzip.
+    Setiap item di-commit sendiri; kunci yang sudah pernah diterima dilaporkan sebagai duplicate.
+    Tanpa login hanya dengan kunci SYNC_API_KEYS, yang terikat ke satu pengguna dan bandara.
+    """
+    submitter = _sync_submitter()
+    try:
+        body = decompress_request_body(request.get_data(), request.content_encoding,
+                                       current_app.config['SYNC_MAX_BYTES'])
+    except RequestTooLarge as e:
+        raise APIError(str(e), 413)
+    except ValueError as e:
+        raise APIError(f"Invalid request body: {e}")
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise APIError('Request body must be JSON.')
+    items = payload.get('items') if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        raise APIError("'items' must be a non-empty list.")
+    if len(items) > current_app.config['SYNC_MAX_ITEMS']:
+        raise APIError(f"At most {current_app.config['SYNC_MAX_ITEMS']} items per batch.", 413)
+
+    results = submit_batch(items, submitter)
+    counts = {status: sum(result['status'] == status for result in results)
+              for status in ('created', 'duplicate', 'invalid', 'rejected', 'error')}
+    return json_response({'results': results, **counts})
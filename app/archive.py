@@ -0,0 +1,241 @@
+# app/archive.py
+
+import os
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import click
+import sqlalchemy as sa
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .models import db, LogbookArchive
+from .facilitystatus import split_month_for_archive, upgrade_condition_columns
+from .sharding import shard_airports, shard_path
+from .shardrouting import SHARDED_TABLES, use_cnsd_shard
+from .textstore import TEXT_FIELDS
+
+# Tabel induk logbook beserta tabel anaknya (tabel, kolom FK ke induk)
+ARCHIVED_TABLES = {
+    'logbook_entry': [
+        ('atc_duty_association', 'logbook_entry_id'), ('atc_position_header', 'logbook_id'),
+        ('atc_position', 'logbook_id'), ('facility_status', 'logbook_id'), ('operational_log', 'logbook_id'),
+        ('duty_interval', 'logbook_id'),
+    ],
+    'cnsd_logbook': [
+        ('cnsd_personnel', 'cnsd_logbook_id'), ('cnsd_facility_status', 'cnsd_logbook_id'),
+        ('cnsd_uraian_kegiatan', 'cnsd_logbook_id'),
+    ],
+}
+# Salinan data referensi di setiap arsip agar relasi (personel, fasilitas, pembuat) tetap bisa dimuat
+REFERENCE_TABLES = ['facility', 'facility_app', 'cnsd_facility', 'atc_personnel']
+# Kolom user yang ikut disalin ke arsip (tanpa hash kata sandi)
+USER_COLUMNS = ['id', 'username', 'division']
+
+
+def archive_path(filename):
+    return os.path.join(current_app.config['ARCHIVE_FOLDER'], filename)
+
+
+def _schema(year):
+    return f'archive_{int(year)}'
+
+
+def _column_list(table_name, columns=None):
+    columns = columns or [c.name for c in db.metadata.tables[table_name].columns]
+    return ', '.join(f'"{name}"' for name in columns)
+
+
+# --- PEMBACAAN LINTAS ARSIP ---
+
+def archives_in_range(start_date=None, end_date=None):
+    """Arsip (tahun terbaru dulu) yang beririsan dengan rentang tanggal; kosong jika rentang hanya menjangkau data hot."""
+    query = LogbookArchive.query
+    if start_date:
+        query = query.filter(LogbookArchive.archived_until >= start_date)
+    if end_date:
+        query = query.filter(LogbookArchive.year <= end_date.year)
+    return [archive for archive in query.order_by(LogbookArchive.year.desc())
+            if os.path.exists(archive_path(archive.filename))]
+
+
+@contextmanager
+def archive_session(archive, commit=False):
+    """Session ke arsip yang di-ATTACH pada koneksi database hot; baca-saja kecuali commit=True (pemeliharaan).
+
+    Semua tabel dipetakan ke skema arsip lewat schema_translate_map, jadi query ORM (termasuk
+    selectinload) yang sama dengan database hot bisa dijalankan apa adanya.
+    """
+    schema = _schema(archive.year)
+    conn = db.engine.connect()
+    conn.exec_driver_sql(f'ATTACH DATABASE ? AS {schema}', (archive_path(archive.filename),))
+    session = Session(bind=conn.execution_options(schema_translate_map={None: schema}))
+    try:
+        yield session
+        if commit:
+            session.flush()
+            conn.commit()
+    finally:
+        session.close()
+        conn.rollback()
+        conn.exec_driver_sql(f'DETACH DATABASE {schema}')
+        conn.close()
+
+
+def all_with_archive(stmt, params=None, start_date=None, end_date=None):
+    """session.scalars(stmt, params).all() pada database hot, ditambah hasil dari arsip yang dijangkau rentang tanggal.
+
+    stmt adalah select() yang sama untuk semua sesi, jadi SQL-nya cukup dikompilasi sekali per bentuk filter.
+    """
+    rows = db.session.scalars(stmt, params).all()
+    for archive in archives_in_range(start_date, end_date):
+        with archive_session(archive) as session:
+            rows.extend(session.scalars(stmt, params).all())
+    return rows
+
+
+def get_with_archive(model, ident, options=(), include_hot=True, populate_existing=False):
+    """Session.get(model, ident) pada database hot, lalu pada setiap arsip (logbook lama yang sudah dipindahkan)."""
+    if include_hot and (obj := db.session.get(model, ident, options=options,
+                                              populate_existing=populate_existing)) is not None:
+        return obj
+    for archive in archives_in_range():
+        with archive_session(archive) as session:
+            if (obj := session.get(model, ident, options=options)) is not None:
+                return obj
+    return None
+
+
+# --- PEMINDAHAN KE ARSIP ---
+
+def _create_archive_database(path):
+    engine = sa.create_engine('sqlite:///' + path)
+    names = [*ARCHIVED_TABLES, *(child for children in ARCHIVED_TABLES.values() for child, _ in children),
+             *REFERENCE_TABLES, 'user', 'text_blob']
+    db.metadata.create_all(engine, tables=[db.metadata.tables[name] for name in names])
+    # Arsip tahun yang sama dari versi lama masih menyimpan kondisi fasilitas sebagai teks
+    upgrade_condition_columns(engine)
+    engine.dispose()
+
+
+def _archive_year(conn, year, range_start, range_end, shard_schemas=()):
+    """Memindahkan logbook satu tahun (dalam rentang) ke skema arsip yang sudah di-ATTACH. Mengembalikan jumlah per induk.
+
+    Logbook CNSD diambil dari database hot dan dari setiap skema shard bandara (shard_schemas).
+    """
+    schema = _schema(year)
+    bounds = (range_start.isoformat(), range_end.isoformat())
+
+    for table in REFERENCE_TABLES:
+        conn.exec_driver_sql(f'DELETE FROM {schema}."{table}"')
+        conn.exec_driver_sql(f'INSERT INTO {schema}."{table}" ({_column_list(table)}) '
+                             f'SELECT {_column_list(table)} FROM main."{table}"')
+    conn.exec_driver_sql(f'DELETE FROM {schema}."user"')
+    conn.exec_driver_sql(f'INSERT INTO {schema}."user" ({_column_list("user", USER_COLUMNS)}) '
+                         f'SELECT {_column_list("user", USER_COLUMNS)} FROM main."user"')
+
+    counts = {}
+    for parent, children in ARCHIVED_TABLES.items():
+        counts[parent] = 0
+        for source in ['main', *(shard_schemas if parent in SHARDED_TABLES else ())]:
+            parent_ids = f'SELECT id FROM {source}."{parent}" WHERE log_date >= ? AND log_date <= ?'
+            counts[parent] += conn.exec_driver_sql(
+                f'INSERT INTO {schema}."{parent}" ({_column_list(parent)}) '
+                f'SELECT {_column_list(parent)} FROM {source}."{parent}" WHERE log_date >= ? AND log_date <= ?',
+                bounds
+            ).rowcount
+            for child, fk in children:
+                conn.exec_driver_sql(f'INSERT INTO {schema}."{child}" ({_column_list(child)}) '
+                                     f'SELECT {_column_list(child)} FROM {source}."{child}" '
+                                     f'WHERE "{fk}" IN ({parent_ids})', bounds)
+            for child, fk in children:
+                conn.exec_driver_sql(f'DELETE FROM {source}."{child}" WHERE "{fk}" IN ({parent_ids})', bounds)
+            conn.exec_driver_sql(f'DELETE FROM {source}."{parent}" WHERE log_date >= ? AND log_date <= ?', bounds)
+
+    # Teks NOTAM/remarks yang dirujuk logbook arsip disalin dengan id yang sama; di database hot teks tetap
+    # disimpan karena bisa dirujuk logbook lain (yang tidak dirujuk lagi dibersihkan `flask dedupe-texts`)
+    referenced = ' UNION '.join(f'SELECT "{id_column}" FROM {schema}."{model.__tablename__}"'
+                                for model, fields in TEXT_FIELDS.items() for _, id_column in fields)
+    conn.exec_driver_sql(f'INSERT OR IGNORE INTO {schema}."text_blob" ({_column_list("text_blob")}) '
+                         f'SELECT {_column_list("text_blob")} FROM main."text_blob" WHERE id IN ({referenced})')
+    return counts
+
+
+def archive_logbooks(cutoff, dry_run=False, echo=print):
+    """Memindahkan logbook dengan log_date < cutoff ke database arsip per tahun; satu transaksi per tahun."""
+    os.makedirs(current_app.config['ARCHIVE_FOLDER'], exist_ok=True)
+    years = set()
+    for parent in ARCHIVED_TABLES:
+        table = db.metadata.tables[parent]
+        # Logbook CNSD juga dicari di setiap shard bandara (airport None = database hot)
+        for airport_code in [None, *(shard_airports() if parent in SHARDED_TABLES else ())]:
+            with use_cnsd_shard(airport_code):
+                years.update(int(y) for (y,) in db.session.execute(
+                    sa.select(sa.func.distinct(sa.func.strftime('%Y', table.c.log_date)))
+                    .where(table.c.log_date < cutoff)
+                ))
+    db.session.commit()
+
+    stats = {'years': [], 'logbook_entry': 0, 'cnsd_logbook': 0}
+    if years and not dry_run:
+        split_month_for_archive(cutoff)
+    for year in sorted(years):
+        range_start, range_end = date(year, 1, 1), min(date(year, 12, 31), cutoff - timedelta(days=1))
+        filename = f'logbook_{year}.db'
+        if dry_run:
+            echo(f"[dry-run] {year}: {range_start} s.d. {range_end} -> {archive_path(filename)}")
+            continue
+        _create_archive_database(archive_path(filename))
+        shard_schemas = [f'shard_{index}' for index, _ in enumerate(shard_airports())]
+        with db.engine.connect() as conn:
+            # ATTACH harus di luar transaksi SQLite
+            conn.exec_driver_sql(f'ATTACH DATABASE ? AS {_schema(year)}', (archive_path(filename),))
+            for shard_schema, airport_code in zip(shard_schemas, shard_airports()):
+                conn.exec_driver_sql(f'ATTACH DATABASE ? AS {shard_schema}', (shard_path(airport_code),))
+            try:
+                counts = _archive_year(conn, year, range_start, range_end, shard_schemas)
+                excluded = sqlite_insert(LogbookArchive.__table__).excluded
+                conn.execute(
+                    sqlite_insert(LogbookArchive.__table__).values(
+                        year=year, filename=filename, archived_until=range_end,
+                        logbook_count=counts['logbook_entry'], cnsd_count=counts['cnsd_logbook'],
+                    ).on_conflict_do_update(index_elements=['year'], set_={
+                        'archived_until': sa.func.max(LogbookArchive.archived_until, excluded.archived_until),
+                        'logbook_count': LogbookArchive.logbook_count + excluded.logbook_count,
+                        'cnsd_count': LogbookArchive.cnsd_count + excluded.cnsd_count,
+                        'updated_at': sa.func.now(),
+                    })
+                )
+                conn.commit()
+            finally:
+                conn.rollback()
+                conn.exec_driver_sql(f'DETACH DATABASE {_schema(year)}')
+                for shard_schema in shard_schemas:
+                    conn.exec_driver_sql(f'DETACH DATABASE {shard_schema}')
+        stats['years'].append(year)
+        stats['logbook_entry'] += counts['logbook_entry']
+        stats['cnsd_logbook'] += counts['cnsd_logbook']
+        echo(f"{year}: {counts['logbook_entry']} logbook operasi, {counts['cnsd_logbook']} logbook CNSD -> {filename}")
+    return stats
+
+
+@click.command('archive-logbooks')
+@click.option('--horizon-days', type=int, default=None,
+              help='Arsipkan logbook yang lebih tua dari N hari (default: ARCHIVE_HORIZON_DAYS).')
+@click.option('--before', 'before', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Arsipkan logbook sebelum tanggal ini (menggantikan --horizon-days).')
+@click.option('--dry-run', is_flag=True, help='Hanya tampilkan tahun yang akan diarsipkan.')
+@click.option('--vacuum', is_flag=True, help='VACUUM database hot setelah pemindahan agar ukuran file menyusut.')
+@with_appcontext
+def archive_logbooks_command(horizon_days, before, dry_run, vacuum):
+    """Memindahkan logbook lama ke database arsip per tahun (instance/archive/logbook_<tahun>.db)."""
+    horizon_days = horizon_days if horizon_days is not None else current_app.config['ARCHIVE_HORIZON_DAYS']
+    cutoff = before.date() if before else date.today() - timedelta(days=horizon_days)
+    click.echo(f"Mengarsipkan logbook sebelum {cutoff} ...")
+    stats = archive_logbooks(cutoff, dry_run=dry_run, echo=click.echo)
+    if vacuum and stats['years']:
+        with db.engine.connect() as conn:
+            conn.exec_driver_sql('VACUUM')
+    click.echo(f"Selesai: {stats['logbook_entry']} logbook operasi dan {stats['cnsd_logbook']} logbook CNSD diarsipkan.")
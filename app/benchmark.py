@@ -0,0 +1,202 @@
+# app/benchmark.py
+
+import json
+import logging
+import os
+import platform
+import re
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+
+from config import Config
+from .models import db, LogbookEntry, CNSDLogbook, ATCPersonnel
+from .shardrouting import use_cnsd_shard
+
+# Data sintetis benchmark selalu berakhir di tanggal yang sama agar hasil antar-run sebanding
+BENCHMARK_END_DATE = date(2025, 6, 30)
+DEFAULT_SIZES = '30,365,1825'
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'baseline.json')
+
+
+def build_benchmark_app(days, workdir, seed=42, echo=print, **config):
+    """Membuat app dengan database SQLite terpisah berisi `days` hari data sintetis (dipakai ulang jika ada).
+
+    Keyword tambahan menimpa nilai Config (mis. CNSD_SHARDING_ENABLED=True untuk load test).
+    """
+    from . import create_app
+    from .synthetic import seed_synthetic_data
+
+    db_path = os.path.join(workdir, f'bench_{days}d_seed{seed}.db')
+    is_new = not os.path.exists(db_path)
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+        UPLOAD_FOLDER = os.path.join(workdir, 'uploads')
+        TESTING = True
+
+    for key, value in config.items():
+        setattr(BenchmarkConfig, key, value)
+    app = create_app(BenchmarkConfig)
+    if is_new:
+        with app.app_context():
+            echo(f"Membuat data sintetis {days} hari di {db_path} ...")
+            seed_synthetic_data(days, BENCHMARK_END_DATE - timedelta(days=days - 1), seed, echo=lambda msg: None)
+    return app
+
+
+def benchmark_routes(app):
+    """Daftar (nama, klien, URL) untuk route yang paling sering dibuka, memakai id dari tengah data."""
+    with app.app_context():
+        twr_ids = [row[0] for row in db.session.query(LogbookEntry.id).filter_by(logbook_type='TWR')
+                   .order_by(LogbookEntry.log_date, LogbookEntry.id)]
+        with use_cnsd_shard('YIA'):
+            cnsd_ids = [row[0] for row in db.session.query(CNSDLogbook.id).filter_by(airport='YIA')
+                        .order_by(CNSDLogbook.log_date, CNSDLogbook.id)]
+        personnel_id = ATCPersonnel.query.order_by(ATCPersonnel.name).first().id
+    log_id = twr_ids[len(twr_ids) // 2]
+    cnsd_id = cnsd_ids[len(cnsd_ids) // 2]
+    month, year = BENCHMARK_END_DATE.month, BENCHMARK_END_DATE.year
+
+    return [
+        ('dashboard_history', 'operasi', '/dashboard/operasi?type=TWR&tab=history'),
+        ('dashboard_recap', 'operasi', f'/dashboard/operasi?type=TWR&tab=recap&recap_month={month}&recap_year={year}'),
+        ('dashboard_personal', 'operasi',
+         f'/dashboard/operasi?tab=personal&personnel_id={personnel_id}&personal_month={month}&personal_year={year}'),
+        ('view_log', 'operasi', f'/log/view/{log_id}'),
+        ('download_log_pdf', 'operasi', f'/log/download/{log_id}'),
+        ('cnsd_dashboard', 'teknik', '/cnsd/dashboard/YIA'),
+        ('view_cnsd_log', 'teknik', f'/cnsd/log/view/{cnsd_id}'),
+        ('download_cnsd_log_pdf', 'teknik', f'/cnsd/log/download/{cnsd_id}'),
+    ]
+
+
+def _logged_in_clients(app):
+    clients = {}
+    for username in ('operasi', 'teknik'):
+        client = app.test_client()
+        client.post('/login', data={'username': username, 'password': '1234'})
+        clients[username] = client
+    with clients['teknik'].session_transaction() as sess:
+        sess['unlocked_airport'] = 'YIA'
+    return clients
+
+
+def time_routes(app, repeat=5, only=None, echo=print):
+    """Mengukur waktu respons setiap route dengan test client Flask (1 pemanasan + `repeat` pengukuran)."""
+    clients = _logged_in_clients(app)
+    results = {}
+    # Log per request dari instrumentasi tidak perlu selama pengukuran
+    logging.getLogger('logbook.requests').disabled = True
+    for name, username, url in benchmark_routes(app):
+        if only and name not in only:
+            continue
+        client = clients[username]
+        response = client.get(url)  # pemanasan: kompilasi template, cache koneksi
+        if response.status_code != 200:
+            echo(f"  {name}: status {response.status_code}, dilewati")
+            continue
+        timings, python_timings = [], []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+            python_timings.append(_python_ms(response))
+        timings.sort()
+        results[name] = {
+            'median_ms': round(statistics.median(timings), 2),
+            'min_ms': round(timings[0], 2),
+            'p95_ms': round(timings[min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))], 2),
+            'runs': repeat,
+            'bytes': len(response.get_data()),
+            'queries': _query_count(response),
+        }
+        if None not in python_timings:
+            results[name]['python_ms'] = round(statistics.median(python_timings), 2)
+        echo(f"  {name:<24} median {results[name]['median_ms']:>9.2f} ms   min {results[name]['min_ms']:>9.2f} ms"
+             f"   python {results[name].get('python_ms', '-'):>8} ms   {results[name]['queries']} query")
+    return results
+
+
+def _query_count(response):
+    """Jumlah query SQL dari header Server-Timing (None jika instrumentasi nonaktif)."""
+    match = re.search(r'desc="(\d+) queries"', response.headers.get('Server-Timing', ''))
+    return int(match.group(1)) if match else None
+
+
+def _python_ms(response):
+    """Overhead Python per request: total Server-Timing dikurangi waktu SQL, template, dan PDF (None jika
+    instrumentasi nonaktif). Angka ini yang turun jika statement query dipakai ulang dari compiled cache."""
+    durations = dict(re.findall(r'(\w+);dur=([\d.]+)', response.headers.get('Server-Timing', '')))
+    if 'total' not in durations:
+        return None
+    return float(durations['total']) - sum(float(durations.get(key, 0)) for key in ('sql', 'tpl', 'pdf'))
+
+
+def compare_results(baseline, current, tolerance):
+    """Mengembalikan daftar regresi: median saat ini lebih lambat dari baseline melebihi `tolerance`."""
+    regressions = []
+    for size, routes in current.items():
+        for name, result in routes.items():
+            base = baseline.get(size, {}).get(name)
+            if not base or not base.get('median_ms'):
+                continue
+            ratio = result['median_ms'] / base['median_ms']
+            if ratio > 1 + tolerance:
+                regressions.append((size, name, base['median_ms'], result['median_ms'], ratio))
+    return regressions
+
+
+@click.command('benchmark')
+@click.option('--sizes', default=DEFAULT_SIZES, show_default=True, help='Ukuran data dalam hari, dipisah koma.')
+@click.option('--repeat', default=5, show_default=True, help='Jumlah pengukuran per route.')
+@click.option('--seed', default=42, show_default=True)
+@click.option('--workdir', type=click.Path(file_okay=False), default=None,
+              help='Folder database benchmark (dipakai ulang antar-run). Default: folder sementara.')
+@click.option('--route', 'only', multiple=True, help='Hanya ukur route tertentu (boleh berulang).')
+@click.option('--save-baseline', is_flag=True, help='Simpan hasil sebagai baseline baru.')
+@click.option('--baseline', 'baseline_path', default=DEFAULT_BASELINE, show_default=True)
+@click.option('--tolerance', default=0.25, show_default=True, help='Batas perlambatan relatif sebelum dianggap regresi.')
+@with_appcontext
+def benchmark_command(sizes, repeat, seed, workdir, only, save_baseline, baseline_path, tolerance):
+    """Benchmark route utama pada beberapa ukuran data dan bandingkan dengan baseline."""
+    workdir = workdir or tempfile.mkdtemp(prefix='logbook-bench-')
+    os.makedirs(workdir, exist_ok=True)
+
+    current = {}
+    for days in [int(s) for s in sizes.split(',') if s.strip()]:
+        click.echo(f"== {days} hari data ==")
+        app = build_benchmark_app(days, workdir, seed, echo=click.echo)
+        current[str(days)] = time_routes(app, repeat=repeat, only=set(only), echo=click.echo)
+
+    if save_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, 'w') as f:
+            json.dump({
+                'meta': {
+                    'created_at': datetime.now().isoformat(timespec='seconds'),
+                    'python': platform.python_version(),
+                    'machine': platform.machine(),
+                    'seed': seed,
+                    'repeat': repeat,
+                },
+                'results': current,
+            }, f, indent=2, sort_keys=True)
+        click.echo(f"Baseline disimpan ke {baseline_path}")
+        return
+
+    if not os.path.exists(baseline_path):
+        click.echo("Belum ada baseline; jalankan dengan --save-baseline untuk menyimpannya.")
+        return
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']
+    regressions = compare_results(baseline, current, tolerance)
+    for size, name, base_ms, current_ms, ratio in regressions:
+        click.echo(f"REGRESI {name} @ {size} hari: {base_ms:.2f} ms -> {current_ms:.2f} ms (x{ratio:.2f})")
+    if regressions:
+        raise click.ClickException(f"{len(regressions)} route lebih lambat dari baseline.")
+    click.echo("Tidak ada regresi dibanding baseline.")
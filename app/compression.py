@@ -0,0 +1,185 @@
+# app/compression.py
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+import zlib
+
+import brotli
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import with_appcontext
+from werkzeug.security import safe_join
+
+# Respons yang lebih kecil dari ini tidak sebanding dengan biaya kompresinya
+MIN_COMPRESS_SIZE = 512
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript', 'application/javascript',
+    'application/json', 'application/xml', 'image/svg+xml',
+}
+# Varian pra-kompresi untuk file statis, urut sesuai preferensi
+STATIC_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+_fingerprints = {}
+_fingerprints_lock = threading.Lock()
+
+
+def _is_compressible(mimetype):
+    return mimetype in COMPRESSIBLE_MIMETYPES
+
+
+def _guess_mimetype(filename):
+    mimetype, file_encoding = mimetypes.guess_type(filename)
+    # File yang sudah terkompresi (mis. app.css.gz) disajikan apa adanya
+    if file_encoding or not mimetype:
+        return 'application/octet-stream'
+    return mimetype
+
+
+def compress_body(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+class RequestTooLarge(ValueError):
+    """Body request (setelah dekompresi) melebihi batas yang diizinkan."""
+
+
+def decompress_request_body(body, encoding, limit):
+    """Body request apa adanya atau hasil dekompresi gzip, maksimal `limit` byte (melindungi dari gzip bomb)."""
+    if encoding in (None, '', 'identity'):
+        if len(body) > limit:
+            raise RequestTooLarge(f"Body request melebihi {limit} byte.")
+        return body
+    if encoding != 'gzip':
+        raise ValueError(f"Content-Encoding '{encoding}' tidak didukung; gunakan gzip.")
+    decompressor = zlib.decompressobj(wbits=31)
+    try:
+        data = decompressor.decompress(body, limit + 1)
+    except zlib.error as e:
+        raise ValueError(f"Data gzip tidak valid: {e}")
+    if len(data) > limit or decompressor.unconsumed_tail:
+        raise RequestTooLarge(f"Body request melebihi {limit} byte setelah dekompresi.")
+    if not decompressor.eof:
+        raise ValueError("Data gzip tidak lengkap.")
+    return data
+
+
+# --- KOMPRESI RESPONS DINAMIS ---
+
+def compress_response(response):
+    """Mengompresi respons HTML/JSON/CSV dengan brotli atau gzip sesuai header Accept-Encoding klien."""
+    if not _is_compressible(response.mimetype):
+        return response
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers):
+        return response
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_SIZE:
+        return response
+    encoding = request.accept_encodings.best_match(['br', 'gzip'])
+    if encoding not in ('br', 'gzip'):
+        return response
+    response.set_data(compress_body(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    # ETag strong harus berbeda per encoding; ETag weak tetap valid untuk semua varian
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{encoding}')
+    return response
+
+
+# --- ASET STATIS BER-FINGERPRINT ---
+
+def static_fingerprint(filename):
+    """Hash isi file statis (dicache per mtime/ukuran), atau None jika file tidak ada."""
+    path = safe_join(current_app.static_folder, filename)
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _fingerprints_lock:
+        if key in _fingerprints:
+            return _fingerprints[key]
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    with _fingerprints_lock:
+        _fingerprints[key] = digest.hexdigest()[:10]
+    return _fingerprints[key]
+
+
+def add_static_fingerprint(endpoint, values):
+    """url_for('static', filename=...) otomatis mendapat ?v=<hash isi file>."""
+    if endpoint == 'static' and 'v' not in values and values.get('filename'):
+        if fingerprint := static_fingerprint(values['filename']):
+            values['v'] = fingerprint
+
+
+def serve_static(filename):
+    """Menyajikan file statis: varian .br/.gz jika tersedia, cache jangka panjang jika URL ber-fingerprint."""
+    static_folder = current_app.static_folder
+    served_name, encoding = filename, None
+    mimetype = _guess_mimetype(filename)
+    if _is_compressible(mimetype):
+        accepted = request.accept_encodings
+        for candidate, suffix in STATIC_ENCODINGS:
+            path = safe_join(static_folder, filename + suffix)
+            # Varian yang lebih tua dari file aslinya dianggap basi
+            if (accepted[candidate] and path and os.path.isfile(path)
+                    and os.path.getmtime(path) >= os.path.getmtime(os.path.join(static_folder, filename))):
+                served_name, encoding = filename + suffix, candidate
+                break
+
+    fingerprinted = request.args.get('v') and request.args['v'] == static_fingerprint(filename)
+    response = send_from_directory(static_folder, served_name, mimetype=mimetype,
+                                   max_age=ASSET_MAX_AGE if fingerprinted else None)
+    if _is_compressible(mimetype):
+        response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if fingerprinted:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    return response
+
+
+@click.command('compress-static')
+@with_appcontext
+def compress_static_command():
+    """Membuat varian .br dan .gz untuk file statis yang dapat dikompresi (jalankan saat deploy)."""
+    written = 0
+    for root, _, files in os.walk(current_app.static_folder):
+        if os.path.relpath(root, current_app.static_folder).split(os.sep)[0] == 'uploads':
+            continue
+        for name in files:
+            path = os.path.join(root, name)
+            if not _is_compressible(_guess_mimetype(name)) or os.path.getsize(path) < MIN_COMPRESS_SIZE:
+                continue
+            with open(path, 'rb') as f:
+                body = f.read()
+            for encoding, suffix in STATIC_ENCODINGS:
+                compressed = brotli.compress(body, quality=11) if encoding == 'br' else gzip.compress(body, 9)
+                if len(compressed) < len(body):
+                    with open(path + suffix, 'wb') as f:
+                        f.write(compressed)
+                    written += 1
+    click.echo(f"{written} varian terkompresi ditulis di {current_app.static_folder}.")
+
+
+def init_compression(app):
+    """Memasang kompresi respons app-wide dan penyajian aset statis ber-fingerprint."""
+    if not app.config.get('COMPRESSION_ENABLED', True):
+        return
+    app.after_request(compress_response)
+    app.url_defaults(add_static_fingerprint)
+    app.view_functions['static'] = serve_static
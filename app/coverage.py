@@ -0,0 +1,85 @@
+# app/coverage.py
+
+import calendar
+from collections import defaultdict
+from datetime import date
+
+import sqlalchemy as sa
+
+from .models import db, LogbookEntry, SHIFT_ORDER
+from .archive import archives_in_range, archive_session
+
+WEEKDAY_LABELS = ('Sen', 'Sel', 'Rab', 'Kam', 'Jum', 'Sab', 'Min')
+
+
+def _coverage_stmt(parent, group_column, groups, start_date, end_date):
+    """Satu GROUP BY (tipe/bandara, tanggal, shift): jumlah logbook dan jumlah U/S terbesar di setiap sel."""
+    shift = sa.func.upper(sa.func.trim(parent.shift))
+    return (
+        sa.select(group_column, parent.log_date, shift, sa.func.count(parent.id),
+                  sa.func.max(parent.unserviceable_count))
+        .where(group_column.in_(groups), parent.log_date >= start_date, parent.log_date <= end_date)
+        .group_by(group_column, parent.log_date, shift)
+    )
+
+
+def _status(cell, day, today):
+    if cell is None:
+        return 'future' if day > today else 'missing'
+    if cell['logs'] > 1:
+        return 'duplicate'
+    return 'us' if cell['us'] else 'ok'
+
+
+def month_coverage(parent, groups, year, month, today=None):
+    """Kalender cakupan logbook satu bulan: setiap tanggal, setiap tipe/bandara di groups, setiap shift.
+
+    Hanya agregat per sel yang dibaca (tanpa memuat logbook), dari database hot dan arsip yang dijangkau bulan itu.
+    Status sel: ok, us (ada fasilitas U/S/Rusak), duplicate (lebih dari satu logbook), missing (belum ada logbook
+    sampai hari ini), atau future. Shift di luar Pagi/Siang/Malam ditampilkan di tanggalnya saja.
+    """
+    group_column = parent.logbook_type if parent is LogbookEntry else parent.airport
+    start_date, end_date = date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+    today = today or date.today()
+    stmt = _coverage_stmt(parent, group_column, groups, start_date, end_date)
+
+    cells = {}
+
+    def collect(session):
+        for group, log_date, shift, logs, unserviceable in session.execute(stmt):
+            cell = cells.setdefault((group, log_date, shift), {'logs': 0, 'us': 0})
+            cell['logs'] += logs
+            cell['us'] = max(cell['us'], unserviceable or 0)
+
+    collect(db.session)
+    for archive in archives_in_range(start_date, end_date):
+        with archive_session(archive) as session:
+            collect(session)
+
+    extra_shifts = defaultdict(list)
+    for group, log_date, shift in sorted(cells):
+        if shift not in SHIFT_ORDER:
+            extra_shifts[group, log_date].append(shift)
+
+    weeks, totals = [], {'missing': 0, 'us': 0, 'duplicate': 0}
+    for week in calendar.Calendar().monthdatescalendar(year, month):
+        days = []
+        for day in week:
+            if day.month != month:
+                days.append(None)
+                continue
+            rows = []
+            for group in groups:
+                slots = []
+                for shift in (*SHIFT_ORDER, *extra_shifts[group, day]):
+                    cell = cells.get((group, day, shift))
+                    status = _status(cell, day, today)
+                    if status in totals:
+                        totals[status] += 1
+                    slots.append({'shift': shift, 'status': status, 'logs': cell['logs'] if cell else 0,
+                                  'us': cell['us'] if cell else 0})
+                rows.append({'group': group, 'slots': slots})
+            days.append({'date': day, 'rows': rows})
+        weeks.append(days)
+    return {'year': year, 'month': month, 'groups': list(groups), 'weeks': weeks, 'totals': totals,
+            'weekdays': WEEKDAY_LABELS, 'shifts': SHIFT_ORDER}
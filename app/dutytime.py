@@ -0,0 +1,212 @@
+# app/dutytime.py
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import click
+import sqlalchemy as sa
+from flask import current_app
+from flask.cli import with_appcontext
+
+from .models import db, LogbookEntry, ATCPosition, ATCPositionHeader, DutyInterval
+from .recap import TIME_SLOTS
+from .reference import reference_data
+
+# Jendela bergulir batas jam dinas (kunci sama dengan Config.DUTY_LIMIT_HOURS)
+DUTY_WINDOWS = (('24h', timedelta(hours=24)), ('7d', timedelta(days=7)), ('28d', timedelta(days=28)))
+LONGEST_WINDOW = max(window for _, window in DUTY_WINDOWS)
+REFRESH_CHUNK = 500
+
+
+# --- INTERVAL DINAS DARI SLOT POSISI ---
+
+def _header_times(header):
+    """Jam mulai & selesai dari header 'HH:MM-HH:MM'; None jika kosong atau tidak valid (durasi 0 di rekap)."""
+    if not header or '-' not in header:
+        return None
+    try:
+        start_str, end_str = header.split('-')
+        return (datetime.strptime(start_str.strip(), '%H:%M').time(),
+                datetime.strptime(end_str.strip(), '%H:%M').time())
+    except ValueError:
+        return None
+
+
+def slot_intervals(log_date, headers):
+    """{nomor slot: (mulai, selesai)} untuk header slot 1..6 satu logbook.
+
+    Slot yang jam mulainya lebih awal dari slot sebelumnya sudah lewat tengah malam (shift malam), dan slot
+    yang selesai sebelum jam mulainya berakhir keesokan harinya, sama seperti parse_duration di rekap.
+    """
+    intervals, day, previous = {}, log_date, None
+    for i, header in zip(TIME_SLOTS, headers):
+        times = _header_times(header)
+        if times is None:
+            continue
+        start_time, end_time = times
+        if previous is not None and start_time < previous:
+            day += timedelta(days=1)
+        previous = start_time
+        start, end = datetime.combine(day, start_time), datetime.combine(day, end_time)
+        if end < start:
+            end += timedelta(days=1)
+        if end > start:
+            intervals[i] = (start, end)
+    return intervals
+
+
+def _position_slots_stmt(log_ids):
+    return (
+        sa.select(ATCPosition.logbook_id, ATCPosition.position_name, LogbookEntry.log_date,
+                  *(getattr(ATCPosition, f'time_slot_{i}') for i in TIME_SLOTS),
+                  *(getattr(ATCPositionHeader, f'header_{i}') for i in TIME_SLOTS))
+        .join(LogbookEntry, LogbookEntry.id == ATCPosition.logbook_id)
+        .join(ATCPositionHeader, ATCPositionHeader.logbook_id == ATCPosition.logbook_id)
+        .where(ATCPosition.logbook_id.in_(log_ids))
+    )
+
+
+def refresh_duty_intervals(session, log_ids):
+    """Menulis ulang interval dinas logbook-logbook ini dari slot posisi & header jamnya (dipanggil sebelum commit)."""
+    log_ids = list(log_ids)
+    session.flush()
+    for start in range(0, len(log_ids), REFRESH_CHUNK):
+        chunk = log_ids[start:start + REFRESH_CHUNK]
+        session.execute(sa.delete(DutyInterval).where(DutyInterval.logbook_id.in_(chunk))
+                        .execution_options(synchronize_session=False))
+        rows = []
+        for row in session.execute(_position_slots_stmt(chunk)):
+            names, headers = row[3:3 + len(TIME_SLOTS)], row[3 + len(TIME_SLOTS):]
+            for i, (start_at, end_at) in slot_intervals(row.log_date, headers).items():
+                if name := names[i - 1]:
+                    rows.append({'logbook_id': row.logbook_id, 'personnel_name': name,
+                                 'position_name': row.position_name, 'start_at': start_at, 'end_at': end_at})
+        if rows:
+            session.execute(sa.insert(DutyInterval), rows)
+
+
+def rebuild_duty_intervals(session):
+    """Menghitung ulang interval dinas semua logbook di database; mengembalikan jumlah interval."""
+    log_ids = [log_id for (log_id,) in session.execute(sa.select(LogbookEntry.id).order_by(LogbookEntry.id))]
+    session.execute(sa.delete(DutyInterval))
+    refresh_duty_intervals(session, log_ids)
+    return session.execute(sa.select(sa.func.count(DutyInterval.id))).scalar()
+
+
+def init_duty_intervals():
+    """Dipanggil saat startup: database lama yang belum punya interval dinas diisi sekali dari slot posisi."""
+    if db.session.execute(sa.select(DutyInterval.id).limit(1)).first() is None and \
+            db.session.execute(sa.select(ATCPosition.id).limit(1)).first() is not None:
+        count = rebuild_duty_intervals(db.session)
+        db.session.commit()
+        print(f"Interval dinas diisi dari logbook yang ada: {count} interval.")
+
+
+# --- MONITOR JENDELA BERGULIR ---
+
+def _merge_periods(periods):
+    """Periode dinas per logbook yang bertumpuk (mis. TWR & APP di shift yang sama) digabung menjadi satu."""
+    merged = []
+    for start, end in sorted(periods):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _hours(delta):
+    return round(delta.total_seconds() / 3600, 2)
+
+
+def duty_time_status(as_of=None, only_flagged=False):
+    """Jam dinas bergulir dan istirahat seluruh roster pada waktu as_of (default: sekarang).
+
+    Hanya interval yang berakhir dalam 28 hari terakhir yang dibaca (indeks end_at), jadi biayanya tetap
+    meskipun riwayat bertambah. Jam dihitung seperti rekap (jumlah durasi slot berisi nama personel); istirahat
+    adalah jeda antar periode dinas, dengan satu periode = rentang slot personel dalam satu logbook.
+    Setiap baris berisi hours {jendela: jam}, min_rest_hours, rest_since_hours, flags, dan status
+    ('ok', 'near', 'over'); baris 'over' lalu 'near' lebih dulu.
+    """
+    as_of = as_of or datetime.now()
+    limits = current_app.config['DUTY_LIMIT_HOURS']
+    min_rest = timedelta(hours=current_app.config['DUTY_MIN_REST_HOURS'])
+    warning_ratio = current_app.config['DUTY_WARNING_RATIO']
+
+    intervals = defaultdict(list)
+    for name, log_id, start_at, end_at in db.session.execute(
+        sa.select(DutyInterval.personnel_name, DutyInterval.logbook_id, DutyInterval.start_at, DutyInterval.end_at)
+        .where(DutyInterval.end_at > as_of - LONGEST_WINDOW, DutyInterval.start_at < as_of)
+    ):
+        intervals[name].append((log_id, start_at, end_at))
+
+    names = [person.name for person in reference_data()['personnel']]
+    names += sorted(set(intervals) - set(names))
+    rows = []
+    for name in names:
+        hours, flags = {}, []
+        for key, window in DUTY_WINDOWS:
+            since = as_of - window
+            total = sum((min(end, as_of) - max(start, since) for _, start, end in intervals[name]
+                         if end > since), timedelta(0))
+            hours[key] = _hours(total)
+            if hours[key] > limits[key]:
+                flags.append((key, 'over'))
+            elif hours[key] >= limits[key] * warning_ratio:
+                flags.append((key, 'near'))
+
+        periods = defaultdict(lambda: [datetime.max, datetime.min])
+        for log_id, start, end in intervals[name]:
+            period = periods[log_id]
+            period[0], period[1] = min(period[0], start), max(period[1], end)
+        merged = _merge_periods(periods.values())
+        gaps = [later[0] - earlier[1] for earlier, later in zip(merged, merged[1:])]
+        rest_since = max(as_of - merged[-1][1], timedelta(0)) if merged else None
+        if gaps and min(gaps) < min_rest:
+            flags.append(('rest', 'over'))
+        elif gaps and min(gaps) < min_rest / warning_ratio:
+            flags.append(('rest', 'near'))
+
+        levels = {level for _, level in flags}
+        rows.append({
+            'name': name, 'hours': hours,
+            'min_rest_hours': _hours(min(gaps)) if gaps else None,
+            'rest_since_hours': _hours(rest_since) if rest_since is not None else None,
+            'on_duty': bool(merged) and merged[-1][1] > as_of,
+            'flags': [{'limit': key, 'level': level} for key, level in flags],
+            'status': 'over' if 'over' in levels else 'near' if 'near' in levels else 'ok',
+        })
+
+    rank = {'over': 0, 'near': 1, 'ok': 2}
+    rows.sort(key=lambda row: (rank[row['status']], -row['hours']['28d']))
+    if only_flagged:
+        rows = [row for row in rows if row['status'] != 'ok']
+    return rows
+
+
+@click.command('duty-time')
+@click.option('--as-of', type=click.DateTime(formats=['%Y-%m-%d %H:%M', '%Y-%m-%d']), default=None,
+              help='Waktu acuan jendela bergulir (default: sekarang).')
+@click.option('--all', 'show_all', is_flag=True, help='Tampilkan seluruh roster, bukan hanya yang mendekati batas.')
+@with_appcontext
+def duty_time_command(as_of, show_all):
+    """Menampilkan personel yang mendekati atau melewati batas jam dinas dan istirahat minimum."""
+    rows = duty_time_status(as_of, only_flagged=not show_all)
+    limits = current_app.config['DUTY_LIMIT_HOURS']
+    click.echo(f"Batas: 24 jam {limits['24h']}, 7 hari {limits['7d']}, 28 hari {limits['28d']} jam; "
+               f"istirahat minimum {current_app.config['DUTY_MIN_REST_HOURS']} jam.")
+    for row in rows:
+        flags = ', '.join(f"{flag['limit']} {flag['level']}" for flag in row['flags']) or '-'
+        click.echo(f"  {row['status']:<5} {row['name']:<32} 24j {row['hours']['24h']:>6} 7h {row['hours']['7d']:>6} "
+                   f"28h {row['hours']['28d']:>7}  istirahat min {row['min_rest_hours']}  ({flags})")
+    if not rows:
+        click.echo("Tidak ada personel yang mendekati batas.")
+
+
+@click.command('rebuild-duty-intervals')
+@with_appcontext
+def rebuild_duty_intervals_command():
+    """Menghitung ulang tabel interval dinas dari slot posisi semua logbook di database hot."""
+    count = rebuild_duty_intervals(db.session)
+    db.session.commit()
+    click.echo(f"Selesai: {count} interval dinas.")
@@ -0,0 +1,522 @@
+# app/export.py
+
+import csv
+import io
+import re
+import zipfile
+from datetime import datetime, time
+from itertools import groupby
+from xml.sax.saxutils import escape
+
+import sqlalchemy as sa
+from flask import (Blueprint, Response, request, session, stream_with_context, abort, flash, redirect, url_for,
+                   send_file)
+from flask_login import login_required
+from sqlalchemy.orm import aliased
+
+from .models import (db, User, LogbookEntry, ATCPersonnel, ATCPosition, ATCPositionHeader, Facility, FacilityApp,
+                     FacilityStatus, OperationalLog, CNSDLogbook, CNSDPersonnel, CNSDFacility, CNSDFacilityStatus,
+                     CNSDUraianKegiatan, atc_duty_association, shift_rank)
+from .archive import archives_in_range, archive_session
+from .facilitystatus import month_of
+from .recap import personnel_recap, recap_range_from_args
+from .personalpdf import write_personal_logbooks_zip
+from .reference import reference_data
+from .snapshot import condition_values, facility_availability
+from .instrumentation import measure
+
+export_bp = Blueprint('export', __name__, url_prefix='/export')
+
+# Jumlah baris yang diambil dari cursor database per batch
+EXPORT_YIELD_PER = 1000
+# Jumlah baris yang digabung menjadi satu chunk respons
+ROWS_PER_CHUNK = 500
+
+
+# --- PENULIS CSV & XLSX STREAMING ---
+
+class _Echo:
+    """Objek mirip file yang mengembalikan apa pun yang ditulis (untuk csv.writer)."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(header, rows):
+    """Menghasilkan CSV per chunk dari iterator baris tanpa menampung seluruh data."""
+    writer = csv.writer(_Echo())
+    # BOM agar Excel membaca UTF-8 dengan benar
+    yield '\ufeff' + writer.writerow(header)
+    chunk = []
+    for row in rows:
+        chunk.append(writer.writerow(row))
+        if len(chunk) >= ROWS_PER_CHUNK:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+class _ChunkSink:
+    """Tujuan tulis ZipFile yang tidak bisa di-seek; byte yang tertulis diambil per chunk."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+_ILLEGAL_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_XLSX_STATIC_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _xlsx_cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c><v>{value}</v></c>'
+    text = _ILLEGAL_XML_CHARS.sub('', str(value))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>'
+
+
+def stream_xlsx(header, rows, sheet_name='Data'):
+    """Menghasilkan file XLSX per chunk; sheet ditulis baris demi baris ke zip yang di-stream."""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, content in _XLSX_STATIC_PARTS.items():
+            zf.writestr(name, content)
+        zf.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(sheet_name[:31])}" sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>'
+        ))
+        yield sink.drain()
+
+        # force_zip64 karena ukuran sheet belum diketahui saat mulai ditulis
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(('<row>' + ''.join(_xlsx_cell(h) for h in header) + '</row>').encode('utf-8'))
+            chunk = []
+            for row in rows:
+                chunk.append('<row>' + ''.join(_xlsx_cell(v) for v in row) + '</row>')
+                if len(chunk) >= ROWS_PER_CHUNK:
+                    sheet.write(''.join(chunk).encode('utf-8'))
+                    chunk = []
+                    yield sink.drain()
+            if chunk:
+                sheet.write(''.join(chunk).encode('utf-8'))
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.drain()
+
+
+# --- DEFINISI DATASET ---
+
+def _format_value(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, time):
+        return value.strftime('%H:%M')
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if hasattr(value, 'value'):  # Enum seperti FacilityCondition
+        return value.value
+    return value
+
+
+def _date_filtered(stmt, date_column, start_date, end_date):
+    if start_date:
+        stmt = stmt.where(date_column >= start_date)
+    if end_date:
+        stmt = stmt.where(date_column <= end_date)
+    return stmt
+
+
+def _atc_personnel_names():
+    """Subquery berkorelasi: nama personel ATC on duty yang digabung dalam satu kolom."""
+    return (
+        sa.select(sa.func.group_concat(ATCPersonnel.name, '; '))
+        .select_from(atc_duty_association.join(ATCPersonnel))
+        .where(atc_duty_association.c.logbook_entry_id == LogbookEntry.id)
+        .scalar_subquery()
+    )
+
+
+def _logbook_rows(logbook_type, start_date, end_date):
+    stmt = (
+        sa.select(
+            LogbookEntry.id, LogbookEntry.log_date, LogbookEntry.shift, _atc_personnel_names(),
+            LogbookEntry.notam, User.username, LogbookEntry.created_at
+        )
+        .outerjoin(User, User.id == LogbookEntry.user_id)
+        .where(LogbookEntry.logbook_type == logbook_type)
+        .order_by(LogbookEntry.log_date, LogbookEntry.id)
+    )
+    stmt = _date_filtered(stmt, LogbookEntry.log_date, start_date, end_date)
+    yield from _stream_rows(stmt, start_date, end_date)
+
+
+def _operational_log_rows(logbook_type, start_date, end_date):
+    stmt = (
+        sa.select(
+            LogbookEntry.id, LogbookEntry.logbook_type, LogbookEntry.log_date, LogbookEntry.shift,
+            OperationalLog.event_time, OperationalLog.description, OperationalLog.remarks
+        )
+        .join(OperationalLog, OperationalLog.logbook_id == LogbookEntry.id)
+        .order_by(LogbookEntry.log_date, LogbookEntry.id, OperationalLog.event_time)
+    )
+    if logbook_type:
+        stmt = stmt.where(LogbookEntry.logbook_type == logbook_type)
+    stmt = _date_filtered(stmt, LogbookEntry.log_date, start_date, end_date)
+    yield from _stream_rows(stmt, start_date, end_date)
+
+
+def _atc_position_rows(logbook_type, start_date, end_date):
+    """Satu baris per slot posisi yang terisi: siapa, di posisi apa, pada rentang waktu mana."""
+    header_cols = [getattr(ATCPositionHeader, f'header_{i}') for i in range(1, 7)]
+    slot_cols = [getattr(ATCPosition, f'time_slot_{i}') for i in range(1, 7)]
+    stmt = (
+        sa.select(
+            LogbookEntry.id, LogbookEntry.logbook_type, LogbookEntry.log_date, LogbookEntry.shift,
+            ATCPosition.position_name, *header_cols, *slot_cols
+        )
+        .join(ATCPosition, ATCPosition.logbook_id == LogbookEntry.id)
+        .outerjoin(ATCPositionHeader, ATCPositionHeader.logbook_id == LogbookEntry.id)
+        .order_by(LogbookEntry.log_date, LogbookEntry.id, ATCPosition.id)
+    )
+    if logbook_type:
+        stmt = stmt.where(LogbookEntry.logbook_type == logbook_type)
+    stmt = _date_filtered(stmt, LogbookEntry.log_date, start_date, end_date)
+    for row in _stream_rows(stmt, start_date, end_date):
+        headers, slots = row[5:11], row[11:17]
+        for i in range(6):
+            if slots[i]:
+                yield row[:5] + [i + 1, headers[i], slots[i]]
+
+
+def _facility_status_rows(logbook_type, start_date, end_date):
+    twr = aliased(Facility)
+    app_fac = aliased(FacilityApp)
+    stmt = (
+        sa.select(
+            LogbookEntry.id, LogbookEntry.logbook_type, LogbookEntry.log_date, LogbookEntry.shift,
+            FacilityStatus.facility_id,
+            sa.func.coalesce(twr.category, app_fac.category),
+            sa.func.coalesce(twr.name, app_fac.name),
+            sa.func.coalesce(twr.remark, app_fac.remark),
+            FacilityStatus.condition, FacilityStatus.notes
+        )
+        .outerjoin(FacilityStatus, FacilityStatus.logbook_id == LogbookEntry.id)
+        .outerjoin(twr, sa.and_(FacilityStatus.facility_type == 'TWR', twr.id == FacilityStatus.facility_id))
+        .outerjoin(app_fac, sa.and_(FacilityStatus.facility_type == 'APP', app_fac.id == FacilityStatus.facility_id))
+        .order_by(LogbookEntry.log_date, shift_rank(LogbookEntry.shift), LogbookEntry.id)
+    )
+    if logbook_type:
+        stmt = stmt.where(LogbookEntry.logbook_type == logbook_type)
+    yield from _resolved_status_rows(stmt, LogbookEntry.log_date, start_date, end_date, condition_index=-2)
+
+
+def _cnsd_log_rows(airport_code, start_date, end_date):
+    personnel_names = (
+        sa.select(sa.func.group_concat(CNSDPersonnel.name, '; '))
+        .where(CNSDPersonnel.cnsd_logbook_id == CNSDLogbook.id)
+        .scalar_subquery()
+    )
+    activity_count = (
+        sa.select(sa.func.count(CNSDUraianKegiatan.id))
+        .where(CNSDUraianKegiatan.cnsd_logbook_id == CNSDLogbook.id)
+        .scalar_subquery()
+    )
+    stmt = (
+        sa.select(
+            CNSDLogbook.id, CNSDLogbook.airport, CNSDLogbook.log_date, CNSDLogbook.shift, personnel_names,
+            activity_count, User.username, CNSDLogbook.created_at
+        )
+        .outerjoin(User, User.id == CNSDLogbook.user_id)
+        .where(CNSDLogbook.airport == airport_code)
+        .order_by(CNSDLogbook.log_date, CNSDLogbook.id)
+    )
+    stmt = _date_filtered(stmt, CNSDLogbook.log_date, start_date, end_date)
+    yield from _stream_rows(stmt, start_date, end_date)
+
+
+def _cnsd_facility_status_rows(airport_code, start_date, end_date):
+    stmt = (
+        sa.select(
+            CNSDLogbook.id, CNSDLogbook.airport, CNSDLogbook.log_date, CNSDLogbook.shift,
+            CNSDFacilityStatus.cnsd_facility_id,
+            CNSDFacility.category, CNSDFacility.name, CNSDFacility.sub_name, CNSDFacilityStatus.condition
+        )
+        .outerjoin(CNSDFacilityStatus, CNSDFacilityStatus.cnsd_logbook_id == CNSDLogbook.id)
+        .outerjoin(CNSDFacility, CNSDFacility.id == CNSDFacilityStatus.cnsd_facility_id)
+        .where(CNSDLogbook.airport == airport_code)
+        .order_by(CNSDLogbook.log_date, shift_rank(CNSDLogbook.shift), CNSDLogbook.id)
+    )
+    yield from _resolved_status_rows(stmt, CNSDLogbook.log_date, start_date, end_date, condition_index=-1)
+
+
+def _cnsd_activity_rows(airport_code, start_date, end_date):
+    stmt = (
+        sa.select(
+            CNSDLogbook.id, CNSDLogbook.airport, CNSDLogbook.log_date, CNSDLogbook.shift,
+            CNSDUraianKegiatan.event_time, CNSDUraianKegiatan.description
+        )
+        .join(CNSDUraianKegiatan, CNSDUraianKegiatan.cnsd_logbook_id == CNSDLogbook.id)
+        .where(CNSDLogbook.airport == airport_code)
+        .order_by(CNSDLogbook.log_date, CNSDLogbook.id, CNSDUraianKegiatan.id)
+    )
+    stmt = _date_filtered(stmt, CNSDLogbook.log_date, start_date, end_date)
+    yield from _stream_rows(stmt, start_date, end_date)
+
+
+def _execute_sources(stmt, start_date, end_date):
+    """Hasil stmt per sumber, dibaca per batch (yield_per): arsip yang dijangkau rentang lebih dulu, lalu database hot."""
+    for archive in reversed(archives_in_range(start_date, end_date)):
+        with archive_session(archive) as archive_db:
+            yield archive_db.execute(stmt, execution_options={'yield_per': EXPORT_YIELD_PER})
+    yield db.session.execute(stmt, execution_options={'yield_per': EXPORT_YIELD_PER})
+
+
+def _stream_rows(stmt, start_date, end_date):
+    """Mengambil baris per batch lalu memformat nilainya."""
+    for result in _execute_sources(stmt, start_date, end_date):
+        for row in result:
+            yield [_format_value(value) for value in row]
+
+
+def _resolved_status_rows(stmt, date_column, start_date, end_date, condition_index):
+    """Kondisi lengkap setiap fasilitas per logbook dari baris perubahan (lihat app/facilitystatus.py).
+
+    stmt menghasilkan (id, tipe/bandara, tanggal, shift, facility_id, kolom fasilitas & kondisi...) urut
+    (tanggal, shift, id), dengan satu baris kosong untuk logbook tanpa perubahan; kondisi ada di
+    row[condition_index]. Rentang dibaca dari awal bulan start_date karena kondisi dibawa dari logbook
+    sebelumnya di bulan yang sama.
+    """
+    month_start = month_of(start_date) if start_date else None
+    stmt = _date_filtered(stmt, date_column, month_start, end_date)
+    for result in _execute_sources(stmt, month_start, end_date):
+        # Setiap sumber punya keyframe sendiri di awal bulannya, jadi kondisi tidak dibawa antar sumber
+        states = {}
+        for _, rows in groupby(result, key=lambda row: row[0]):
+            rows = list(rows)
+            log = rows[0][:4]
+            state = states.setdefault((log[1], month_of(log[2])), {})
+            for row in rows:
+                if row[4] is None:
+                    continue
+                if row[condition_index] is None:
+                    state.pop(row[4], None)
+                else:
+                    state[row[4]] = row[5:]
+            if start_date is None or log[2] >= start_date:
+                for facility_id in sorted(state):
+                    yield [_format_value(value) for value in (*log, *state[facility_id])]
+
+
+# (header kolom, fungsi generator baris, apakah dataset CNSD)
+DATASETS = {
+    'twr-logs': (
+        ['Log ID', 'Date', 'Shift', 'ATC on Duty', 'NOTAM', 'Created By', 'Created At'],
+        lambda scope, start, end: _logbook_rows('TWR', start, end), False
+    ),
+    'app-logs': (
+        ['Log ID', 'Date', 'Shift', 'ATC on Duty', 'NOTAM', 'Created By', 'Created At'],
+        lambda scope, start, end: _logbook_rows('APP', start, end), False
+    ),
+    'operational-logs': (
+        ['Log ID', 'Unit', 'Date', 'Shift', 'Time', 'Description', 'Remarks'],
+        _operational_log_rows, False
+    ),
+    'atc-positions': (
+        ['Log ID', 'Unit', 'Date', 'Shift', 'Position', 'Slot', 'Time', 'Personnel'],
+        _atc_position_rows, False
+    ),
+    'facility-statuses': (
+        ['Log ID', 'Unit', 'Date', 'Shift', 'Category', 'Facility', 'Remark', 'Condition', 'Notes'],
+        _facility_status_rows, False
+    ),
+    'cnsd-logs': (
+        ['Log ID', 'Airport', 'Date', 'Shift', 'Personnel', 'Activities', 'Created By', 'Created At'],
+        _cnsd_log_rows, True
+    ),
+    'cnsd-facility-statuses': (
+        ['Log ID', 'Airport', 'Date', 'Shift', 'Category', 'Facility', 'Sub Name', 'Condition'],
+        _cnsd_facility_status_rows, True
+    ),
+    'cnsd-activities': (
+        ['Log ID', 'Airport', 'Date', 'Shift', 'Time', 'Description'],
+        _cnsd_activity_rows, True
+    ),
+}
+
+# Werkzeug menambahkan charset=utf-8 sendiri untuk mimetype text/*
+EXPORT_FORMATS = {
+    'csv': ('text/csv', stream_csv),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', stream_xlsx),
+}
+
+
+@export_bp.route('/<string:dataset>.<string:fmt>')
+@login_required
+def export_dataset(dataset, fmt):
+    """Mengekspor dataset dalam rentang tanggal (?start_date=&end_date=) sebagai CSV/XLSX streaming."""
+    if dataset not in DATASETS or fmt not in EXPORT_FORMATS:
+        abort(404)
+    header, row_source, is_cnsd = DATASETS[dataset]
+    mimetype, writer = EXPORT_FORMATS[fmt]
+
+    try:
+        start_date = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() if request.args.get('start_date') else None
+        end_date = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() if request.args.get('end_date') else None
+    except ValueError:
+        abort(400)
+
+    if is_cnsd:
+        # Data CNSD hanya untuk bandara yang sudah dibuka dengan kata sandi
+        scope = request.args.get('airport') or session.get('unlocked_airport')
+        if not scope or session.get('unlocked_airport') != scope:
+            flash('Akses ditolak. Silakan masukkan kata sandi yang benar.', 'warning')
+            return redirect(url_for('main.dashboard_teknik'))
+    else:
+        scope = request.args.get('type') or None
+        if scope not in (None, 'TWR', 'APP'):
+            abort(400)
+
+    period = f"{start_date or 'awal'}_{end_date or 'akhir'}"
+    filename = f"{dataset}{'_' + scope if scope else ''}_{period}.{fmt}"
+    body = writer(header, row_source(scope, start_date, end_date))
+    if fmt == 'csv':
+        body = (chunk.encode('utf-8') for chunk in body)
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+
+@export_bp.route('/personnel-recap.<string:fmt>')
+@login_required
+def personnel_recap_export(fmt):
+    """Mengunduh matriks rekap personel (hari & jam per bulan) untuk rentang bulan yang sama dengan tab recap."""
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+    mimetype, writer = EXPORT_FORMATS[fmt]
+    start, end = recap_range_from_args(request.args, datetime.now())
+    months, rows = personnel_recap(start, end)
+
+    header = ['Personnel']
+    for year, month in months:
+        header += [f'{year:04d}-{month:02d} Days', f'{year:04d}-{month:02d} Hours']
+    header += ['Total Days', 'Total Hours']
+    body = writer(header, (
+        [row['name'], *(value for cell in row['months'] for value in (cell['days'], cell['hours'])),
+         row['days'], row['hours']]
+        for row in rows
+    ))
+    if fmt == 'csv':
+        body = (chunk.encode('utf-8') for chunk in body)
+    filename = f"personnel-recap_{start[0]:04d}-{start[1]:02d}_{end[0]:04d}-{end[1]:02d}.{fmt}"
+    return Response(body, mimetype=mimetype, headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+@export_bp.route('/facility-availability.<string:fmt>')
+@login_required
+def facility_availability_export(fmt):
+    """Mengunduh ketersediaan fasilitas satu bulan (?month=&year=) untuk ?type=TWR/APP atau ?airport= CNSD."""
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+    mimetype, writer = EXPORT_FORMATS[fmt]
+    today = datetime.now()
+    year = request.args.get('year', today.year, type=int)
+    month = request.args.get('month', today.month, type=int)
+    if not 1 <= month <= 12:
+        abort(404)
+
+    if request.args.get('airport'):
+        # Data CNSD hanya untuk bandara yang sudah dibuka dengan kata sandi
+        scope = request.args['airport']
+        if session.get('unlocked_airport') != scope:
+            flash('Akses ditolak. Silakan masukkan kata sandi yang benar.', 'warning')
+            return redirect(url_for('main.dashboard_teknik'))
+        family = 'cnsd'
+        facilities = {f.id: (f.category, f.name, f.sub_name) for f in reference_data()['cnsd_facilities'].get(scope, ())}
+    else:
+        scope = request.args.get('type', 'TWR')
+        if scope not in ('TWR', 'APP'):
+            abort(400)
+        family = 'operasi'
+        facilities = {f.id: (f.category, f.name, f.remark) for f in reference_data()['facilities'][scope]}
+
+    values = condition_values(family)
+    header = ['Category', 'Facility', 'Remark', *(str(value) for value in values), 'Reports', 'Availability %']
+    body = writer(header, (
+        [*facilities.get(row['facility_id'], ('', row['facility_id'], '')),
+         *(row['counts'].get(value, 0) for value in values), row['reports'], row['availability']]
+        for row in facility_availability(year, month, family, scope)
+    ))
+    if fmt == 'csv':
+        body = (chunk.encode('utf-8') for chunk in body)
+    filename = f"facility-availability_{scope}_{year:04d}-{month:02d}.{fmt}"
+    return Response(body, mimetype=mimetype, headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+@export_bp.route('/personal-logbooks.zip')
+@login_required
+def personal_logbooks_export():
+    """Mengunduh ZIP berisi logbook personal PDF seluruh personel ATC untuk bulan di tab personal."""
+    today = datetime.now()
+    year = request.args.get('personal_year', today.year, type=int)
+    month = request.args.get('personal_month', today.month, type=int)
+    if not 1 <= month <= 12:
+        abort(404)
+    buffer = io.BytesIO()
+    with measure('pdf'):
+        write_personal_logbooks_zip(buffer, year, month)
+    buffer.seek(0)
+    return send_file(buffer, mimetype='application/zip', as_attachment=True,
+                     download_name=f'personal_logbooks_{year:04d}-{month:02d}.zip')
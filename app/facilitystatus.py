@@ -0,0 +1,474 @@
+# app/facilitystatus.py
+
+from collections import defaultdict, namedtuple
+from datetime import date, datetime, timedelta
+
+import click
+import sqlalchemy as sa
+from flask.cli import with_appcontext
+
+from .models import (db, LogbookEntry, FacilityStatus, CNSDLogbook, CNSDFacilityStatus, FacilityCondition, SHIFT_ORDER,
+                     shift_rank)
+from .shardrouting import shard_engines, use_cnsd_shard
+
+# Satu jenis logbook beserta tabel kondisi fasilitasnya; logbook dikelompokkan per tipe (TWR/APP) atau per bandara.
+# fixed: kolom tabel status yang nilainya sama dengan kelompok logbook (facility_type = logbook_type)
+# unavailable: kondisi yang dihitung di kolom unserviceable_count logbook (fasilitas tidak tersedia)
+StatusFamily = namedtuple('StatusFamily', 'parent status fk facility group values fixed unavailable')
+OPERASI = StatusFamily(LogbookEntry, FacilityStatus, 'logbook_id', 'facility_id', 'logbook_type',
+                       ('condition', 'notes'), 'facility_type', FacilityCondition.UNSERVICEABLE)
+CNSD = StatusFamily(CNSDLogbook, CNSDFacilityStatus, 'cnsd_logbook_id', 'cnsd_facility_id', 'airport',
+                    ('condition',), None, 'Rusak')
+FAMILIES = (OPERASI, CNSD)
+# Jumlah id per DELETE ... WHERE id IN (...)
+DELETE_CHUNK = 500
+
+
+def family_of(log):
+    return OPERASI if isinstance(log, LogbookEntry) else CNSD
+
+
+def status_key(log):
+    """Posisi logbook dalam urutan rekonstruksi kondisi: (tanggal, peringkat shift, id)."""
+    return (log.log_date, shift_rank(log.shift), log.id)
+
+
+def month_of(log_date):
+    return log_date.replace(day=1)
+
+
+def _month_end(month):
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+def _value(family, condition, notes=None):
+    """Nilai yang dibandingkan antar logbook: (kondisi, catatan) untuk operasi, (kondisi,) untuk CNSD."""
+    if family is OPERASI:
+        if condition is not None and not isinstance(condition, FacilityCondition):
+            condition = FacilityCondition(condition)
+        return (condition, notes or None)
+    return (condition,)
+
+
+def _cleared(family):
+    return (None,) * len(family.values)
+
+
+# --- PENULISAN BARIS PERUBAHAN ---
+
+def rewrite_month(session, family, group, month, changed=None, states=None, removed=(), counts_only=False):
+    """Menyusun ulang baris perubahan kondisi fasilitas satu bulan untuk satu tipe logbook / bandara.
+
+    Logbook pertama di bulan itu menyimpan kondisi lengkap (keyframe), logbook berikutnya hanya fasilitas yang
+    kondisinya berbeda dari logbook sebelumnya; fasilitas yang dikosongkan ditulis dengan kondisi None.
+
+    changed: {log_id: posisi lama (status_key) atau None untuk logbook baru} untuk logbook yang baru ditulis atau
+    dipindah; kondisi lengkap barunya diambil dari states, dari posisi lamanya di bulan ini, atau dari baris
+    miliknya sendiri (impor massal menulis kondisi lengkap lalu memanggil fungsi ini). removed: logbook yang dikeluarkan dari urutan (dipindah ke arsip).
+    Logbook lain tetap mempunyai kondisi lengkap yang sama; hanya baris yang berbeda yang ditulis atau dihapus.
+    Bulan posisi lama harus diproses sebelum bulan posisi baru. Mengembalikan {log_id: perubahan} untuk changed.
+    Jumlah fasilitas tidak tersedia (unserviceable_count) setiap logbook bulan itu ikut disesuaikan dengan
+    kondisi lengkapnya, karena perubahan satu logbook terbawa ke logbook-logbook berikutnya. counts_only: hanya
+    jumlah itu yang ditulis, baris kondisi dibiarkan (migrasi skema lama saat startup).
+    """
+    changed, states = changed or {}, states or {}
+    parent, status = family.parent, family.status
+    fk, facility = getattr(status, family.fk), getattr(status, family.facility)
+
+    logs = session.execute(
+        sa.select(parent.id, parent.log_date, parent.shift, parent.unserviceable_count)
+        .where(getattr(parent, family.group) == group, parent.log_date >= month, parent.log_date <= _month_end(month))
+    ).all()
+    new_keys = {log_id: (log_date, shift_rank(shift), log_id) for log_id, log_date, shift, _ in logs}
+    stored_counts = {log_id: count for log_id, _, _, count in logs}
+    old_keys = {log_id: key for log_id, key in new_keys.items() if log_id not in changed}
+    old_keys.update({log_id: key for log_id, key in changed.items() if key and month_of(key[0]) == month})
+
+    rows = defaultdict(dict)
+    for row in session.execute(
+        sa.select(status.id, fk, facility, *(getattr(status, name) for name in family.values))
+        .where(fk.in_([*new_keys, *old_keys]))
+    ):
+        rows[row[1]][row[2]] = (row[0], _value(family, *row[3:]))
+
+    # Kondisi lengkap setiap logbook menurut urutan sebelum perubahan
+    full, state = {}, {}
+    for log_id in sorted(old_keys, key=old_keys.get):
+        for facility_id, (_, value) in rows[log_id].items():
+            if value[0] is None:
+                state.pop(facility_id, None)
+            else:
+                state[facility_id] = value
+        full[log_id] = dict(state)
+    for log_id in changed:
+        # Logbook yang hanya dipindah (tanpa states) tetap memakai kondisi lengkap di posisi lamanya
+        if log_id in new_keys and (log_id in states or log_id not in full):
+            full[log_id] = states[log_id] if log_id in states else {
+                facility_id: value for facility_id, (_, value) in rows[log_id].items() if value[0] is not None
+            }
+
+    inserts, updates, deletes, deltas, counts = [], [], [], {}, []
+    fixed = {family.fixed: group} if family.fixed else {}
+    previous = {}
+    for log_id in sorted(new_keys.keys() - set(removed), key=new_keys.get):
+        target = full[log_id]
+        count = sum(1 for value in target.values() if value[0] == family.unavailable)
+        if count != stored_counts[log_id]:
+            counts.append({'log_id': log_id, 'count': count})
+        delta = {facility_id: value for facility_id, value in target.items() if previous.get(facility_id) != value}
+        delta.update({facility_id: _cleared(family) for facility_id in previous if facility_id not in target})
+        existing = rows.get(log_id, {})
+        for facility_id, value in delta.items():
+            row_id, current = existing.pop(facility_id, (None, None))
+            if row_id is None:
+                inserts.append({family.fk: log_id, family.facility: facility_id, **fixed,
+                                **dict(zip(family.values, value))})
+            elif current != value:
+                updates.append({'id': row_id, **dict(zip(family.values, value))})
+        deletes.extend(row_id for row_id, _ in existing.values())
+        if log_id in changed:
+            deltas[log_id] = delta
+        previous = target
+
+    if counts_only:
+        inserts, updates, deletes = [], [], []
+    if inserts:
+        session.execute(sa.insert(status), inserts)
+    if updates:
+        session.execute(sa.update(status), updates)
+    for start in range(0, len(deletes), DELETE_CHUNK):
+        session.execute(sa.delete(status).where(status.id.in_(deletes[start:start + DELETE_CHUNK]))
+                        .execution_options(synchronize_session=False))
+    if counts:
+        table = parent.__table__
+        session.execute(table.update().where(table.c.id == sa.bindparam('log_id'))
+                        .values(unserviceable_count=sa.bindparam('count')), counts)
+    return deltas
+
+
+def facility_state(session, family, group, key):
+    """Kondisi lengkap {facility_id: nilai} pada posisi key, direkonstruksi dari baris perubahan bulan itu."""
+    parent, status = family.parent, family.status
+    earlier = sa.tuple_(parent.log_date, shift_rank(parent.shift), parent.id) <= sa.tuple_(*key)
+    state = {}
+    for row in session.execute(
+        sa.select(getattr(status, family.facility), *(getattr(status, name) for name in family.values))
+        .join(parent, parent.id == getattr(status, family.fk))
+        .where(getattr(parent, family.group) == group, parent.log_date >= month_of(key[0]), earlier)
+        .order_by(parent.log_date, shift_rank(parent.shift), parent.id)
+    ):
+        value = _value(family, *row[1:])
+        if value[0] is None:
+            state.pop(row[0], None)
+        else:
+            state[row[0]] = value
+    return state
+
+
+def save_facility_statuses(log, conditions=None, notes=None, previous_key=None):
+    """Menyimpan kondisi lengkap fasilitas sebuah logbook (dipanggil setelah tanggal/shift baru di-set).
+
+    conditions: {facility_id: kondisi} (kosong = fasilitas tanpa kondisi), notes: {facility_id: catatan} untuk
+    logbook operasi. previous_key: status_key(log) sebelum diedit, None untuk logbook baru. Tanpa conditions,
+    kondisi lengkap di posisi lama dipertahankan (logbook hanya dipindah ke tanggal/shift lain).
+    """
+    family, session = family_of(log), db.session
+    group = getattr(log, family.group)
+    if conditions is None:
+        # Tanggal/shift baru belum boleh ter-flush: kondisi dibaca dari posisi lama
+        with session.no_autoflush:
+            state = facility_state(session, family, group, previous_key) if previous_key else {}
+    else:
+        notes = notes or {}
+        state = {facility_id: _value(family, condition, notes.get(facility_id))
+                 for facility_id, condition in conditions.items() if condition}
+    session.flush()
+
+    months = [month_of(previous_key[0])] if previous_key else []
+    months.append(month_of(log.log_date))
+    for month in dict.fromkeys(months):
+        deltas = rewrite_month(session, family, group, month, {log.id: previous_key}, {log.id: state})
+    # Perubahan kondisi logbook ini ikut disiarkan ke dashboard (lihat app/live.py)
+    session.info.setdefault('facility_status_deltas', {})[family.parent, log.id] = {
+        facility_id: value[0] for facility_id, value in deltas.get(log.id, {}).items()
+    }
+
+
+# --- LOGBOOK TERAKHIR (ISIAN AWAL FORM CREATE) ---
+
+def _latest_log_stmt(family):
+    """Logbook di tanggal terakhir satu tipe/bandara; max(log_date) dan barisnya dibaca dari indeks *_latest."""
+    parent = family.parent
+    group_column = getattr(parent, family.group)
+    last_date = sa.select(sa.func.max(parent.log_date)).where(group_column == sa.bindparam('group')).scalar_subquery()
+    return sa.select(parent.log_date, parent.shift, parent.id).where(group_column == sa.bindparam('group'),
+                                                                      parent.log_date == last_date)
+
+
+LATEST_LOG_STMTS = {family.parent: _latest_log_stmt(family) for family in FAMILIES}
+
+
+def latest_log(session, family, group):
+    """(log_date, shift, id) logbook terakhir satu tipe/bandara menurut status_key, None jika belum ada.
+
+    Hanya tanggal terakhir yang dibaca (biasanya 1-3 logbook), jadi biayanya tetap berapa pun panjang riwayat.
+    """
+    rows = session.execute(LATEST_LOG_STMTS[family.parent], {'group': group}).all()
+    return max(rows, key=lambda row: (row.log_date, shift_rank(row.shift), row.id), default=None)
+
+
+def latest_facility_state(session, family, group):
+    """(logbook terakhir, kondisi lengkapnya {facility_id: nilai}); (None, {}) jika belum ada logbook."""
+    log = latest_log(session, family, group)
+    if log is None:
+        return None, {}
+    return log, facility_state(session, family, group, (log.log_date, shift_rank(log.shift), log.id))
+
+
+def split_month_for_archive(cutoff):
+    """Menjadikan logbook pertama sejak cutoff keyframe di bulannya sebelum logbook sebelum cutoff diarsipkan.
+
+    Database hot dan arsip masing-masing tetap bisa merekonstruksi kondisi lengkap tanpa saling membaca.
+    """
+    if cutoff.day == 1:
+        return
+    month = month_of(cutoff)
+    for family in FAMILIES:
+        parent = family.parent
+        for airport_code in [None, *(shard_engines() if family is CNSD else ())]:
+            with use_cnsd_shard(airport_code):
+                logs = db.session.execute(
+                    sa.select(getattr(parent, family.group), parent.id)
+                    .where(parent.log_date >= month, parent.log_date < cutoff)
+                ).all()
+                removed = defaultdict(list)
+                for group, log_id in logs:
+                    removed[group].append(log_id)
+                for group, log_ids in removed.items():
+                    rewrite_month(db.session, family, group, month, removed=log_ids)
+                db.session.commit()
+
+
+# --- MIGRASI: KOLOM KODE & PEMADATAN ---
+
+def _legacy_code_case(table):
+    """CASE yang memetakan teks kondisi lama ke kode SMALLINT; teks yang tidak dikenal menjadi NULL.
+
+    Kolom Enum lama menyimpan nilai anggota FacilityCondition (mis. 'G', '5'); nama anggota (mis. 'READABLE_5')
+    hanya cadangan. Kolom CNSD menyimpan teksnya.
+    """
+    values = table.c.condition.type.values
+    whens = [f"WHEN '{getattr(value, 'value', value)}' THEN {code}" for code, value in enumerate(values, start=1)]
+    whens += [f"WHEN '{value.name}' THEN {code}" for code, value in enumerate(values, start=1)
+              if getattr(value, 'name', value) != getattr(value, 'value', value)]
+    return f'CASE CAST("condition" AS TEXT) {" ".join(whens)} END'
+
+
+def _needs_upgrade(conn, table):
+    declared = {row[1]: row[2] for row in conn.exec_driver_sql(f'PRAGMA main.table_info("{table.name}")')}
+    return bool(declared) and declared.get('condition', '').upper() != 'SMALLINT'
+
+
+def upgrade_condition_table(conn, table):
+    """Membangun ulang tabel status yang kolom kondisinya masih teks (skema lama) menjadi SMALLINT berkode.
+
+    SQLite tidak bisa mengubah tipe kolom, dan kode angka yang ditulis ke kolom teks akan tersimpan sebagai
+    teks ('1'), jadi tabel lama harus dibangun ulang sebelum ada penulisan. Mengembalikan True jika diubah.
+    Teks kondisi yang tidak dikenal membatalkan migrasi (ValueError) sebelum tabel disentuh.
+    """
+    if not _needs_upgrade(conn, table):
+        return False
+    unknown = [row[0] for row in conn.exec_driver_sql(
+        f'SELECT DISTINCT "condition" FROM main."{table.name}" WHERE ({_legacy_code_case(table)}) IS NULL')]
+    if unknown:
+        raise ValueError(f"Kondisi fasilitas tidak dikenal di {table.name}: {unknown!r}; migrasi dibatalkan.")
+    legacy = f'{table.name}_legacy'
+    columns = [f'"{column.name}"' for column in table.columns]
+    selected = [_legacy_code_case(table) if column.name == 'condition' else f'"{column.name}"'
+                for column in table.columns]
+    conn.exec_driver_sql(f'ALTER TABLE main."{table.name}" RENAME TO "{legacy}"')
+    table.create(conn)
+    if table.dialect_options['sqlite']['autoincrement']:
+        # Rentang id shard (sqlite_sequence) ikut dipertahankan
+        conn.exec_driver_sql('INSERT INTO main.sqlite_sequence (name, seq) SELECT ?, seq FROM main.sqlite_sequence '
+                             'WHERE name = ?', (table.name, legacy))
+    conn.exec_driver_sql(f'INSERT INTO main."{table.name}" ({", ".join(columns)}) '
+                         f'SELECT {", ".join(selected)} FROM main."{legacy}"')
+    conn.exec_driver_sql(f'DROP TABLE main."{legacy}"')
+    conn.commit()
+    return True
+
+
+def upgrade_condition_columns(engine, echo=print):
+    """Memastikan tabel status di satu database (hot, shard, atau arsip) memakai kolom kondisi berkode.
+
+    Sebelum tabel pertama dibangun ulang, database disalin utuh dengan VACUUM INTO.
+    """
+    with engine.connect() as conn:
+        if not any(_needs_upgrade(conn, family.status.__table__) for family in FAMILIES):
+            return
+        backup_path = f"{engine.url.database}.{datetime.now():%Y%m%d%H%M%S}.bak"
+        conn.exec_driver_sql('VACUUM INTO ?', (backup_path,))
+        for family in FAMILIES:
+            if upgrade_condition_table(conn, family.status.__table__):
+                echo(f"Kolom kondisi {family.status.__tablename__} ({engine.url.database}) diubah ke kode SMALLINT "
+                     f"(cadangan di {backup_path}); jalankan 'flask compact-facility-statuses' untuk membuang "
+                     f"kondisi yang berulang.")
+
+
+def add_unserviceable_count_columns(engine):
+    """Menambah kolom unserviceable_count ke tabel logbook skema lama; True jika ditambah (isinya perlu dihitung)."""
+    added = False
+    with engine.connect() as conn:
+        for family in FAMILIES:
+            table = family.parent.__table__
+            declared = {row[1] for row in conn.exec_driver_sql(f'PRAGMA main.table_info("{table.name}")')}
+            if declared and 'unserviceable_count' not in declared:
+                conn.exec_driver_sql(f'ALTER TABLE main."{table.name}" '
+                                     f'ADD COLUMN unserviceable_count INTEGER NOT NULL DEFAULT 0')
+                added = True
+        conn.commit()
+    return added
+
+
+def _untrimmed_shift_rank(shift):
+    """Peringkat shift lama: shift dengan spasi di tepi (mis. 'PAGI ') diurutkan setelah Malam."""
+    shift = (shift or '').upper()
+    return SHIFT_ORDER.index(shift) + 1 if shift in SHIFT_ORDER else len(SHIFT_ORDER) + 1
+
+
+def trim_padded_shifts(session):
+    """Merapikan shift berspasi di tepi di satu database; mengembalikan jumlah logbook yang dirapikan.
+
+    Baris perubahan bulan itu disusun menurut urutan lama (shift berspasi setelah Malam), sedangkan shift_rank
+    kini mengabaikan spasi: setiap bulan yang terkena ditulis ulang dari kondisi lengkap di urutan lama ke urutan
+    baru, lalu shift-nya dirapikan agar langkah ini tidak berulang. Kondisi lengkap setiap logbook tidak berubah.
+    """
+    trimmed = 0
+    for family in FAMILIES:
+        parent = family.parent
+        group_column = getattr(parent, family.group)
+        padded = parent.shift != sa.func.trim(parent.shift)
+        months = session.execute(
+            sa.select(group_column, sa.func.strftime('%Y-%m-01', parent.log_date)).where(padded).distinct()
+        ).all()
+        for group, month in months:
+            month = date.fromisoformat(month)
+            logs = session.execute(
+                sa.select(parent.id, parent.log_date, parent.shift)
+                .where(group_column == group, parent.log_date >= month, parent.log_date <= _month_end(month))
+            ).all()
+            rewrite_month(session, family, group, month,
+                          {log_id: (log_date, _untrimmed_shift_rank(shift), log_id) for log_id, log_date, shift in logs})
+        trimmed += session.execute(sa.update(parent).where(padded).values(shift=sa.func.trim(parent.shift))
+                                   .execution_options(synchronize_session=False)).rowcount
+    return trimmed
+
+
+def add_latest_state_indexes(engine):
+    """Membuat indeks logbook terakhir dan indeks fk tabel kondisi di database lama (create_all tidak menambah
+    indeks ke tabel yang sudah ada)."""
+    with engine.connect() as conn:
+        existing = set(sa.inspect(conn).get_table_names())
+        for table in [table for family in FAMILIES for table in (family.parent.__table__, family.status.__table__)]:
+            if table.name in existing:
+                for index in table.indexes:
+                    index.create(conn, checkfirst=True)
+        conn.commit()
+
+
+def init_facility_statuses():
+    """Dipanggil saat startup (di dalam app context) setelah database hot dan shard CNSD siap."""
+    from .archive import archive_path, archives_in_range, archive_session
+
+    for engine in [db.engine, *shard_engines().values()]:
+        upgrade_condition_columns(engine)
+        add_latest_state_indexes(engine)
+    for airport_code in [None, *shard_engines()]:
+        with use_cnsd_shard(airport_code):
+            if trimmed := trim_padded_shifts(db.session):
+                print(f"Shift berspasi di tepi dirapikan: {trimmed} logbook ({airport_code or 'database hot'}).")
+            db.session.commit()
+    # Jumlah U/S logbook lama dihitung dari kondisi lengkapnya; baris kondisi tidak diubah (pemadatan hanya
+    # lewat `flask compact-facility-statuses`)
+    for airport_code, engine in [(None, db.engine), *shard_engines().items()]:
+        if add_unserviceable_count_columns(engine):
+            with use_cnsd_shard(airport_code):
+                fill_unserviceable_counts(db.session)
+                db.session.commit()
+            print(f"Jumlah fasilitas U/S logbook diisi ({engine.url.database}).")
+    for archive in archives_in_range():
+        engine = sa.create_engine('sqlite:///' + archive_path(archive.filename))
+        upgrade_condition_columns(engine)
+        add_latest_state_indexes(engine)
+        counts_added = add_unserviceable_count_columns(engine)
+        with archive_session(archive, commit=True) as session:
+            if trimmed := trim_padded_shifts(session):
+                print(f"Shift berspasi di tepi dirapikan: {trimmed} logbook (arsip {archive.year}).")
+            if counts_added:
+                fill_unserviceable_counts(session)
+        if counts_added:
+            print(f"Jumlah fasilitas U/S logbook diisi (arsip {archive.year}).")
+        engine.dispose()
+
+
+def _months(session, family):
+    """(kelompok, awal bulan) setiap bulan yang punya logbook di database ini."""
+    parent = family.parent
+    months = session.execute(
+        sa.select(getattr(parent, family.group), sa.func.strftime('%Y-%m-01', parent.log_date))
+        .group_by(getattr(parent, family.group), sa.func.strftime('%Y-%m-01', parent.log_date))
+    ).all()
+    return [(group, date.fromisoformat(month)) for group, month in months]
+
+
+def compact_facility_statuses(session, echo=print):
+    """Menulis ulang semua bulan di satu database sebagai keyframe + perubahan; mengembalikan (baris awal, akhir)."""
+    counts = [0, 0]
+    for family in FAMILIES:
+        status = family.status
+        counts[0] += session.execute(sa.select(sa.func.count(status.id))).scalar()
+        for group, month in _months(session, family):
+            rewrite_month(session, family, group, month)
+        counts[1] += session.execute(sa.select(sa.func.count(status.id))).scalar()
+    return counts
+
+
+def fill_unserviceable_counts(session):
+    """Mengisi unserviceable_count semua logbook di satu database tanpa mengubah baris kondisinya."""
+    for family in FAMILIES:
+        for group, month in _months(session, family):
+            rewrite_month(session, family, group, month, counts_only=True)
+
+
+@click.command('compact-facility-statuses')
+@click.option('--archives', 'include_archives', is_flag=True, help='Ikut memadatkan database arsip per tahun.')
+@click.option('--vacuum', is_flag=True, help='VACUUM setiap database setelah dipadatkan agar ukuran file menyusut.')
+@with_appcontext
+def compact_facility_statuses_command(include_archives, vacuum):
+    """Memadatkan kondisi fasilitas: hanya kondisi yang berubah dari logbook sebelumnya yang disimpan."""
+    from .archive import archive_path, archives_in_range, archive_session
+
+    engines = [db.engine, *shard_engines().values()]
+    for airport_code in [None, *shard_engines()]:
+        with use_cnsd_shard(airport_code):
+            before, after = compact_facility_statuses(db.session)
+            db.session.commit()
+        click.echo(f"{airport_code or 'Database hot'}: {before} -> {after} baris kondisi fasilitas.")
+
+    archive_engines = []
+    if include_archives:
+        for archive in archives_in_range():
+            engine = sa.create_engine('sqlite:///' + archive_path(archive.filename))
+            archive_engines.append(engine)
+            upgrade_condition_columns(engine, echo=click.echo)
+            with archive_session(archive, commit=True) as session:
+                before, after = compact_facility_statuses(session)
+            click.echo(f"Arsip {archive.year}: {before} -> {after} baris kondisi fasilitas.")
+
+    for engine in [*engines, *archive_engines]:
+        if vacuum:
+            with engine.connect() as conn:
+                conn.exec_driver_sql('VACUUM')
+    for engine in archive_engines:
+        engine.dispose()
@@ -0,0 +1,462 @@
+# app/importer.py
+
+import csv
+import json
+import os
+import re
+import time as time_module
+from collections import defaultdict
+from datetime import datetime
+
+import click
+import sqlalchemy as sa
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from flask import current_app
+from flask.cli import with_appcontext
+
+from .models import (db, User, LogbookEntry, ATCPersonnel, ATCPosition, ATCPositionHeader, Facility, FacilityApp,
+                     FacilityStatus, FacilityCondition, OperationalLog, CNSDLogbook, CNSDPersonnel, CNSDFacility,
+                     CNSDFacilityStatus, CNSDUraianKegiatan, ImportCheckpoint, CNSD_CONDITIONS, atc_duty_association)
+from .facilitystatus import OPERASI, CNSD, month_of, rewrite_month
+from .dutytime import refresh_duty_intervals
+from .snapshot import mark_report_months
+from .sharding import cnsd_bind, next_shard_id, shard_engines
+from .shardrouting import use_cnsd_shard
+from .textstore import intern_rows
+
+# Posisi ATC yang valid untuk setiap tipe logbook (sama dengan form create/edit)
+ATC_POSITIONS = {
+    'TWR': ['Controller', 'Supervisor', 'Rest'],
+    'APP': [
+        "SUPERVISOR", "CONTROLLER RADAR 123.4 Mhz", "ASSISTANCE RADAR 123.4 Mhz",
+        "CONTROLLER RADAR 120.2 Mhz", "ASSISTANCE RADAR 120.2 Mhz", "REST"
+    ],
+}
+DEFAULT_BATCH_SIZE = 2000
+
+
+class ImportRecordError(ValueError):
+    """Record impor tidak valid; pesan berisi alasan yang bisa diperbaiki di file sumber."""
+
+
+def _normalize(name):
+    return re.sub(r'\s+', ' ', (name or '').strip()).casefold()
+
+
+# --- PEMBACA FILE SUMBER ---
+
+def read_json_records(path):
+    """Membaca array JSON atau JSON Lines (satu logbook per baris)."""
+    with open(path, encoding='utf-8') as f:
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        f.seek(0)
+        if first == '[':
+            yield from json.load(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def read_csv_records(path):
+    """Membaca CSV satu baris per logbook.
+
+    Kolom: kind, airport, log_date, shift, notam, personnel (dipisah ';'),
+    header:1..6, position:<nama posisi>:1..6, dan facility:<nama fasilitas>.
+    """
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            record = {
+                'kind': row.get('kind'),
+                'airport': row.get('airport') or None,
+                'log_date': row.get('log_date'),
+                'shift': row.get('shift'),
+                'notam': row.get('notam') or None,
+                'personnel': [p.strip() for p in (row.get('personnel') or '').split(';') if p.strip()],
+                'position_headers': [row.get(f'header:{i}') or None for i in range(1, 7)],
+                'positions': {},
+                'facilities': {},
+            }
+            for column, value in row.items():
+                if not column or not value:
+                    continue
+                if column.startswith('facility:'):
+                    record['facilities'][column[len('facility:'):]] = value.strip()
+                elif column.startswith('position:'):
+                    position_name, slot = column[len('position:'):].rsplit(':', 1)
+                    record['positions'].setdefault(position_name, [None] * 6)[int(slot) - 1] = value.strip()
+            yield record
+
+
+# --- RESOLUSI DATA REFERENSI ---
+
+class ReferenceLookup:
+    """Memetakan nama fasilitas dan personel dari file sumber ke id di database (dimuat sekali)."""
+
+    def __init__(self):
+        self.facilities = {
+            'TWR': self._facility_keys(Facility.query.all(), 'remark'),
+            'APP': self._facility_keys(FacilityApp.query.all(), 'remark'),
+        }
+        for airport_code in current_app.config['AIRPORT_PASSWORDS']:
+            self.facilities[('CNSD', airport_code)] = self._facility_keys(
+                CNSDFacility.query.filter_by(airport_code=airport_code).all(), 'sub_name')
+        self.personnel = {_normalize(p.name): p for p in ATCPersonnel.query.all()}
+
+    @staticmethod
+    def _facility_keys(facilities, detail_attr):
+        """Kunci 'NAMA [detail]' selalu tersedia; 'NAMA' saja hanya jika tidak ambigu."""
+        keys = {}
+        name_counts = {}
+        for f in facilities:
+            name_counts[_normalize(f.name)] = name_counts.get(_normalize(f.name), 0) + 1
+        for f in facilities:
+            detail = getattr(f, detail_attr)
+            keys[_normalize(f'{f.name} [{detail or ""}]')] = f.id
+            if name_counts[_normalize(f.name)] == 1:
+                keys[_normalize(f.name)] = f.id
+        return keys
+
+    def facility_id(self, scope, name):
+        facility_id = self.facilities[scope].get(_normalize(name))
+        if facility_id is None:
+            raise ImportRecordError(f"Unknown facility '{name}' for {scope if isinstance(scope, str) else scope[1]}.")
+        return facility_id
+
+    def person(self, name):
+        person = self.personnel.get(_normalize(name))
+        if person is None:
+            raise ImportRecordError(f"Unknown ATC personnel '{name}'.")
+        return person
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(str(value).strip(), '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ImportRecordError(f"Invalid log_date '{value}', expected YYYY-MM-DD.")
+
+
+def _parse_time(value):
+    try:
+        return datetime.strptime(str(value).strip(), '%H:%M').time()
+    except (TypeError, ValueError):
+        raise ImportRecordError(f"Invalid time '{value}', expected HH:MM.")
+
+
+def _facility_items(record):
+    """Fasilitas boleh ditulis sebagai {nama: kondisi} atau [{facility, condition, notes}]."""
+    facilities = record.get('facilities') or {}
+    if isinstance(facilities, dict):
+        return [(name, condition, None) for name, condition in facilities.items()]
+    return [(item.get('facility'), item.get('condition'), item.get('notes')) for item in facilities]
+
+
+# --- VALIDASI & KONVERSI RECORD ---
+
+def build_operasi_rows(record, refs, user_id):
+    """Memvalidasi record TWR/APP dan menghasilkan baris per tabel (tanpa id)."""
+    kind = record['kind']
+    if not str(record.get('shift') or '').strip():
+        raise ImportRecordError('Missing shift.')
+    rows = {
+        'log': {'logbook_type': kind, 'log_date': _parse_date(record.get('log_date')), 'shift': str(record['shift']).strip(),
+                'notam': record.get('notam'), 'user_id': user_id},
+        'duty': sorted({refs.person(name).id for name in record.get('personnel') or []}),
+        'header': None, 'positions': [], 'statuses': [], 'operational_logs': [],
+    }
+
+    headers = list(record.get('position_headers') or [])
+    if any(headers):
+        rows['header'] = {f'header_{i}': (headers[i - 1] if i <= len(headers) else None) for i in range(1, 7)}
+
+    positions = record.get('positions') or {}
+    valid_positions = {_normalize(p): p for p in ATC_POSITIONS[kind]}
+    for position_name, slots in positions.items():
+        canonical = valid_positions.get(_normalize(position_name))
+        if canonical is None:
+            raise ImportRecordError(f"Unknown {kind} position '{position_name}'.")
+        row = {'position_name': canonical}
+        for i in range(1, 7):
+            name = slots[i - 1] if i <= len(slots) else None
+            row[f'time_slot_{i}'] = refs.person(name).name if name else None
+        rows['positions'].append(row)
+
+    seen = set()
+    for name, condition, notes in _facility_items(record):
+        facility_id = refs.facility_id(kind, name)
+        if facility_id in seen:
+            raise ImportRecordError(f"Facility '{name}' is listed twice.")
+        seen.add(facility_id)
+        try:
+            condition = FacilityCondition(str(condition).strip())
+        except ValueError:
+            raise ImportRecordError(f"Invalid condition '{condition}' for facility '{name}'.")
+        rows['statuses'].append({'facility_id': facility_id, 'facility_type': kind,
+                                 'condition': condition, 'notes': notes or None})
+
+    for op in record.get('operational_logs') or []:
+        if not op.get('description'):
+            raise ImportRecordError('Operational log without description.')
+        rows['operational_logs'].append({'event_time': _parse_time(op.get('time')),
+                                         'description': op['description'], 'remarks': op.get('remarks') or None})
+    return rows
+
+
+def build_cnsd_rows(record, refs, user_id):
+    """Memvalidasi record CNSD dan menghasilkan baris per tabel (tanpa id)."""
+    airport_code = record.get('airport')
+    if airport_code not in current_app.config['AIRPORT_PASSWORDS']:
+        raise ImportRecordError(f"Unknown airport '{airport_code}'.")
+    if not str(record.get('shift') or '').strip():
+        raise ImportRecordError('Missing shift.')
+    rows = {
+        'log': {'airport': airport_code, 'log_date': _parse_date(record.get('log_date')),
+                'shift': str(record['shift']).strip(), 'user_id': user_id},
+        'personnel': [{'name': name.strip()} for name in record.get('personnel') or [] if name and name.strip()],
+        'statuses': [], 'activities': [],
+    }
+    seen = set()
+    for name, condition, _notes in _facility_items(record):
+        facility_id = refs.facility_id(('CNSD', airport_code), name)
+        if facility_id in seen:
+            raise ImportRecordError(f"Facility '{name}' is listed twice.")
+        seen.add(facility_id)
+        if condition not in CNSD_CONDITIONS:
+            raise ImportRecordError(f"Invalid condition '{condition}' for facility '{name}'.")
+        rows['statuses'].append({'cnsd_facility_id': facility_id, 'condition': condition})
+    for activity in record.get('activities') or []:
+        if not activity.get('time') or not activity.get('description'):
+            raise ImportRecordError('Activity needs both time and description.')
+        rows['activities'].append({'event_time': str(activity['time']), 'description': activity['description']})
+    return rows
+
+
+# --- PENULISAN BATCH ---
+
+def _next_id(model):
+    next_id = (db.session.execute(sa.select(sa.func.max(model.id))).scalar() or 0) + 1
+    # Di shard CNSD, id baru tidak boleh keluar dari rentang id bandaranya
+    return max(next_id, next_shard_id(model))
+
+
+def _insert_all(inserts):
+    total = 0
+    for table, table_rows in inserts.items():
+        if table_rows:
+            db.session.execute(sa.insert(table), table_rows)
+            total += len(table_rows)
+    return total
+
+
+def _compact_statuses(family, logs):
+    """Kondisi lengkap yang baru diimpor dipadatkan menjadi keyframe + perubahan per bulan (lihat rewrite_month)."""
+    new_logs = defaultdict(list)
+    for log in logs:
+        new_logs[log[family.group], month_of(log['log_date'])].append(log['id'])
+    for (group, month), log_ids in sorted(new_logs.items()):
+        deltas = rewrite_month(db.session, family, group, month, dict.fromkeys(log_ids))
+        # Sama seperti save_facility_statuses: kondisi yang berubah ikut disiarkan bila logbook ditandai live
+        db.session.info.setdefault('facility_status_deltas', {}).update({
+            (family.parent, log_id): {facility_id: value[0] for facility_id, value in delta.items()}
+            for log_id, delta in deltas.items()
+        })
+
+
+def _cnsd_inserts(cnsd_batch):
+    log_id = _next_id(CNSDLogbook)
+    logs, personnel, statuses, activities = [], [], [], []
+    for rows in cnsd_batch:
+        logs.append(dict(rows['log'], id=log_id))
+        personnel.extend(dict(p, cnsd_logbook_id=log_id) for p in rows['personnel'])
+        statuses.extend(dict(s, cnsd_logbook_id=log_id) for s in rows['statuses'])
+        activities.extend(dict(a, cnsd_logbook_id=log_id) for a in rows['activities'])
+        log_id += 1
+    return {
+        CNSDLogbook.__table__: logs, CNSDPersonnel.__table__: personnel,
+        CNSDFacilityStatus.__table__: statuses, CNSDUraianKegiatan.__table__: activities,
+    }
+
+
+def write_batch(operasi_batch, cnsd_batch):
+    """Menulis satu batch dengan executemany per tabel; id dialokasikan di muka agar anak bisa ditautkan.
+
+    Mengembalikan (jumlah baris, id logbook baru): id operasi sesuai urutan batch, lalu id CNSD per bandara.
+    """
+    total, log_ids, cnsd_dates = 0, [], []
+
+    if operasi_batch:
+        log_id = _next_id(LogbookEntry)
+        logs, duty, headers, positions, statuses, op_logs = [], [], [], [], [], []
+        for rows in operasi_batch:
+            logs.append(dict(rows['log'], id=log_id))
+            duty.extend({'logbook_entry_id': log_id, 'atc_personnel_id': pid} for pid in rows['duty'])
+            if rows['header']:
+                headers.append(dict(rows['header'], logbook_id=log_id))
+            positions.extend(dict(p, logbook_id=log_id) for p in rows['positions'])
+            statuses.extend(dict(s, logbook_id=log_id) for s in rows['statuses'])
+            op_logs.extend(dict(o, logbook_id=log_id) for o in rows['operational_logs'])
+            log_id += 1
+        intern_rows(db.session, LogbookEntry, logs)
+        intern_rows(db.session, OperationalLog, op_logs)
+        total += _insert_all({
+            LogbookEntry.__table__: logs, atc_duty_association: duty, ATCPositionHeader.__table__: headers,
+            ATCPosition.__table__: positions, FacilityStatus.__table__: statuses,
+            OperationalLog.__table__: op_logs,
+        })
+        _compact_statuses(OPERASI, logs)
+        refresh_duty_intervals(db.session, [log['id'] for log in logs])
+        log_ids.extend(log['id'] for log in logs)
+
+    # Logbook CNSD ditulis per bandara: dengan sharding aktif setiap bandara punya database sendiri
+    by_airport = {}
+    for rows in cnsd_batch:
+        by_airport.setdefault(rows['log']['airport'], []).append(rows)
+    for airport_code, airport_batch in by_airport.items():
+        with use_cnsd_shard(airport_code):
+            inserts = _cnsd_inserts(airport_batch)
+            total += _insert_all(inserts)
+            _compact_statuses(CNSD, inserts[CNSDLogbook.__table__])
+            log_ids.extend(log['id'] for log in inserts[CNSDLogbook.__table__])
+            cnsd_dates.extend(log['log_date'] for log in inserts[CNSDLogbook.__table__])
+    # Insert Core tidak terlihat oleh penanda session: snapshot laporan bulan-bulan ini ditandai usang di sini
+    mark_report_months(db.session, [*(rows['log']['log_date'] for rows in operasi_batch), *cnsd_dates])
+    return total, log_ids
+
+
+# --- CHECKPOINT ---
+# Dengan sharding aktif, batch CNSD di-commit di shard bandaranya, terpisah dari commit database hot. Karena itu
+# setiap database menyimpan checkpoint-nya sendiri (tabel import_checkpoint ada di hot dan di setiap shard),
+# ditulis dalam transaksi yang sama dengan baris batch-nya: commit yang gagal di tengah tidak menggeser checkpoint
+# database lain, dan --resume hanya mengulang record milik database yang belum ter-commit.
+
+def _checkpoint_binds():
+    """{kode bandara: engine} database yang menyimpan checkpoint; None = database hot (TWR/APP, CNSD tanpa shard)."""
+    return {None: db.engine, **shard_engines()}
+
+
+def _load_checkpoints(source):
+    return {airport_code: db.session.execute(sa.select(ImportCheckpoint.rows_done).filter_by(source=source),
+                                             bind_arguments={'bind': bind}).scalar() or 0
+            for airport_code, bind in _checkpoint_binds().items()}
+
+
+def _save_checkpoint(source, rows_done, bind):
+    """Checkpoint ditulis dalam transaksi yang sama dengan batch-nya (sekaligus mengunci database untuk tulis)."""
+    stmt = sqlite_insert(ImportCheckpoint).values(source=source, rows_done=rows_done)
+    db.session.execute(stmt.on_conflict_do_update(index_elements=['source'],
+                                                  set_={'rows_done': rows_done, 'updated_at': sa.func.now()}),
+                       bind_arguments={'bind': bind})
+
+
+def _record_destination(record, done):
+    """Kunci checkpoint database tujuan record: bandara untuk CNSD di shard, selain itu None (hot)."""
+    airport_code = record.get('airport') if (record.get('kind') or '').upper() == 'CNSD' else None
+    return airport_code if airport_code in done else None
+
+
+def import_records(records, source, batch_size=DEFAULT_BATCH_SIZE, skip_invalid=False, default_users=None,
+                   restart=False, echo=print):
+    """Mengimpor record logbook secara batch; bisa dilanjutkan dari checkpoint terakhir untuk source yang sama."""
+    refs = ReferenceLookup()
+    if restart:
+        for bind in _checkpoint_binds().values():
+            db.session.execute(sa.delete(ImportCheckpoint).filter_by(source=source), bind_arguments={'bind': bind})
+        db.session.commit()
+    done = _load_checkpoints(source)
+    skip = done[None]
+    if skip:
+        echo(f"Melanjutkan dari checkpoint: {skip} record pertama dilewati.")
+    for airport_code, rows_done in done.items():
+        if airport_code is not None and rows_done and rows_done != skip:
+            echo(f"  Checkpoint shard {airport_code}: {rows_done} record.")
+
+    stats = {'imported': 0, 'rows': 0, 'skipped_invalid': 0, 'resumed_from': skip}
+    operasi_batch, cnsd_batch = [], []
+    position = flushed = min(done.values())
+    started = time_module.perf_counter()
+
+    def flush_batch():
+        nonlocal flushed
+        flushed = position
+        _save_checkpoint(source, position, db.engine)
+        for airport_code in {rows['log']['airport'] for rows in cnsd_batch} & set(shard_engines()):
+            _save_checkpoint(source, position, cnsd_bind(airport_code))
+        stats['rows'] += write_batch(operasi_batch, cnsd_batch)[0]
+        db.session.commit()
+        stats['imported'] += len(operasi_batch) + len(cnsd_batch)
+        operasi_batch.clear()
+        cnsd_batch.clear()
+        elapsed = time_module.perf_counter() - started
+        echo(f"  {position} record diproses, {stats['rows']} baris ditulis ({stats['rows'] / elapsed:,.0f} baris/detik)")
+
+    try:
+        for position, record in enumerate(records, start=1):
+            if position <= done[_record_destination(record, done)]:
+                continue
+            try:
+                kind = (record.get('kind') or '').upper()
+                record['kind'] = kind
+                if kind in ('TWR', 'APP'):
+                    operasi_batch.append(build_operasi_rows(record, refs, default_users['operasi']))
+                elif kind == 'CNSD':
+                    cnsd_batch.append(build_cnsd_rows(record, refs, default_users['teknik']))
+                else:
+                    raise ImportRecordError(f"Unknown kind '{record.get('kind')}', expected TWR, APP or CNSD.")
+            except ImportRecordError as e:
+                if not skip_invalid:
+                    raise ImportRecordError(f"Record #{position}: {e}") from e
+                stats['skipped_invalid'] += 1
+                echo(f"  Record #{position} dilewati: {e}")
+            if len(operasi_batch) + len(cnsd_batch) >= batch_size:
+                flush_batch()
+        if position > flushed:
+            flush_batch()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    stats['seconds'] = time_module.perf_counter() - started
+    return stats
+
+
+@click.command('import-logbooks')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(['auto', 'csv', 'json']), default='auto',
+              help='Format file sumber (default: dari ekstensi).')
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True,
+              help='Jumlah logbook per transaksi.')
+@click.option('--skip-invalid', is_flag=True, help='Lewati record tidak valid alih-alih berhenti.')
+@click.option('--restart', is_flag=True, help='Abaikan checkpoint dan mulai dari record pertama.')
+@click.option('--operasi-user', default='operasi', show_default=True, help='Pengguna pencatat logbook TWR/APP.')
+@click.option('--teknik-user', default='teknik', show_default=True, help='Pengguna pencatat logbook CNSD.')
+@with_appcontext
+def import_logbooks_command(path, file_format, batch_size, skip_invalid, restart, operasi_user, teknik_user):
+    """Impor massal logbook historis dari CSV atau JSON/JSON Lines.
+
+    Contoh: flask --app run import-logbooks arsip_2019.jsonl
+    """
+    if file_format == 'auto':
+        file_format = 'csv' if path.lower().endswith('.csv') else 'json'
+    records = read_csv_records(path) if file_format == 'csv' else read_json_records(path)
+
+    default_users = {}
+    for division, username in (('operasi', operasi_user), ('teknik', teknik_user)):
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.ClickException(f"User '{username}' tidak ditemukan.")
+        default_users[division] = user.id
+
+    try:
+        stats = import_records(records, os.path.abspath(path), batch_size=batch_size, skip_invalid=skip_invalid,
+                               default_users=default_users, restart=restart, echo=click.echo)
+    except ImportRecordError as e:
+        raise click.ClickException(f"{e} Perbaiki file lalu jalankan ulang; batch yang sudah tersimpan tidak diulang.")
+
+    click.echo(
+        f"Selesai: {stats['imported']} logbook, {stats['rows']} baris dalam {stats['seconds']:.1f} detik"
+        f" ({stats['rows'] / max(stats['seconds'], 1e-9):,.0f} baris/detik),"
+        f" {stats['skipped_invalid']} record dilewati."
+    )
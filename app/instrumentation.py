@@ -0,0 +1,187 @@
+# app/instrumentation.py
+
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Blueprint, Response, abort, current_app, g, has_app_context, request
+from flask.signals import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+metrics_bp = Blueprint('metrics', __name__)
+
+request_logger = logging.getLogger('logbook.requests')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Histogram:
+    """Histogram Prometheus sederhana dengan label endpoint (per proses worker)."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, value):
+        with self._lock:
+            series = self._series.setdefault(endpoint, {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    series['counts'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for endpoint, series in sorted(self._series.items()):
+                label = f'endpoint="{endpoint}"'
+                for upper, count in zip(self.buckets, series['counts']):
+                    lines.append(f'{self.name}_bucket{{{label},le="{upper}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {series["count"]}')
+                lines.append(f'{self.name}_sum{{{label}}} {series["sum"]:.6f}')
+                lines.append(f'{self.name}_count{{{label}}} {series["count"]}')
+        return lines
+
+
+METRICS = {
+    'total': Histogram('logbook_request_duration_seconds', 'Total waktu request per endpoint.', DURATION_BUCKETS),
+    'sql': Histogram('logbook_sql_duration_seconds', 'Total waktu SQL per request.', DURATION_BUCKETS),
+    'sql_queries': Histogram('logbook_sql_queries', 'Jumlah statement SQL per request.', QUERY_COUNT_BUCKETS),
+    'template': Histogram('logbook_template_render_seconds', 'Waktu render template Jinja per request.',
+                          DURATION_BUCKETS),
+    'pdf': Histogram('logbook_pdf_render_seconds', 'Waktu render PDF WeasyPrint per request.', DURATION_BUCKETS),
+}
+
+
+def _timings():
+    """Penampung waktu untuk request aktif, atau None di luar request yang diinstrumentasi."""
+    if has_app_context():
+        return g.get('_timings')
+    return None
+
+
+def record_timing(name, seconds):
+    if (timings := _timings()) is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def measure(name):
+    """Mengukur durasi blok kode ke dalam metrik request aktif, mis. `with measure('pdf'):`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, time.perf_counter() - started)
+
+
+# --- SQLALCHEMY ENGINE EVENTS ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['_query_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if (timings := _timings()) is not None:
+        timings['sql'] = timings.get('sql', 0.0) + time.perf_counter() - conn.info['_query_started']
+        timings['sql_queries'] = timings.get('sql_queries', 0) + 1
+
+
+# --- SINYAL TEMPLATE ---
+
+def _before_render(sender, template, context, **extra):
+    if (timings := _timings()) is not None:
+        timings.setdefault('_template_started', []).append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    if (timings := _timings()) is not None and timings.get('_template_started'):
+        started = timings['_template_started'].pop()
+        timings['template'] = timings.get('template', 0.0) + time.perf_counter() - started
+
+
+# --- HOOK REQUEST ---
+
+def _start_request():
+    g._timings = {'_started': time.perf_counter()}
+
+
+def _finish_request(response):
+    timings = g.pop('_timings', None)
+    if timings is None:
+        return response
+    total = time.perf_counter() - timings['_started']
+    endpoint = request.endpoint or 'unknown'
+    sql_queries = timings.get('sql_queries', 0)
+
+    server_timing = [f'sql;dur={timings.get("sql", 0.0) * 1000:.1f};desc="{sql_queries} queries"']
+    if 'template' in timings:
+        server_timing.append(f'tpl;dur={timings["template"] * 1000:.1f}')
+    if 'pdf' in timings:
+        server_timing.append(f'pdf;dur={timings["pdf"] * 1000:.1f}')
+    server_timing.append(f'total;dur={total * 1000:.1f}')
+    response.headers['Server-Timing'] = ', '.join(server_timing)
+
+    METRICS['total'].observe(endpoint, total)
+    METRICS['sql'].observe(endpoint, timings.get('sql', 0.0))
+    METRICS['sql_queries'].observe(endpoint, sql_queries)
+    if 'template' in timings:
+        METRICS['template'].observe(endpoint, timings['template'])
+    if 'pdf' in timings:
+        METRICS['pdf'].observe(endpoint, timings['pdf'])
+
+    request_logger.info(json.dumps({
+        'event': 'request',
+        'method': request.method,
+        'path': request.path,
+        'endpoint': endpoint,
+        'status': response.status_code,
+        'duration_ms': round(total * 1000, 2),
+        'sql_queries': sql_queries,
+        'sql_ms': round(timings.get('sql', 0.0) * 1000, 2),
+        'template_ms': round(timings.get('template', 0.0) * 1000, 2),
+        'pdf_ms': round(timings.get('pdf', 0.0) * 1000, 2),
+    }))
+    return response
+
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """Metrik format teks Prometheus; hanya untuk akses lokal (scraper di host yang sama)."""
+    if request.remote_addr not in current_app.config['METRICS_ALLOWED_HOSTS']:
+        abort(404)
+    lines = []
+    for histogram in METRICS.values():
+        lines.extend(histogram.render())
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+def init_instrumentation(app):
+    """Memasang pencatatan waktu SQL, template, dan PDF per request beserta endpoint /metrics."""
+    if not app.config.get('INSTRUMENTATION_ENABLED', True):
+        return
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.register_blueprint(metrics_bp)
+
+    if not request_logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        request_logger.addHandler(handler)
+        request_logger.setLevel(logging.INFO)
+        request_logger.propagate = False
@@ -0,0 +1,366 @@
+# app/live.py
+
+import json
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+
+import sqlalchemy as sa
+from flask import Blueprint, Response, abort, current_app, has_app_context, request, session
+from flask_login import login_required
+
+from .models import db, User, LogbookEntry, FacilityStatus, OperationalLog, ATCPosition, ATCPositionHeader, \
+    CNSDLogbook, CNSDPersonnel, CNSDFacilityStatus, CNSDUraianKegiatan, ChangeEvent
+from .reference import reference_data
+from .shardrouting import RoutingSession
+
+live_bp = Blueprint('live', __name__)
+
+# Model anak -> (model induk, kolom FK); perubahan baris anak disiarkan sebagai perubahan logbook induknya
+CHILD_MODELS = {
+    FacilityStatus: (LogbookEntry, 'logbook_id'), OperationalLog: (LogbookEntry, 'logbook_id'),
+    ATCPosition: (LogbookEntry, 'logbook_id'), ATCPositionHeader: (LogbookEntry, 'logbook_id'),
+    CNSDPersonnel: (CNSDLogbook, 'cnsd_logbook_id'), CNSDFacilityStatus: (CNSDLogbook, 'cnsd_logbook_id'),
+    CNSDUraianKegiatan: (CNSDLogbook, 'cnsd_logbook_id'),
+}
+# Antrean per klien SSE; klien yang tertinggal sejauh ini diputus lalu menyambung ulang dengan Last-Event-ID
+SUBSCRIBER_QUEUE_SIZE = 500
+REPLAY_LIMIT = 200
+
+LiveEvent = namedtuple('LiveEvent', 'id channel kind payload')
+
+
+def operasi_channel(logbook_type):
+    return f'operasi:{logbook_type}'
+
+
+def cnsd_channel(airport_code):
+    return f'cnsd:{airport_code}'
+
+
+# --- PENCATAT PERUBAHAN (SESSION EVENTS) ---
+# Logbook yang berubah dikumpulkan di setiap flush, lalu ditulis ke tabel change_event di dalam transaksi
+# commit yang sama (before_commit), sehingga hanya perubahan yang benar-benar tersimpan yang disiarkan.
+# Pengecualian: logbook CNSD di shard (CNSD_SHARDING_ENABLED) di-commit di database lain daripada change_event,
+# dan commit dua database tidak atomik. Event-nya baru ditulis setelah commit berhasil (after_commit); jika
+# penulisan itu gagal, logbook tetap tersimpan tetapi event-nya tidak disiarkan (dashboard tertinggal sampai
+# dimuat ulang).
+
+def _live_enabled():
+    return has_app_context() and current_app.config.get('LIVE_UPDATES_ENABLED', False)
+
+
+def _collect_changes(session, flush_context):
+    if not _live_enabled():
+        return
+    changes = session.info.setdefault('live_changes', {})
+    for objects, action in ((session.new, 'created'), (session.dirty, 'updated')):
+        for obj in objects:
+            model = type(obj)
+            if model in (LogbookEntry, CNSDLogbook):
+                key = (model, obj.id)
+            elif model in CHILD_MODELS:
+                parent, fk = CHILD_MODELS[model]
+                if (parent_id := getattr(obj, fk)) is None:
+                    continue
+                key, action = (parent, parent_id), 'updated'
+            else:
+                continue
+            changes.setdefault(key, {'action': action})
+
+
+def record_change(session, model, ident, action='created'):
+    """Menandai logbook yang ditulis lewat insert Core (sinkronisasi offline) agar ikut disiarkan saat commit."""
+    if _live_enabled():
+        session.info.setdefault('live_changes', {}).setdefault((model, ident), {'action': action})
+
+
+def _loaded(obj, attribute):
+    """Nilai relasi yang sudah dimuat, atau None (relasi lazy='raise' tidak boleh dimuat di sini)."""
+    value = sa.inspect(obj).attrs[attribute].loaded_value
+    return None if value is sa.orm.base.NO_VALUE else value
+
+
+def _logbook_event(log, change):
+    personnel = _loaded(log, 'atc_on_duty_personnel')
+    return operasi_channel(log.logbook_type), 'logbook', {
+        'id': log.id, 'action': change['action'], 'logbook_type': log.logbook_type,
+        'log_date': log.log_date.isoformat(), 'shift': log.shift, 'notam': log.notam,
+        'personnel': [person.name for person in personnel] if personnel is not None else None,
+    }
+
+
+def _cnsd_event(session, log, change, deltas):
+    # User pembuat biasanya sudah ada di identity map (current_user), jadi tidak menambah query
+    user = session.get(User, log.user_id) if log.user_id else None
+    facilities = {facility.id: facility for facility in reference_data()['cnsd_facilities'].get(log.airport, ())}
+    statuses = []
+    # Hanya kondisi yang berubah dari logbook sebelumnya (lihat save_facility_statuses)
+    for facility_id, condition in deltas.get((CNSDLogbook, log.id), {}).items():
+        if condition is None:
+            continue
+        facility = facilities.get(facility_id)
+        statuses.append({
+            'facility_id': facility_id, 'condition': condition,
+            'name': facility.name if facility else None, 'sub_name': facility.sub_name if facility else None,
+            'category': facility.category if facility else None,
+        })
+    return cnsd_channel(log.airport), 'cnsd_logbook', {
+        'id': log.id, 'action': change['action'], 'airport': log.airport,
+        'log_date': log.log_date.isoformat(), 'shift': log.shift,
+        'created_by': user.username if user else None, 'facility_statuses': statuses,
+    }
+
+
+def _publish_changes(session):
+    if not _live_enabled():
+        return
+    session.flush()
+    changes = session.info.pop('live_changes', None)
+    deltas = session.info.pop('facility_status_deltas', {})
+    if not changes:
+        return
+    rows, after_commit = [], []
+    for (model, ident), change in changes.items():
+        if (log := session.get(model, ident)) is None:
+            continue
+        channel, kind, payload = (_logbook_event(log, change) if model is LogbookEntry
+                                  else _cnsd_event(session, log, change, deltas))
+        sharded = session.get_bind(mapper=model) is not db.engine
+        (after_commit if sharded else rows).append({'channel': channel, 'kind': kind, 'payload': json.dumps(payload)})
+    if rows:
+        session.execute(sa.insert(ChangeEvent), rows)
+    if after_commit:
+        session.info['live_after_commit'] = after_commit
+
+
+def _publish_sharded_changes(session):
+    """Menulis event logbook shard ke database hot setelah commit shard berhasil (lihat catatan di atas)."""
+    if not (rows := session.info.pop('live_after_commit', None)):
+        return
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(sa.insert(ChangeEvent), rows)
+    except sa.exc.SQLAlchemyError:
+        # Logbook sudah tersimpan; kegagalan siaran tidak boleh menggagalkan request
+        current_app.logger.warning("Event live untuk %d logbook CNSD shard tidak tersimpan.", len(rows),
+                                   exc_info=True)
+
+
+def _discard_changes(session, previous_transaction=None):
+    session.info.pop('live_changes', None)
+    session.info.pop('facility_status_deltas', None)
+    session.info.pop('live_after_commit', None)
+
+
+# --- HUB SIARAN PER PROSES ---
+
+class Subscription:
+    """Satu klien SSE: antrean event untuk satu channel."""
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+
+class ChangeHub:
+    """Meneruskan baris change_event baru ke klien SSE di proses ini.
+
+    Setiap worker gunicorn punya satu hub dengan satu thread polling (hanya hidup selama ada klien),
+    jadi jumlah query ke tabel change_event tidak bergantung pada jumlah dashboard yang terbuka.
+    Event dari worker lain ikut terbaca karena semuanya menulis ke tabel yang sama.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.cursor = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def subscribe(self, channel):
+        """Mendaftarkan klien; mengembalikan (subscription, cursor). Event dengan id > cursor masuk ke antrean."""
+        subscription = Subscription(channel)
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                # Thread tidak ikut ter-fork: worker hasil fork memulai thread polling-nya sendiri
+                self.cursor = self._latest_id()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='live-hub', daemon=True)
+                self._thread.start()
+            self._subscribers.add(subscription)
+            return subscription, self.cursor
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def _latest_id(self):
+        with self.app.app_context(), db.engine.connect() as conn:
+            return conn.execute(sa.select(sa.func.max(ChangeEvent.id))).scalar() or 0
+
+    def _poll(self, conn):
+        rows = conn.execute(
+            sa.select(ChangeEvent.id, ChangeEvent.channel, ChangeEvent.kind, ChangeEvent.payload)
+            .where(ChangeEvent.id > self.cursor).order_by(ChangeEvent.id)
+        )
+        return [LiveEvent(*row) for row in rows]
+
+    def _prune(self, conn):
+        hours = self.app.config['LIVE_EVENT_RETENTION_HOURS']
+        conn.execute(sa.delete(ChangeEvent).where(ChangeEvent.created_at < sa.func.datetime('now', f'-{hours} hours')))
+        conn.commit()
+
+    def _dispatch(self, events):
+        with self._lock:
+            for event in events:
+                self.cursor = event.id
+                for subscription in self._subscribers:
+                    if subscription.channel != event.channel or subscription.overflowed:
+                        continue
+                    try:
+                        subscription.queue.put_nowait(event)
+                    except queue.Full:
+                        subscription.overflowed = True
+
+    def _run(self):
+        interval = self.app.config['LIVE_POLL_INTERVAL']
+        with self.app.app_context():
+            engine = db.engine
+        next_prune = 0.0
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+            try:
+                with engine.connect() as conn:
+                    events = self._poll(conn)
+                    if time.monotonic() >= next_prune:
+                        self._prune(conn)
+                        next_prune = time.monotonic() + 600
+            except sa.exc.OperationalError:
+                # Database sedang dikunci penulis lain; coba lagi di putaran berikutnya
+                events = []
+            if events:
+                self._dispatch(events)
+            time.sleep(interval)
+
+
+def live_hub():
+    return current_app.extensions['live_hub']
+
+
+# --- ENDPOINT SSE ---
+
+def _format_event(event):
+    return f'id: {event.id}\nevent: {event.kind}\ndata: {event.payload}\n\n'
+
+
+def _replay(channel, last_id, cursor):
+    """Event yang terlewat klien saat menyambung ulang (Last-Event-ID) sampai posisi hub."""
+    if last_id is None or last_id >= cursor:
+        return []
+    rows = db.session.execute(
+        sa.select(ChangeEvent.id, ChangeEvent.channel, ChangeEvent.kind, ChangeEvent.payload)
+        .where(ChangeEvent.channel == channel, ChangeEvent.id > last_id, ChangeEvent.id <= cursor)
+        .order_by(ChangeEvent.id).limit(REPLAY_LIMIT)
+    )
+    return [LiveEvent(*row) for row in rows]
+
+
+def _event_stream(hub, subscription, replay, heartbeat, max_seconds):
+    deadline = time.monotonic() + max_seconds
+    try:
+        yield 'retry: 3000\n\n'
+        for event in replay:
+            yield _format_event(event)
+        while time.monotonic() < deadline and not subscription.overflowed:
+            try:
+                event = subscription.queue.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ': ping\n\n'
+                continue
+            yield _format_event(event)
+    finally:
+        hub.unsubscribe(subscription)
+
+
+def stream_channel(channel):
+    """Respons text/event-stream untuk satu channel; berakhir setelah LIVE_STREAM_MAX_SECONDS lalu EventSource
+    di browser menyambung ulang dengan Last-Event-ID (event yang terlewat diputar ulang dari change_event)."""
+    if not current_app.config['LIVE_UPDATES_ENABLED']:
+        abort(404)
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    hub = live_hub()
+    subscription, cursor = hub.subscribe(channel)
+    try:
+        replay = _replay(channel, last_id, cursor)
+    except Exception:
+        hub.unsubscribe(subscription)
+        raise
+    response = Response(
+        _event_stream(hub, subscription, replay, current_app.config['LIVE_HEARTBEAT_SECONDS'],
+                      current_app.config['LIVE_STREAM_MAX_SECONDS']),
+        mimetype='text/event-stream',
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    # Proxy (nginx) tidak boleh menahan event di buffer
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@live_bp.route('/dashboard/operasi/events/<string:logbook_type>')
+@login_required
+def operasi_events(logbook_type):
+    if logbook_type not in ('TWR', 'APP'):
+        abort(404)
+    return stream_channel(operasi_channel(logbook_type))
+
+
+@live_bp.route('/cnsd/dashboard/<string:airport_code>/events')
+@login_required
+def cnsd_events(airport_code):
+    if session.get('unlocked_airport') != airport_code:
+        abort(403)
+    return stream_channel(cnsd_channel(airport_code))
+
+
+def init_live(app):
+    """Memasang pencatat perubahan pada session dan hub SSE untuk dashboard operasi & CNSD."""
+    app.extensions['live_hub'] = ChangeHub(app)
+    app.register_blueprint(live_bp)
+    if not sa.event.contains(RoutingSession, 'after_flush', _collect_changes):
+        sa.event.listen(RoutingSession, 'after_flush', _collect_changes)
+        sa.event.listen(RoutingSession, 'before_commit', _publish_changes)
+        sa.event.listen(RoutingSession, 'after_commit', _publish_sharded_changes)
+        sa.event.listen(RoutingSession, 'after_soft_rollback', _discard_changes)
+
+
+def upgrade_change_event_table(engine):
+    """Membangun ulang tabel change_event skema lama (tanpa AUTOINCREMENT) agar id event tidak dipakai ulang.
+
+    Dipanggil saat startup setelah create_all. sqlite_sequence diisi dari id terbesar yang masih ada; True jika
+    tabel dibangun ulang.
+    """
+    table = ChangeEvent.__table__
+    with engine.connect() as conn:
+        ddl = conn.exec_driver_sql("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?",
+                                   (table.name,)).scalar()
+        if ddl is None or 'AUTOINCREMENT' in ddl.upper():
+            return False
+        legacy = f'{table.name}_legacy'
+        columns = ', '.join(f'"{column.name}"' for column in table.columns)
+        conn.exec_driver_sql(f'ALTER TABLE main."{table.name}" RENAME TO "{legacy}"')
+        # Indeks lama ikut berpindah ke tabel yang di-rename; dibuang agar namanya bisa dipakai tabel baru
+        for index in table.indexes:
+            conn.exec_driver_sql(f'DROP INDEX IF EXISTS main."{index.name}"')
+        table.create(conn)
+        conn.exec_driver_sql(f'INSERT INTO main."{table.name}" ({columns}) SELECT {columns} FROM main."{legacy}"')
+        conn.exec_driver_sql(f'DROP TABLE main."{legacy}"')
+        conn.commit()
+    return True
@@ -0,0 +1,337 @@
+# app/loadtest.py
+
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from werkzeug.serving import BaseWSGIServer
+
+from .models import db, LogbookEntry, ATCPersonnel
+from .querybudget import _operasi_form, _cnsd_form
+
+# Tanda tangan contoh: PNG 1x1 piksel, cukup untuk lolos allowed_file() dan disimpan ke UPLOAD_FOLDER
+SIGNATURE_PNG = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360000002000100e527de0a0000000049454e44ae426082'
+)
+OPERASI_SIGNATURES = ('controller_signature_1', 'controller_signature_2', 'manager_signature')
+REQUEST_TIMEOUT_SECONDS = 120
+
+LoadRequest = namedtuple('LoadRequest', 'kind role method path body content_type expect_redirect')
+
+
+# --- SERVER PENGGANTI DEPLOYMENT ---
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Server WSGI lokal dengan jumlah thread terbatas, meniru satu worker gunicorn gthread (GUNICORN_THREADS)."""
+    multithread = True
+
+    def __init__(self, host, port, app, threads):
+        super().__init__(host, port, app)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='loadtest-server')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+
+class LockTimeoutCounter:
+    """Menghitung 'database is locked' dari SQLite di semua engine selama blok `with` aktif."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _record(self, context):
+        error = context.original_exception
+        if isinstance(error, sqlite3.OperationalError) and 'database is locked' in str(error):
+            with self._lock:
+                self.count += 1
+
+    def __enter__(self):
+        event.listen(Engine, 'handle_error', self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(Engine, 'handle_error', self._record)
+
+
+# --- KLIEN HTTP ---
+
+class _NoRedirect(HTTPRedirectHandler):
+    """Redirect tidak diikuti: status 302 dan Location-nya adalah hasil yang diukur."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def _open(opener, request):
+    try:
+        with opener.open(request, timeout=REQUEST_TIMEOUT_SECONDS) as response:
+            return response.status, response.headers, response.read()
+    except HTTPError as e:
+        with e:
+            return e.code, e.headers, e.read()
+
+
+def _multipart(fields, files):
+    """Body multipart/form-data dari daftar (nama, nilai) dan (nama, nama file, isi)."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields:
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, filename, content in files:
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: image/png\r\n\r\n'.encode() + content + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def _form_fields(form):
+    return [(name, item) for name, value in form.items()
+            for item in (value if isinstance(value, list) else [value])]
+
+
+class RoleSession:
+    """Satu peran (operasi, atau teknik yang sudah membuka satu bandara): login sekali di awal.
+
+    Cookie hasil login dipakai ulang apa adanya dan Set-Cookie dari respons diabaikan, sehingga request paralel
+    tidak saling menimpa cookie session dan pesan flash dari redirect yang tidak diikuti tidak menumpuk.
+    """
+
+    def __init__(self, base_url, username, password='1234', airport_code=None, airport_password=None):
+        self.base_url = base_url
+        jar = CookieJar()
+        opener = build_opener(HTTPCookieProcessor(jar), _NoRedirect)
+        _open(opener, Request(base_url + '/login', data=urlencode({'username': username, 'password': password}).encode()))
+        if airport_code:
+            _open(opener, Request(base_url + '/cnsd/unlock', data=urlencode(
+                {'airport_code': airport_code, 'airport_password': airport_password}).encode()))
+        self.cookie = '; '.join(f'{cookie.name}={cookie.value}' for cookie in jar)
+        self.opener = build_opener(_NoRedirect)
+
+    def send(self, method, path, body=None, content_type=None):
+        headers = {'Cookie': self.cookie}
+        if content_type:
+            headers['Content-Type'] = content_type
+        return _open(self.opener, Request(self.base_url + path, data=body, headers=headers, method=method))
+
+
+# --- CAMPURAN REQUEST PERGANTIAN SHIFT ---
+
+def shift_change_mix(app, rates):
+    """Daftar (request/detik, pembuat LoadRequest ke-i) untuk puncak pergantian shift.
+
+    TWR dan APP masing-masing mengirim logbook dengan tiga paraf, setiap bandara CNSD mengirim logbook dengan
+    paraf manajer & teknisi, sementara supervisor membuka dashboard dan mengunduh PDF logbook yang sudah ada.
+    """
+    with app.app_context():
+        personnel_ids = [p.id for p in ATCPersonnel.query.order_by(ATCPersonnel.id).limit(4)]
+        operasi_forms = {logbook_type: _form_fields(_operasi_form(logbook_type, personnel_ids))
+                         for logbook_type in ('TWR', 'APP')}
+        cnsd_forms = {airport_code: _form_fields(_cnsd_form(airport_code))
+                      for airport_code in app.config['AIRPORT_PASSWORDS']}
+        pdf_ids = [row[0] for row in db.session.query(LogbookEntry.id)
+                   .order_by(LogbookEntry.log_date.desc(), LogbookEntry.id.desc()).limit(50)]
+
+    def create_log(logbook_type):
+        def make(i):
+            files = [(name, f'{name}.png', SIGNATURE_PNG) for name in OPERASI_SIGNATURES]
+            body, content_type = _multipart(operasi_forms[logbook_type], files)
+            return LoadRequest('create_log_entry', 'operasi', 'POST', f'/log/new/{logbook_type}',
+                               body, content_type, True)
+        return make
+
+    def create_cnsd(airport_code):
+        def make(i):
+            files = [('manager_signature', 'manager.png', SIGNATURE_PNG)]
+            files += [('personnel_signature[]', f'teknisi_{n}.png', SIGNATURE_PNG) for n in range(2)]
+            body, content_type = _multipart(cnsd_forms[airport_code], files)
+            return LoadRequest('create_cnsd_log', f'teknik:{airport_code}', 'POST', f'/cnsd/log/new/{airport_code}',
+                               body, content_type, True)
+        return make
+
+    airports = list(cnsd_forms)
+
+    def dashboard(i):
+        # Bergantian antara dashboard operasi dan dashboard CNSD tiap bandara
+        if i % 2 == 0:
+            return LoadRequest('dashboard', 'operasi', 'GET', '/dashboard/operasi?tab=history', None, None, False)
+        airport_code = airports[(i // 2) % len(airports)]
+        return LoadRequest('dashboard', f'teknik:{airport_code}', 'GET', f'/cnsd/dashboard/{airport_code}',
+                           None, None, False)
+
+    def download_pdf(i):
+        return LoadRequest('download_log_pdf', 'operasi', 'GET', f'/log/download/{pdf_ids[i % len(pdf_ids)]}',
+                           None, None, False)
+
+    mix = [(rates['log'], create_log(logbook_type)) for logbook_type in ('TWR', 'APP')]
+    mix += [(rates['cnsd'], create_cnsd(airport_code)) for airport_code in airports]
+    mix += [(rates['dashboard'], dashboard), (rates['pdf'], download_pdf)]
+    return [(rate, make) for rate, make in mix if rate > 0]
+
+
+def build_schedule(mix, duration):
+    """Jadwal open-loop (detik sejak mulai, LoadRequest) dengan jarak rata 1/rate; tiap sumber digeser sedikit."""
+    schedule = []
+    for index, (rate, make) in enumerate(mix):
+        offset = (index / len(mix)) / rate
+        count = int(duration * rate)
+        schedule.extend((offset + i / rate, make(i)) for i in range(count))
+    schedule.sort(key=lambda item: item[0])
+    return schedule
+
+
+def _succeeded(load_request, status, headers, body):
+    if load_request.expect_redirect:
+        # Route create mengarahkan ke dashboard bila berhasil; saat gagal merender ulang form (operasi)
+        # atau kembali ke form create (CNSD)
+        return status == 302 and '/new/' not in headers.get('Location', '')
+    return status == 200
+
+
+# --- MENJALANKAN LOAD TEST ---
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+
+def run_load_test(sessions, schedule, concurrency):
+    """Mengirim jadwal request dengan `concurrency` klien paralel; mengembalikan ringkasan per kind."""
+    samples = defaultdict(list)
+    failures = defaultdict(int)
+    max_lag = 0.0
+    results_lock = threading.Lock()
+
+    def send(scheduled_at, load_request):
+        nonlocal max_lag
+        started = time.perf_counter()
+        try:
+            status, headers, body = sessions[load_request.role].send(
+                load_request.method, load_request.path, load_request.body, load_request.content_type)
+            ok = _succeeded(load_request, status, headers, body)
+        except (URLError, OSError):
+            ok = False
+        elapsed = time.perf_counter() - started
+        with results_lock:
+            samples[load_request.kind].append(elapsed * 1000)
+            max_lag = max(max_lag, started - scheduled_at)
+            if not ok:
+                failures[load_request.kind] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='loadtest-client') as pool:
+        for offset, load_request in schedule:
+            delay = started + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, started + offset, load_request)
+    wall_seconds = time.perf_counter() - started
+
+    summary = {}
+    for kind in sorted(samples):
+        timings = sorted(samples[kind])
+        ok = len(timings) - failures[kind]
+        summary[kind] = {
+            'requests': len(timings),
+            'errors': failures[kind],
+            'throughput_rps': round(ok / wall_seconds, 2),
+            'p50_ms': round(_percentile(timings, 0.50), 2),
+            'p95_ms': round(_percentile(timings, 0.95), 2),
+            'p99_ms': round(_percentile(timings, 0.99), 2),
+        }
+    return {'wall_seconds': round(wall_seconds, 2), 'max_client_lag_ms': round(max_lag * 1000, 2), 'kinds': summary}
+
+
+def print_report(result, echo=print):
+    echo(f"{'request':<18} {'jumlah':>7} {'gagal':>6} {'ok/detik':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for kind, row in result['kinds'].items():
+        echo(f"{kind:<18} {row['requests']:>7} {row['errors']:>6} {row['throughput_rps']:>9.2f} "
+             f"{row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f}")
+    echo(f"Durasi {result['wall_seconds']} detik, lock timeout SQLite: {result['lock_timeouts']}, "
+         f"keterlambatan klien maks {result['max_client_lag_ms']} ms.")
+    if result['max_client_lag_ms'] > 1000:
+        echo("Peringatan: klien load test tertinggal dari jadwal; naikkan --concurrency agar laju tercapai.")
+
+
+@click.command('load-test')
+@click.option('--duration', default=30, show_default=True, help='Lama pengiriman request (detik).')
+@click.option('--log-rate', default=0.5, show_default=True, help='Logbook baru per detik untuk TWR dan APP masing-masing.')
+@click.option('--cnsd-rate', default=0.5, show_default=True, help='Logbook CNSD baru per detik untuk setiap bandara.')
+@click.option('--dashboard-rate', default=2.0, show_default=True, help='Pembukaan dashboard per detik.')
+@click.option('--pdf-rate', default=1.0, show_default=True, help='Unduhan PDF logbook per detik.')
+@click.option('--concurrency', default=32, show_default=True, help='Jumlah klien paralel maksimum.')
+@click.option('--threads', default=4, show_default=True, help='Thread server pengganti (setara GUNICORN_THREADS).')
+@click.option('--sharding/--no-sharding', default=False, show_default=True,
+              help='Jalankan dengan database CNSD per bandara (CNSD_SHARDING_ENABLED).')
+@click.option('--days', default=30, show_default=True, help='Ukuran data sintetis awal (hari).')
+@click.option('--workdir', type=click.Path(file_okay=False), default=None,
+              help='Folder database load test. Default: folder sementara (database baru setiap run).')
+@click.option('--output', type=click.Path(dir_okay=False), default=None, help='Simpan hasil sebagai JSON.')
+@with_appcontext
+def load_test_command(duration, log_rate, cnsd_rate, dashboard_rate, pdf_rate, concurrency, threads, sharding,
+                      days, workdir, output):
+    """Load test pergantian shift terhadap salinan lokal app dengan database sementara."""
+    from .benchmark import build_benchmark_app
+
+    workdir = os.path.join(workdir or tempfile.mkdtemp(prefix='logbook-load-'), 'sharded' if sharding else 'single')
+    os.makedirs(workdir, exist_ok=True)
+    app = build_benchmark_app(days, workdir, echo=click.echo, TESTING=False, CNSD_SHARDING_ENABLED=sharding,
+                              CNSD_SHARD_FOLDER=os.path.join(workdir, 'cnsd_shards'))
+    logging.getLogger('logbook.requests').disabled = True
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    server = PooledWSGIServer('127.0.0.1', 0, app, threads)
+    threading.Thread(target=server.serve_forever, name='loadtest-serve', daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    try:
+        sessions = {'operasi': RoleSession(base_url, 'operasi')}
+        for airport_code, password in app.config['AIRPORT_PASSWORDS'].items():
+            sessions[f'teknik:{airport_code}'] = RoleSession(base_url, 'teknik', airport_code=airport_code,
+                                                             airport_password=password)
+        rates = {'log': log_rate, 'cnsd': cnsd_rate, 'dashboard': dashboard_rate, 'pdf': pdf_rate}
+        schedule = build_schedule(shift_change_mix(app, rates), duration)
+        click.echo(f"Mengirim {len(schedule)} request selama {duration} detik ke {base_url} "
+                   f"({threads} thread server, {concurrency} klien, sharding {'aktif' if sharding else 'nonaktif'}).")
+        with LockTimeoutCounter() as locks:
+            result = run_load_test(sessions, schedule, concurrency)
+        result['lock_timeouts'] = locks.count
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print_report(result, echo=click.echo)
+    if output:
+        result['settings'] = {'duration': duration, 'rates': rates, 'concurrency': concurrency, 'threads': threads,
+                              'sharding': sharding, 'days': days}
+        with open(output, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+        click.echo(f"Hasil disimpan ke {output}")
@@ -4,8 +4,13 @@ from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 import enum
+import zlib
+import sqlalchemy as sa
 
-db = SQLAlchemy()
+from .shardrouting import RoutingSession
+
+# Session dengan routing tabel CNSD ke database shard per bandara (lihat app/sharding.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # Tabel asosiasi untuk personel ATC yang bertugas
 atc_duty_association = db.Table('atc_duty_association',
@@ -37,6 +42,83 @@ class FacilityCondition(enum.Enum):
     def __str__(self):
         return str(self.value)
 
+# Kondisi fasilitas CNSD (radio button di form logbook CNSD)
+CNSD_CONDITIONS = ('Baik', 'Rusak')
+
+# Urutan shift dalam satu hari; logbook diurutkan (tanggal, shift, id) saat kondisi fasilitas direkonstruksi
+SHIFT_ORDER = ('PAGI', 'SIANG', 'MALAM')
+
+
+def shift_rank(shift):
+    """Peringkat shift (1 = Pagi); shift lain diurutkan setelah Malam. Menerima string atau kolom SQL.
+
+    Shift CNSD berupa teks bebas, jadi spasi di tepi diabaikan (sama dengan kalender cakupan).
+    """
+    if isinstance(shift, str) or shift is None:
+        shift = (shift or '').strip().upper()
+        return SHIFT_ORDER.index(shift) + 1 if shift in SHIFT_ORDER else len(SHIFT_ORDER) + 1
+    return sa.case({name: rank for rank, name in enumerate(SHIFT_ORDER, start=1)},
+                   value=sa.func.upper(sa.func.trim(shift)), else_=len(SHIFT_ORDER) + 1)
+
+
+class ConditionCode(sa.types.TypeDecorator):
+    """Kondisi fasilitas disimpan sebagai kode SMALLINT (1, 2, ... sesuai urutan values); 0 = kondisi dikosongkan.
+
+    Di Python nilainya tetap anggota FacilityCondition / string kondisi CNSD, dan None untuk kode 0.
+    Teks lama (nilai atau nama anggota Enum sebelum kolom dibangun ulang) masih dibaca apa adanya.
+    """
+    impl = sa.SmallInteger
+    cache_ok = True
+    # None harus tetap ditulis sebagai kode 0, termasuk lewat bulk insert/update ORM
+    should_evaluate_none = True
+
+    def __init__(self, values):
+        super().__init__()
+        self.values = tuple(values)
+
+    def _code(self, value):
+        for code, candidate in enumerate(self.values, start=1):
+            if value == candidate or value in (getattr(candidate, 'value', None), getattr(candidate, 'name', None)):
+                return code
+        raise ValueError(f"Kondisi fasilitas tidak dikenal: {value!r}")
+
+    def process_bind_param(self, value, dialect):
+        return 0 if value is None else self._code(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None or value == 0:
+            return None
+        if isinstance(value, str):
+            return self.values[self._code(value) - 1]
+        return self.values[value - 1]
+
+class StoredText(sa.types.TypeDecorator):
+    """Teks disimpan sebagai BLOB berawalan satu byte penanda: b't' UTF-8 apa adanya, b'z' UTF-8 terkompresi zlib.
+
+    Teks yang panjangnya (byte) mencapai compress_min_bytes dikompresi jika hasilnya memang lebih kecil;
+    nilainya diatur dari Config.TEXT_COMPRESS_MIN_BYTES saat startup (0 = tanpa kompresi).
+    """
+    impl = sa.LargeBinary
+    cache_ok = True
+    compress_min_bytes = 512
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        data = value.encode('utf-8')
+        if self.compress_min_bytes and len(data) >= self.compress_min_bytes:
+            compressed = zlib.compress(data)
+            if len(compressed) < len(data):
+                return b'z' + compressed
+        return b't' + data
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        value = bytes(value)
+        data = zlib.decompress(value[1:]) if value[:1] == b'z' else value[1:]
+        return data.decode('utf-8')
+
 # Model untuk Pengguna
 class User(UserMixin, db.Model):
     __tablename__ = 'user'
@@ -44,7 +126,7 @@ class User(UserMixin, db.Model):
     username = db.Column(db.String(64), index=True, unique=True, nullable=False)
     password_hash = db.Column(db.String(256))
     division = db.Column(db.String(64), nullable=False)
-    logbook_entries = db.relationship('LogbookEntry', backref='creator', lazy=True)
+    logbook_entries = db.relationship('LogbookEntry', backref=db.backref('creator', lazy='raise'), lazy='raise')
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -67,15 +149,20 @@ class ATCPersonnel(db.Model):
 # Model untuk Entri Logbook Utama
 class LogbookEntry(db.Model):
     __tablename__ = 'logbook_entry'
+    # Indeks penutup untuk logbook terakhir per tipe (isian awal form create, lihat facilitystatus.latest_log)
+    __table_args__ = (db.Index('ix_logbook_entry_latest', 'logbook_type', 'log_date', 'shift', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     
     logbook_type = db.Column(db.String(20), nullable=False, default='TWR') # TWR untuk Tower, APP untuk Approach
     
     log_date = db.Column(db.Date, nullable=False)
     shift = db.Column(db.String(50), nullable=False)
-    notam = db.Column(db.Text, nullable=True)
+    # Teks NOTAM disimpan sekali per isi di text_blob; atribut notam (baca/tulis) didefinisikan di bawah
+    notam_id = db.Column(db.Integer, db.ForeignKey('text_blob.id'), nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     created_at = db.Column(db.DateTime, server_default=db.func.now())
+    # Jumlah fasilitas U/S pada kondisi lengkap logbook ini (dijaga rewrite_month, dibaca kalender cakupan)
+    unserviceable_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     controller_signature_1 = db.Column(db.String(255), nullable=True)
     controller_signature_2 = db.Column(db.String(255), nullable=True)
@@ -84,13 +171,21 @@ class LogbookEntry(db.Model):
     atc_on_duty_personnel = db.relationship(
         'ATCPersonnel', secondary=atc_duty_association,
         backref=db.backref('logbook_entries', lazy='dynamic'),
-        lazy='subquery'
+        lazy='raise'
     )
     
-    facility_statuses = db.relationship('FacilityStatus', backref='logbook_entry', lazy=True, cascade="all, delete-orphan")
-    operational_logs = db.relationship('OperationalLog', backref='logbook_entry', lazy=True, cascade="all, delete-orphan")
-    atc_positions = db.relationship('ATCPosition', backref='logbook_entry', lazy=True, cascade="all, delete-orphan")
-    atc_position_header = db.relationship('ATCPositionHeader', backref='logbook_entry', uselist=False, cascade="all, delete-orphan")
+    # Semua relasi memakai lazy='raise': setiap route wajib memuat relasi yang dipakainya lewat
+    # opsi query (lihat LOAD_* di routes.py), sehingga lazy load yang tidak disengaja langsung gagal.
+    # Hanya kondisi yang berubah dari logbook sebelumnya (lihat app/facilitystatus.py); kondisi lengkap: facility_statuses
+    facility_status_changes = db.relationship('FacilityStatus', backref=db.backref('logbook_entry', lazy='raise'), lazy='raise', cascade="all, delete-orphan")
+    operational_logs = db.relationship('OperationalLog', backref=db.backref('logbook_entry', lazy='raise'), lazy='raise', cascade="all, delete-orphan")
+    atc_positions = db.relationship('ATCPosition', backref=db.backref('logbook_entry', lazy='raise'), lazy='raise', cascade="all, delete-orphan")
+    atc_position_header = db.relationship('ATCPositionHeader', backref=db.backref('logbook_entry', lazy='raise'), uselist=False, lazy='raise', cascade="all, delete-orphan")
+
+    @property
+    def facility_statuses(self):
+        """Kondisi lengkap setiap fasilitas pada logbook ini; muat dulu facility_status_history lewat opsi query."""
+        return carry_forward(self.facility_status_history, 'facility_id')
 
 # Model untuk Header Posisi ATC
 class ATCPositionHeader(db.Model):
@@ -117,6 +212,17 @@ class ATCPosition(db.Model):
     time_slot_5 = db.Column(db.String(100))
     time_slot_6 = db.Column(db.String(100))
 
+# Interval dinas per personel per slot posisi, diturunkan dari ATCPosition + ATCPositionHeader (app/dutytime.py)
+class DutyInterval(db.Model):
+    __tablename__ = 'duty_interval'
+    id = db.Column(db.Integer, primary_key=True)
+    logbook_id = db.Column(db.Integer, db.ForeignKey('logbook_entry.id'), nullable=False, index=True)
+    personnel_name = db.Column(db.String(150), nullable=False)
+    position_name = db.Column(db.String(100), nullable=False)
+    start_at = db.Column(db.DateTime, nullable=False)
+    # Jendela bergulir hanya membaca interval yang berakhir setelah awal jendela terpanjang
+    end_at = db.Column(db.DateTime, nullable=False, index=True)
+
 # Model untuk Fasilitas TWR (Aerodrome Control Tower)
 class Facility(db.Model):
     __tablename__ = 'facility'
@@ -137,20 +243,32 @@ class FacilityApp(db.Model):
 class FacilityStatus(db.Model):
     __tablename__ = 'facility_status'
     id = db.Column(db.Integer, primary_key=True)
-    logbook_id = db.Column(db.Integer, db.ForeignKey('logbook_entry.id'), nullable=False)
+    # Kondisi lengkap sebuah logbook dibaca dari baris perubahan logbook-logbook di bulannya (lihat facility_state)
+    logbook_id = db.Column(db.Integer, db.ForeignKey('logbook_entry.id'), nullable=False, index=True)
     
     facility_id = db.Column(db.Integer, nullable=False)
     facility_type = db.Column(db.String(10), nullable=False) # 'TWR' atau 'APP'
 
-    condition = db.Column(db.Enum(FacilityCondition, values_callable=lambda obj: [e.value for e in obj]), nullable=False)
+    condition = db.Column(ConditionCode(FacilityCondition), nullable=False)
     notes = db.Column(db.Text, nullable=True)
 
+    # facility_id menunjuk ke tabel berbeda sesuai facility_type, jadi dibuat dua relasi baca-saja
+    twr_facility = db.relationship(
+        'Facility', primaryjoin="and_(foreign(FacilityStatus.facility_id) == Facility.id, FacilityStatus.facility_type == 'TWR')",
+        viewonly=True, lazy='raise'
+    )
+    app_facility = db.relationship(
+        'FacilityApp', primaryjoin="and_(foreign(FacilityStatus.facility_id) == FacilityApp.id, FacilityStatus.facility_type == 'APP')",
+        viewonly=True, lazy='raise'
+    )
+
     @property
     def facility(self):
+        """Fasilitas TWR/APP dari status ini; muat dulu twr_facility/app_facility lewat opsi query."""
         if self.facility_type == 'TWR':
-            return Facility.query.get(self.facility_id)
+            return self.twr_facility
         elif self.facility_type == 'APP':
-            return FacilityApp.query.get(self.facility_id)
+            return self.app_facility
         return None
 
 # Model untuk Log Operasional
@@ -160,11 +278,42 @@ class OperationalLog(db.Model):
     logbook_id = db.Column(db.Integer, db.ForeignKey('logbook_entry.id'), nullable=False)
     event_time = db.Column(db.Time, nullable=False)
     description = db.Column(db.Text, nullable=False)
-    remarks = db.Column(db.Text, nullable=True)
+    # Teks remarks disimpan sekali per isi di text_blob; atribut remarks (baca/tulis) didefinisikan di bawah
+    remarks_id = db.Column(db.Integer, db.ForeignKey('text_blob.id'), nullable=True)
+
+# Model untuk teks panjang yang berulang (NOTAM, remarks log operasional): satu baris per isi, dikunci hash SHA-256
+class TextBlob(db.Model):
+    __tablename__ = 'text_blob'
+    # AUTOINCREMENT: id tidak dipakai ulang setelah teks yang tidak dirujuk dihapus, karena arsip menyalin teks
+    # dengan id yang sama
+    __table_args__ = {'sqlite_autoincrement': True}
+    id = db.Column(db.Integer, primary_key=True)
+    hash = db.Column(db.String(64), unique=True, nullable=False)
+    content = db.Column(StoredText, nullable=False)
+
+
+def _stored_text(id_column):
+    """Isi text_blob sebagai kolom baca logbook (subquery primary key per baris, ikut query yang sama).
+
+    Nilai yang di-set diubah menjadi id text_blob sebelum flush oleh app/textstore.py; nilainya tidak
+    di-expire setelah flush karena sudah sama dengan isi database.
+    """
+    return db.column_property(
+        sa.select(TextBlob.content).where(TextBlob.id == id_column).correlate_except(TextBlob).scalar_subquery(),
+        expire_on_flush=False,
+    )
+
+
+LogbookEntry.notam = _stored_text(LogbookEntry.notam_id)
+OperationalLog.remarks = _stored_text(OperationalLog.remarks_id)
 
 # Model untuk Logbook CNSD
 class CNSDLogbook(db.Model):
     __tablename__ = 'cnsd_logbook'
+    # AUTOINCREMENT agar setiap shard bisa memulai rentang id-nya sendiri; indeks penutup untuk logbook terakhir
+    # per bandara (isian awal form create, lihat facilitystatus.latest_log)
+    __table_args__ = (db.Index('ix_cnsd_logbook_latest', 'airport', 'log_date', 'shift', 'id'),
+                      {'sqlite_autoincrement': True})
     id = db.Column(db.Integer, primary_key=True)
     airport = db.Column(db.String(100), nullable=False)
     log_date = db.Column(db.Date, nullable=False)
@@ -172,13 +321,21 @@ class CNSDLogbook(db.Model):
     manager_signature = db.Column(db.String(255), nullable=True)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    user = db.relationship('User')
-    personnel = db.relationship('CNSDPersonnel', backref='logbook', cascade="all, delete-orphan")
-    facility_statuses = db.relationship('CNSDFacilityStatus', backref='logbook', cascade="all, delete-orphan")
-    uraian_kegiatan = db.relationship('CNSDUraianKegiatan', backref='logbook', cascade="all, delete-orphan")
+    # Jumlah fasilitas Rusak pada kondisi lengkap logbook ini (dijaga rewrite_month, dibaca kalender cakupan)
+    unserviceable_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    user = db.relationship('User', lazy='raise')
+    personnel = db.relationship('CNSDPersonnel', backref=db.backref('logbook', lazy='raise'), lazy='raise', cascade="all, delete-orphan")
+    facility_status_changes = db.relationship('CNSDFacilityStatus', backref=db.backref('logbook', lazy='raise'), lazy='raise', cascade="all, delete-orphan")
+    uraian_kegiatan = db.relationship('CNSDUraianKegiatan', backref=db.backref('logbook', lazy='raise'), lazy='raise', cascade="all, delete-orphan")
+
+    @property
+    def facility_statuses(self):
+        """Kondisi lengkap setiap fasilitas pada logbook ini; muat dulu facility_status_history lewat opsi query."""
+        return carry_forward(self.facility_status_history, 'cnsd_facility_id')
 
 class CNSDPersonnel(db.Model):
     __tablename__ = 'cnsd_personnel'
+    __table_args__ = {'sqlite_autoincrement': True}
     id = db.Column(db.Integer, primary_key=True)
     cnsd_logbook_id = db.Column(db.Integer, db.ForeignKey('cnsd_logbook.id'), nullable=False)
     name = db.Column(db.String(150), nullable=False)
@@ -194,15 +351,100 @@ class CNSDFacility(db.Model):
 
 class CNSDFacilityStatus(db.Model):
     __tablename__ = 'cnsd_facility_status'
+    __table_args__ = {'sqlite_autoincrement': True}
     id = db.Column(db.Integer, primary_key=True)
-    cnsd_logbook_id = db.Column(db.Integer, db.ForeignKey('cnsd_logbook.id'), nullable=False)
+    cnsd_logbook_id = db.Column(db.Integer, db.ForeignKey('cnsd_logbook.id'), nullable=False, index=True)
     cnsd_facility_id = db.Column(db.Integer, db.ForeignKey('cnsd_facility.id'), nullable=False)
-    condition = db.Column(db.String(20), nullable=False)
-    facility = db.relationship('CNSDFacility')
+    condition = db.Column(ConditionCode(CNSD_CONDITIONS), nullable=False)
+    facility = db.relationship('CNSDFacility', lazy='raise')
+
+
+# --- RIWAYAT KONDISI FASILITAS (CARRY-FORWARD) ---
+# Logbook hanya menyimpan kondisi fasilitas yang berbeda dari logbook sebelumnya dengan tipe/bandara yang sama
+# pada bulan yang sama; logbook pertama setiap bulan menjadi keyframe yang menyimpan kondisi lengkap.
+# facility_status_history memuat semua baris perubahan dari awal bulan sampai logbook itu (urut tanggal, shift, id),
+# lalu properti facility_statuses menimpanya berurutan sehingga didapat kondisi lengkap.
+
+def carry_forward(history, facility_key):
+    """Kondisi terakhir per fasilitas dari baris perubahan yang terurut; baris kondisi None menghapus fasilitas."""
+    latest = {}
+    for status in history:
+        latest[getattr(status, facility_key)] = status
+    return [status for _, status in sorted(latest.items()) if status.condition is not None]
+
+
+def _status_history(parent, status_model, fk_column, group_column):
+    earlier = parent.__table__.alias(f'earlier_{parent.__tablename__}')
+    return db.relationship(
+        status_model, secondary=earlier,
+        primaryjoin=sa.and_(
+            earlier.c[group_column] == getattr(parent, group_column),
+            earlier.c.log_date >= sa.func.date(parent.log_date, 'start of month'),
+            sa.tuple_(earlier.c.log_date, shift_rank(earlier.c.shift), earlier.c.id)
+            <= sa.tuple_(parent.log_date, shift_rank(parent.shift), parent.id),
+        ),
+        secondaryjoin=getattr(status_model, fk_column) == earlier.c.id,
+        order_by=[earlier.c.log_date, shift_rank(earlier.c.shift), earlier.c.id],
+        viewonly=True, lazy='raise',
+    )
+
+
+LogbookEntry.facility_status_history = _status_history(LogbookEntry, FacilityStatus, 'logbook_id', 'logbook_type')
+CNSDLogbook.facility_status_history = _status_history(CNSDLogbook, CNSDFacilityStatus, 'cnsd_logbook_id', 'airport')
 
 class CNSDUraianKegiatan(db.Model):
     __tablename__ = 'cnsd_uraian_kegiatan'
+    __table_args__ = {'sqlite_autoincrement': True}
     id = db.Column(db.Integer, primary_key=True)
     cnsd_logbook_id = db.Column(db.Integer, db.ForeignKey('cnsd_logbook.id'), nullable=False)
     event_time = db.Column(db.String(20), nullable=False)
-    description = db.Column(db.Text, nullable=False)
\ No newline at end of file
+    description = db.Column(db.Text, nullable=False)
+
+# Model untuk titik lanjut (checkpoint) impor massal logbook historis
+class ImportCheckpoint(db.Model):
+    __tablename__ = 'import_checkpoint'
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(255), unique=True, nullable=False)
+    rows_done = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+
+# Kunci idempotensi logbook yang dikirim lewat sinkronisasi offline (lihat app/offlinesync.py)
+class SyncSubmission(db.Model):
+    __tablename__ = 'sync_submission'
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(100), unique=True, nullable=False)
+    kind = db.Column(db.String(10), nullable=False)
+    airport = db.Column(db.String(50), nullable=True)
+    logbook_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+# Versi data logbook per bulan; snapshot laporan bulan itu hanya dipakai selama versinya sama (lihat app/snapshot.py)
+class ReportMonth(db.Model):
+    __tablename__ = 'report_month'
+    id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.String(7), unique=True, nullable=False)  # 'YYYY-MM'
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+# Model untuk daftar database arsip per tahun (lihat app/archive.py)
+class LogbookArchive(db.Model):
+    __tablename__ = 'logbook_archive'
+    id = db.Column(db.Integer, primary_key=True)
+    year = db.Column(db.Integer, unique=True, nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    archived_until = db.Column(db.Date, nullable=False)
+    logbook_count = db.Column(db.Integer, nullable=False, default=0)
+    cnsd_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+
+# Model untuk antrean perubahan logbook yang disiarkan ke dashboard (lihat app/live.py)
+class ChangeEvent(db.Model):
+    __tablename__ = 'change_event'
+    # AUTOINCREMENT: hub membaca event dengan id > cursor, jadi id tidak boleh dipakai ulang setelah baris lama
+    # dipangkas (tabel bisa kosong seluruhnya)
+    __table_args__ = {'sqlite_autoincrement': True}
+    id = db.Column(db.Integer, primary_key=True)
+    channel = db.Column(db.String(120), nullable=False)
+    kind = db.Column(db.String(40), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, server_default=db.func.now(), index=True)
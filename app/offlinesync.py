@@ -0,0 +1,213 @@
+# app/offlinesync.py
+
+import base64
+import binascii
+import os
+
+import sqlalchemy as sa
+from flask import current_app, session
+from flask_login import current_user
+from werkzeug.utils import secure_filename
+
+from .models import db, LogbookEntry, CNSDLogbook, CNSDPersonnel, SyncSubmission
+from .importer import ImportRecordError, ReferenceLookup, build_cnsd_rows, build_operasi_rows, write_batch
+from .live import record_change
+from .routes import allowed_file
+from .sharding import cnsd_bind
+from .shardrouting import use_cnsd_shard
+
+MAX_KEY_LENGTH = 100
+OPERASI_SIGNATURES = ('controller_signature_1', 'controller_signature_2', 'manager_signature')
+DIVISIONS = {'TWR': 'operasi', 'APP': 'operasi', 'CNSD': 'teknik'}
+
+
+class SyncRejected(Exception):
+    """Item batch ditolak karena hak akses (bukan karena isinya); dilaporkan per item."""
+
+
+# --- PARAF ---
+
+def _decode_signature(field, blob):
+    """{'filename', 'data' (base64)} -> (nama file aman, isi)."""
+    if not isinstance(blob, dict) or not blob.get('filename') or not blob.get('data'):
+        raise ImportRecordError(f"Signature '{field}' needs filename and base64 data.")
+    filename = secure_filename(blob['filename'])
+    if not allowed_file(filename):
+        raise ImportRecordError(f"Signature '{field}' must be one of {sorted(current_app.config['ALLOWED_EXTENSIONS'])}.")
+    try:
+        return filename, base64.b64decode(blob['data'], validate=True)
+    except (binascii.Error, ValueError):
+        raise ImportRecordError(f"Signature '{field}' is not valid base64.")
+
+
+def _decode_signatures(kind, record, signatures):
+    """Memvalidasi semua paraf item sebelum ada yang ditulis: {field: (nama file, isi)} dan {nama personel: ...}."""
+    if not isinstance(signatures, dict):
+        raise ImportRecordError("'signatures' must be an object.")
+    fields, personnel = {}, {}
+    allowed = OPERASI_SIGNATURES if kind in ('TWR', 'APP') else ('manager_signature',)
+    for field, blob in signatures.items():
+        if field == 'personnel' and kind == 'CNSD':
+            names = {(name or '').strip() for name in record.get('personnel') or []}
+            for name, personnel_blob in (blob or {}).items():
+                if name.strip() not in names:
+                    raise ImportRecordError(f"Signature for '{name}' who is not in personnel.")
+                personnel[name.strip()] = _decode_signature(f'personnel:{name}', personnel_blob)
+        elif field in allowed:
+            fields[field] = _decode_signature(field, blob)
+        else:
+            raise ImportRecordError(f"Unknown signature '{field}' for {kind}.")
+    return fields, personnel
+
+
+def _save_file(filename, content):
+    with open(os.path.join(current_app.config['UPLOAD_FOLDER'], filename), 'wb') as f:
+        f.write(content)
+
+
+def _store_signatures(kind, log_id, fields, personnel):
+    """Mengisi kolom paraf dengan pola nama file yang sama seperti form create.
+
+    Mengembalikan [(nama file, isi)] yang baru ditulis ke UPLOAD_FOLDER setelah commit berhasil.
+    """
+    files = []
+    if kind == 'CNSD':
+        if 'manager_signature' in fields:
+            filename, content = fields['manager_signature']
+            files.append((f"manager_{log_id}_{filename}", content))
+            db.session.execute(sa.update(CNSDLogbook).where(CNSDLogbook.id == log_id)
+                               .values(manager_signature=f"manager_{log_id}_{filename}"))
+        rows = db.session.execute(sa.select(CNSDPersonnel.id, CNSDPersonnel.name)
+                                  .where(CNSDPersonnel.cnsd_logbook_id == log_id).order_by(CNSDPersonnel.id))
+        for i, (personnel_id, name) in enumerate(rows):
+            if name in personnel:
+                filename, content = personnel[name]
+                files.append((f"personnel_{log_id}_{i}_{filename}", content))
+                db.session.execute(sa.update(CNSDPersonnel).where(CNSDPersonnel.id == personnel_id)
+                                   .values(signature_path=f"personnel_{log_id}_{i}_{filename}"))
+        return files
+    values = {}
+    for field, (filename, content) in fields.items():
+        values[field] = f"ops_{field}_{log_id}_{filename}"
+        files.append((values[field], content))
+    if values:
+        db.session.execute(sa.update(LogbookEntry).where(LogbookEntry.id == log_id).values(**values))
+    return files
+
+
+# --- PEMROSESAN BATCH ---
+
+def _submitting_user(division, airport_code, submitter):
+    """Pengguna pencatat logbook: pengguna sesi atau pengguna kunci API; divisinya harus cocok, dan untuk CNSD
+    bandaranya harus bandara yang dibuka di sesi (atau bandara kunci API)."""
+    user, unlocked_airport = submitter if submitter else (current_user, session.get('unlocked_airport'))
+    if user.division != division:
+        raise SyncRejected(f"Division '{user.division}' cannot submit {division} logbooks.")
+    if airport_code and unlocked_airport != airport_code:
+        if submitter:
+            raise SyncRejected(f"This API key cannot submit logbooks for airport '{airport_code}'.")
+        raise SyncRejected(f"Airport '{airport_code}' is not unlocked in this session.")
+    return user.id
+
+
+def _item_bind(item):
+    """Database tujuan item: shard bandara untuk logbook CNSD (jika sharding aktif), selain itu database hot.
+    Kunci idempotensi disimpan di database yang sama agar ikut satu commit dengan logbook-nya."""
+    record = item.get('record') if isinstance(item, dict) else None
+    if isinstance(record, dict) and (record.get('kind') or '').upper() == 'CNSD':
+        return cnsd_bind(record.get('airport'))
+    return db.engine
+
+
+def _existing(key, bind, division, airport_code):
+    """Hasil duplicate untuk kunci yang sudah pernah diterima, atau None.
+
+    Dipanggil setelah hak akses pengirim diperiksa; kunci milik divisi/bandara lain ditolak tanpa menyebut
+    jenis dan id logbook-nya.
+    """
+    # Kunci CNSD yang diterima sebelum disimpan per shard masih ada di database hot
+    for engine in dict.fromkeys([bind, db.engine]):
+        submission = db.session.execute(sa.select(SyncSubmission.kind, SyncSubmission.airport,
+                                                  SyncSubmission.logbook_id)
+                                        .filter_by(idempotency_key=key), bind_arguments={'bind': engine}).first()
+        if submission is None:
+            continue
+        if DIVISIONS.get(submission.kind) != division or submission.airport != airport_code:
+            raise SyncRejected("This idempotency key was already used by another division or airport.")
+        return {'status': 'duplicate', 'kind': submission.kind, 'logbook_id': submission.logbook_id}
+    return None
+
+
+def _submit_item(item, refs, submitter):
+    if not isinstance(item, dict):
+        raise ImportRecordError('Item must be an object.')
+    key = item.get('idempotency_key')
+    if not isinstance(key, str) or not key.strip() or len(key) > MAX_KEY_LENGTH:
+        raise ImportRecordError(f"'idempotency_key' must be a non-empty string of at most {MAX_KEY_LENGTH} characters.")
+    record = item.get('record')
+    if not isinstance(record, dict):
+        raise ImportRecordError("'record' must be an object in the import-logbooks format.")
+    kind = (record.get('kind') or '').upper()
+    record['kind'] = kind
+    if kind not in DIVISIONS:
+        raise ImportRecordError(f"Unknown kind '{record.get('kind')}', expected TWR, APP or CNSD.")
+    airport_code = record.get('airport') if kind == 'CNSD' else None
+    user_id = _submitting_user(DIVISIONS[kind], airport_code, submitter)
+    bind = _item_bind(item)
+    if (duplicate := _existing(key, bind, DIVISIONS[kind], airport_code)) is not None:
+        return duplicate
+    rows = build_cnsd_rows(record, refs, user_id) if kind == 'CNSD' else build_operasi_rows(record, refs, user_id)
+    fields, personnel = _decode_signatures(kind, record, item.get('signatures') or {})
+
+    # Logbook CNSD ditulis dan di-commit di shard bandaranya bersama kunci idempotensinya; commit di dalam blok
+    # agar siaran live (app/live.py) juga membaca logbook dari shard yang sama
+    try:
+        with use_cnsd_shard(airport_code):
+            _, (log_id,) = write_batch([] if kind == 'CNSD' else [rows], [rows] if kind == 'CNSD' else [])
+            files = _store_signatures(kind, log_id, fields, personnel)
+            db.session.execute(sa.insert(SyncSubmission).values(idempotency_key=key, kind=kind, airport=airport_code,
+                                                                logbook_id=log_id, user_id=user_id),
+                               bind_arguments={'bind': bind})
+            record_change(db.session, CNSDLogbook if kind == 'CNSD' else LogbookEntry, log_id)
+            db.session.commit()
+    except sa.exc.IntegrityError:
+        # Kiriman ulang yang sama sedang diproses request lain: kuncinya sudah tersimpan di sana
+        db.session.rollback()
+        if (duplicate := _existing(key, bind, DIVISIONS[kind], airport_code)) is None:
+            raise
+        return duplicate
+    # File paraf baru ditulis setelah commit: commit yang gagal tidak meninggalkan file dengan id logbook yang
+    # bisa dipakai ulang
+    for filename, content in files:
+        _save_file(filename, content)
+    return {'status': 'created', 'kind': kind, 'logbook_id': log_id}
+
+
+def submit_batch(items, submitter=None):
+    """Memvalidasi dan menyimpan setiap logbook batch dalam transaksinya sendiri; hasil per item, urut batch.
+
+    submitter: (pengguna, bandara) kunci SYNC_API_KEYS pengirim; None untuk pengguna login.
+
+    Status item: created, duplicate (kunci idempotensi sudah pernah diterima; logbook_id dari kiriman pertama),
+    invalid (isi perlu diperbaiki), rejected (hak akses), atau error (mis. database terkunci; aman dikirim ulang).
+    """
+    refs = ReferenceLookup()
+    results = []
+    for index, item in enumerate(items):
+        key = item.get('idempotency_key') if isinstance(item, dict) else None
+        try:
+            result = _submit_item(item, refs, submitter)
+        except ImportRecordError as e:
+            db.session.rollback()
+            result = {'status': 'invalid', 'error': str(e)}
+        except SyncRejected as e:
+            db.session.rollback()
+            result = {'status': 'rejected', 'error': str(e)}
+        except sa.exc.IntegrityError:
+            db.session.rollback()
+            result = {'status': 'error', 'error': 'Integrity error, retry later.'}
+        except sa.exc.OperationalError as e:
+            db.session.rollback()
+            result = {'status': 'error', 'error': str(e.orig)}
+        results.append({'index': index, 'idempotency_key': key, **result})
+    return results
@@ -0,0 +1,73 @@
+# app/personalpdf.py
+
+import multiprocessing
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+from flask import current_app, render_template
+from flask.cli import with_appcontext
+
+from .recap import personal_logbooks
+
+
+def _slug(name):
+    return re.sub(r'[^A-Za-z0-9]+', '_', name).strip('_')
+
+
+def personal_pdf_filename(name, year, month):
+    return f'personal_logbook_{year:04d}_{month:02d}_{_slug(name)}.pdf'
+
+
+def render_personal_logbook_html(name, year, month, log_data, summary):
+    return render_template(
+        'personal_log_pdf.html', log_data=log_data, summary=summary, year=year, month=month,
+        logo_path=os.path.join(current_app.static_folder, 'img', 'airnav.png'),
+    )
+
+
+def _render_pdf(html):
+    """Dijalankan di proses pool: HTML -> PDF (WeasyPrint). Template memakai path file:// absolut."""
+    from weasyprint import HTML
+    return HTML(string=html).write_pdf()
+
+
+def write_personal_logbooks_zip(fileobj, year, month, workers=None, echo=None):
+    """Menulis logbook personal PDF semua personel untuk satu bulan ke ZIP; mengembalikan jumlah file.
+
+    Jam kerja seluruh personel dihitung dari satu pass atas slot posisi bulan itu (lihat personal_logbooks),
+    HTML dirender di proses ini, lalu konversi PDF yang berat dibagi ke beberapa proses. Pool memakai
+    'spawn' agar aman dijalankan dari worker gunicorn yang punya thread dan koneksi database.
+    """
+    workers = workers or current_app.config['PERSONAL_PDF_WORKERS']
+    logbooks = personal_logbooks(year, month)
+    names = list(logbooks)
+    pages = [render_personal_logbook_html(name, year, month, *logbooks[name]) for name in names]
+
+    with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED) as archive:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            # map() menjaga urutan roster; PDF ditulis ke ZIP begitu selesai
+            for name, pdf in zip(names, pool.map(_render_pdf, pages)):
+                archive.writestr(personal_pdf_filename(name, year, month), pdf)
+                if echo:
+                    echo(f"  {name}")
+    return len(names)
+
+
+@click.command('export-personal-logbooks')
+@click.option('--year', type=int, required=True)
+@click.option('--month', type=click.IntRange(1, 12), required=True)
+@click.option('--output', type=click.Path(dir_okay=False), default=None,
+              help='File ZIP tujuan. Default: personal_logbooks_<tahun>_<bulan>.zip')
+@click.option('--workers', type=int, default=None, help='Jumlah proses render PDF (default PERSONAL_PDF_WORKERS).')
+@with_appcontext
+def export_personal_logbooks_command(year, month, output, workers):
+    """Membuat logbook personal PDF seluruh personel ATC untuk satu bulan dalam satu file ZIP."""
+    output = output or f'personal_logbooks_{year:04d}_{month:02d}.zip'
+    started = time.perf_counter()
+    with open(output, 'wb') as f:
+        count = write_personal_logbooks_zip(f, year, month, workers=workers, echo=click.echo)
+    click.echo(f"Selesai: {count} logbook personal -> {output} ({time.perf_counter() - started:.1f} detik).")
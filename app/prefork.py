@@ -0,0 +1,157 @@
+# app/prefork.py
+
+import gc
+import json
+import os
+import subprocess
+import sys
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from .models import db
+from .reference import reference_data
+from .shardrouting import shard_engines
+
+# Request yang dijalankan setiap worker sebelum diukur, agar template & route sudah "hangat" seperti saat melayani
+WARMUP_PATHS = ('/login', '/login', '/login')
+REPORT_PREFIX = 'memory-report:'
+
+
+def dispose_engines(app, close=True):
+    """Membuang pool koneksi semua engine (database hot, bind lain, shard CNSD).
+
+    Di proses master dipanggil dengan close=True sebelum fork; di worker dengan close=False agar koneksi
+    warisan master tidak ikut ditutup dari proses anak, cukup dilepas dari pool.
+    """
+    with app.app_context():
+        for engine in [*db.engines.values(), *shard_engines().values()]:
+            engine.dispose(close=close)
+
+
+def prepare_for_fork(app):
+    """Dipanggil di master gunicorn setelah preload: data referensi sudah dibangun, koneksi ditutup, objek dibekukan.
+
+    gc.freeze() memindahkan semua objek yang ada ke generasi permanen sehingga garbage collector di worker
+    tidak menulis ke halaman memori warisan master (yang akan memicu copy-on-write).
+    """
+    with app.app_context():
+        reference_data()
+    dispose_engines(app)
+    gc.freeze()
+
+
+# --- LAPORAN MEMORI ---
+
+def memory_usage(pid='self'):
+    """RSS, PSS, dan USS (memori privat) sebuah proses dalam KiB, dari /proc/<pid>/smaps_rollup (Linux)."""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            parts = value.split()
+            if len(parts) == 2 and parts[1] == 'kB':
+                fields[key] = int(parts[0])
+    return {'rss': fields['Rss'], 'pss': fields['Pss'], 'uss': fields['Private_Clean'] + fields['Private_Dirty']}
+
+
+def _warm_up(app):
+    client = app.test_client()
+    for path in WARMUP_PATHS:
+        client.get(path)
+
+
+def run_independent_worker():
+    """Proses anak laporan memori: boot create_app sendiri (seperti worker tanpa preload), lalu melapor."""
+    from . import create_app
+    app = create_app()
+    _warm_up(app)
+    print(REPORT_PREFIX + json.dumps(memory_usage()), flush=True)
+    sys.stdin.read()
+
+
+def _measure_preloaded(app, workers):
+    prepare_for_fork(app)
+    children = []
+    for _ in range(workers):
+        result_read, result_write = os.pipe()
+        release_read, release_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(result_read)
+            os.close(release_write)
+            dispose_engines(app, close=False)
+            _warm_up(app)
+            os.write(result_write, json.dumps(memory_usage()).encode())
+            os.close(result_write)
+            # Tetap hidup sampai semua worker diukur agar PSS mencerminkan pembagian halaman yang sebenarnya
+            os.read(release_read, 1)
+            os._exit(0)
+        os.close(result_write)
+        os.close(release_read)
+        children.append((pid, result_read, release_write))
+
+    usages = []
+    for pid, result_read, release_write in children:
+        with os.fdopen(result_read) as f:
+            usages.append(json.loads(f.read()))
+    # Worker yang di-fork belakangan ikut mewarisi ujung tulis pipe worker sebelumnya, jadi tutup semuanya dulu
+    for pid, result_read, release_write in children:
+        os.close(release_write)
+    for pid, result_read, release_write in children:
+        os.waitpid(pid, 0)
+    gc.unfreeze()
+    return usages
+
+
+def _measure_independent(workers):
+    procs, usages = [], []
+    try:
+        # Boot berurutan: create_app menulis data seed, boot paralel hanya akan saling mengunci database
+        for _ in range(workers):
+            proc = subprocess.Popen(
+                [sys.executable, '-c', 'from app.prefork import run_independent_worker; run_independent_worker()'],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+            )
+            procs.append(proc)
+            # create_app bisa mencetak pesan seed ke stdout; hasil pengukuran ditandai REPORT_PREFIX
+            for line in proc.stdout:
+                if line.startswith(REPORT_PREFIX):
+                    usages.append(json.loads(line[len(REPORT_PREFIX):]))
+                    break
+            else:
+                raise click.ClickException('Worker independen gagal boot.')
+    finally:
+        for proc in procs:
+            proc.stdin.close()
+            proc.wait()
+    return usages
+
+
+def _summary(usages):
+    return {key: sum(u[key] for u in usages) / len(usages) / 1024 for key in ('rss', 'pss', 'uss')}
+
+
+@click.command('memory-report')
+@click.option('--workers', default=4, show_default=True, help='Jumlah worker yang disimulasikan per mode.')
+@with_appcontext
+def memory_report_command(workers):
+    """Membandingkan memori per worker: preload + fork (gunicorn.conf.py) vs setiap worker boot sendiri."""
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        raise click.ClickException('Laporan memori membutuhkan Linux (/proc/<pid>/smaps_rollup).')
+    app = current_app._get_current_object()
+    # Session milik perintah CLI ini tidak boleh memegang koneksi saat fork
+    db.session.remove()
+
+    click.echo(f"Mengukur {workers} worker dengan preload ...")
+    preloaded = _summary(_measure_preloaded(app, workers))
+    click.echo(f"Mengukur {workers} worker yang boot sendiri ...")
+    independent = _summary(_measure_independent(workers))
+
+    click.echo(f"\n{'Mode':<12} {'RSS':>9} {'PSS':>9} {'USS':>9}   (MiB rata-rata per worker)")
+    for label, summary in (('preload', preloaded), ('independen', independent)):
+        click.echo(f"{label:<12} {summary['rss']:>9.1f} {summary['pss']:>9.1f} {summary['uss']:>9.1f}")
+    saved = independent['uss'] - preloaded['uss']
+    click.echo(f"\nHemat memori privat (USS) per worker: {saved:.1f} MiB ({saved / independent['uss']:.0%});"
+               f" untuk {workers} worker: {saved * workers:.1f} MiB.")
@@ -0,0 +1,210 @@
+# app/querybudget.py
+
+import tempfile
+from collections import Counter
+from contextlib import contextmanager
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .models import db, LogbookEntry, CNSDLogbook, ATCPersonnel, Facility, FacilityApp, CNSDFacility
+from .shardrouting import use_cnsd_shard
+
+# Ukuran data contoh (hari) untuk pengecekan budget; budget di bawah berlaku untuk ukuran ini
+BUDGET_DATASET_DAYS = 30
+BLUEPRINTS_WITH_BUDGETS = ('main', 'auth')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Jumlah statement SQL melebihi budget yang dideklarasikan."""
+
+
+class QueryCounter:
+    """Mencatat setiap statement SQL yang dijalankan selama blok `with` aktif."""
+
+    def __init__(self):
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(Engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(Engine, 'before_cursor_execute', self._record)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def repeated(self, min_count=2):
+        """Statement identik yang dijalankan berulang (ciri khas pola N+1), terbanyak lebih dulu."""
+        return [(sql, n) for sql, n in Counter(self.statements).most_common() if n >= min_count]
+
+    def report(self, limit=5):
+        lines = []
+        for sql, n in self.repeated()[:limit]:
+            lines.append(f"  {n}x {' '.join(sql.split())[:300]}")
+        return '\n'.join(lines) or '  (tidak ada statement berulang)'
+
+
+@contextmanager
+def assert_query_budget(budget, label='block'):
+    """Gagal dengan QueryBudgetExceeded jika blok menjalankan lebih dari `budget` statement SQL.
+
+    Contoh:
+        with assert_query_budget(6, 'view_log'):
+            client.get('/log/view/1')
+    """
+    with QueryCounter() as counter:
+        yield counter
+    if counter.count > budget:
+        raise QueryBudgetExceeded(
+            f"{label}: {counter.count} query melebihi budget {budget}. Statement berulang:\n{counter.report()}"
+        )
+
+
+# --- BUDGET PER ROUTE ---
+
+def _operasi_form(logbook_type, personnel_ids):
+    FacilityModel = FacilityApp if logbook_type == 'APP' else Facility
+    form = {
+        'log_date': '2025-06-30', 'shift': 'Pagi', 'notam': 'Budget check',
+        'atc_on_duty_personnel[]': [str(pid) for pid in personnel_ids],
+        'op_log_time_0': '08:00', 'op_log_desc_0': 'Budget check',
+    }
+    for i in range(1, 7):
+        form[f'time_header_{i}'] = f'{6 + i:02d}:00-{7 + i:02d}:00'
+    for facility in FacilityModel.query.all():
+        form[f'facility_{facility.id}_condition'] = 'G'
+    return form
+
+
+def _cnsd_form(airport_code):
+    form = {'log_date': '2025-06-30', 'shift': 'PAGI', 'personnel_name[]': ['Teknisi A', 'Teknisi B'],
+            'event_time[]': ['08:00'], 'description[]': ['Budget check']}
+    for facility in CNSDFacility.query.filter_by(airport_code=airport_code).all():
+        form[f'facility_{facility.id}_condition'] = 'Baik'
+    return form
+
+
+def route_budget_cases(app):
+    """Kasus (nama, endpoint, pengguna, method, url, data, budget) untuk setiap route main_bp dan auth_bp.
+
+    Budget mencerminkan jumlah query saat ini pada data contoh BUDGET_DATASET_DAYS hari; turunkan
+    budget setiap kali sebuah route dioptimalkan agar regresi N+1 langsung terdeteksi.
+    """
+    with app.app_context():
+        twr_id = db.session.query(LogbookEntry.id).filter_by(logbook_type='TWR').order_by(LogbookEntry.id).first()[0]
+        app_id = db.session.query(LogbookEntry.id).filter_by(logbook_type='APP').order_by(LogbookEntry.id).first()[0]
+        with use_cnsd_shard('YIA'):
+            cnsd_id = db.session.query(CNSDLogbook.id).filter_by(airport='YIA').order_by(CNSDLogbook.id).first()[0]
+        personnel_ids = [p.id for p in ATCPersonnel.query.order_by(ATCPersonnel.id).limit(4)]
+        twr_form = _operasi_form('TWR', personnel_ids)
+        app_form = _operasi_form('APP', personnel_ids)
+        cnsd_form = _cnsd_form('YIA')
+
+    recap_args = 'recap_month=6&recap_year=2025'
+    personal_args = f'personnel_id={personnel_ids[0]}&personal_month=6&personal_year=2025'
+    calendar_args = 'calendar_month=6&calendar_year=2025'
+    return [
+        ('index', 'main.index', 'operasi', 'GET', '/', None, 1),
+        ('dashboard_history', 'main.dashboard_operasi', 'operasi', 'GET', '/dashboard/operasi?tab=history', None, 3),
+        ('dashboard_recap', 'main.dashboard_operasi', 'operasi', 'GET',
+         f'/dashboard/operasi?tab=recap&{recap_args}', None, 4),
+        ('dashboard_personal', 'main.dashboard_operasi', 'operasi', 'GET',
+         f'/dashboard/operasi?tab=personal&{personal_args}', None, 4),
+        ('dashboard_tab_history', 'main.dashboard_operasi_tab', 'operasi', 'GET', '/dashboard/operasi/tab/history',
+         None, 3),
+        ('dashboard_tab_recap', 'main.dashboard_operasi_tab', 'operasi', 'GET',
+         f'/dashboard/operasi/tab/recap?{recap_args}', None, 4),
+        ('dashboard_tab_personal', 'main.dashboard_operasi_tab', 'operasi', 'GET',
+         f'/dashboard/operasi/tab/personal?{personal_args}', None, 4),
+        ('dashboard_calendar', 'main.dashboard_operasi', 'operasi', 'GET',
+         f'/dashboard/operasi?tab=calendar&{calendar_args}', None, 3),
+        ('dashboard_tab_calendar', 'main.dashboard_operasi_tab', 'operasi', 'GET',
+         f'/dashboard/operasi/tab/calendar?{calendar_args}', None, 3),
+        ('create_log_form', 'main.create_log_entry', 'operasi', 'GET', '/log/new/TWR', None, 4),
+        ('create_log_submit', 'main.create_log_entry', 'operasi', 'POST', '/log/new/TWR', twr_form, 20),
+        ('create_log_app_submit', 'main.create_log_entry', 'operasi', 'POST', '/log/new/APP', app_form, 22),
+        ('edit_log_form', 'main.edit_log', 'operasi', 'GET', f'/log/edit/{twr_id}', None, 6),
+        ('edit_log_submit', 'main.edit_log', 'operasi', 'POST', f'/log/edit/{twr_id}', twr_form, 24),
+        ('view_log', 'main.view_log', 'operasi', 'GET', f'/log/view/{twr_id}', None, 6),
+        ('view_log_app', 'main.view_log', 'operasi', 'GET', f'/log/view/{app_id}', None, 6),
+        ('download_log_pdf', 'main.download_log_pdf', 'operasi', 'GET', f'/log/download/{twr_id}', None, 6),
+        ('dashboard_teknik', 'main.dashboard_teknik', 'teknik', 'GET', '/dashboard/teknik', None, 1),
+        ('unlock_cnsd_logbook', 'main.unlock_cnsd_logbook', 'teknik', 'POST', '/cnsd/unlock',
+         {'airport_code': 'YIA', 'airport_password': app.config['AIRPORT_PASSWORDS']['YIA']}, 2),
+        ('cnsd_dashboard', 'main.cnsd_dashboard', 'teknik', 'GET', '/cnsd/dashboard/YIA', None, 3),
+        ('cnsd_calendar', 'main.cnsd_calendar', 'teknik', 'GET', f'/cnsd/calendar/YIA?{calendar_args}', None, 3),
+        ('create_cnsd_log_form', 'main.create_cnsd_log', 'teknik', 'GET', '/cnsd/log/new/YIA', None, 3),
+        ('create_cnsd_log_submit', 'main.create_cnsd_log', 'teknik', 'POST', '/cnsd/log/new/YIA', cnsd_form, 9),
+        ('view_cnsd_log', 'main.view_cnsd_log', 'teknik', 'GET', f'/cnsd/log/view/{cnsd_id}', None, 5),
+        ('edit_cnsd_log_form', 'main.edit_cnsd_log', 'teknik', 'GET', f'/cnsd/log/edit/{cnsd_id}', None, 5),
+        ('edit_cnsd_log_submit', 'main.edit_cnsd_log', 'teknik', 'POST', f'/cnsd/log/edit/{cnsd_id}',
+         {'log_date': '2025-06-01', 'shift': 'PAGI'}, 5),
+        ('download_cnsd_log_pdf', 'main.download_cnsd_log_pdf', 'teknik', 'GET',
+         f'/cnsd/log/download/{cnsd_id}', None, 5),
+        ('login_form', 'auth.login', None, 'GET', '/login', None, 0),
+        ('login_submit', 'auth.login', None, 'POST', '/login', {'username': 'operasi', 'password': '1234'}, 2),
+        ('logout', 'auth.logout', 'logout', 'GET', '/logout', None, 2),
+    ]
+
+
+def _clients(app):
+    clients = {None: app.test_client()}
+    for username in ('operasi', 'teknik', 'logout'):
+        client = app.test_client()
+        client.post('/login', data={'username': 'teknik' if username == 'teknik' else 'operasi', 'password': '1234'})
+        clients[username] = client
+    with clients['teknik'].session_transaction() as sess:
+        sess['unlocked_airport'] = 'YIA'
+    return clients
+
+
+def check_route_budgets(app, echo=print):
+    """Menjalankan semua kasus budget; mengembalikan daftar pelanggaran (termasuk route tanpa budget)."""
+    cases = route_budget_cases(app)
+    failures = []
+
+    covered = {case[1] for case in cases}
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint.split('.')[0] in BLUEPRINTS_WITH_BUDGETS and rule.endpoint not in covered:
+            failures.append(f"{rule.endpoint}: belum ada budget query yang dideklarasikan.")
+
+    clients = _clients(app)
+    for name, endpoint, user, method, url, data, budget in cases:
+        client = clients[user]
+        try:
+            with assert_query_budget(budget, f"{name} ({method} {url})") as counter:
+                response = client.open(url, method=method, data=data)
+        except QueryBudgetExceeded as e:
+            failures.append(str(e))
+            echo(f"  GAGAL {name:<26} budget {budget}")
+            continue
+        if response.status_code >= 400:
+            failures.append(f"{name} ({method} {url}): status {response.status_code}")
+        echo(f"  OK    {name:<26} {counter.count:>4} / {budget} query")
+    return failures
+
+
+@click.command('check-query-budgets')
+@click.option('--workdir', type=click.Path(file_okay=False), default=None,
+              help='Folder database contoh (dipakai ulang antar-run). Default: folder sementara.')
+@with_appcontext
+def check_query_budgets_command(workdir):
+    """Memeriksa jumlah query setiap route terhadap budget-nya pada data contoh (deteksi N+1)."""
+    from .benchmark import build_benchmark_app
+
+    app = build_benchmark_app(BUDGET_DATASET_DAYS, workdir or tempfile.mkdtemp(prefix='logbook-budget-'),
+                              echo=click.echo)
+    failures = check_route_budgets(app, echo=click.echo)
+    if failures:
+        for failure in failures:
+            click.echo(failure, err=True)
+        raise click.ClickException(f"{len(failures)} route melanggar budget query.")
+    click.echo("Semua route berada dalam budget query.")
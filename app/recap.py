@@ -0,0 +1,225 @@
+# app/recap.py
+
+import calendar
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import sqlalchemy as sa
+
+from .models import db, LogbookEntry, ATCPersonnel, ATCPosition, ATCPositionHeader, atc_duty_association
+from .archive import archives_in_range, archive_session
+from .reference import reference_data
+
+# Batas lebar matriks rekap (jumlah bulan dalam satu rentang)
+MAX_RECAP_MONTHS = 36
+TIME_SLOTS = range(1, 7)
+
+
+def parse_duration(time_str: str) -> timedelta:
+    """Menghitung durasi dari string format 'HH:MM-HH:MM'."""
+    if not time_str or '-' not in time_str:
+        return timedelta(0)
+    try:
+        start_str, end_str = time_str.split('-')
+        start_time = datetime.strptime(start_str.strip(), '%H:%M').time()
+        end_time = datetime.strptime(end_str.strip(), '%H:%M').time()
+
+        start_dt = datetime.combine(datetime.today(), start_time)
+        end_dt = datetime.combine(datetime.today(), end_time)
+
+        if end_dt < start_dt:
+            end_dt += timedelta(days=1)
+
+        return end_dt - start_dt
+    except (ValueError, IndexError):
+        return timedelta(0)
+
+
+def month_span(start_month, end_month):
+    """Daftar (tahun, bulan) dari start_month sampai end_month, inklusif."""
+    (year, month), months = start_month, []
+    while (year, month) <= end_month:
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def recap_range_from_args(args, today):
+    """Rentang bulan rekap dari query string: recap_month/recap_year (awal) dan recap_end_month/recap_end_year.
+
+    Tanpa bulan akhir, rekap hanya satu bulan (perilaku tab recap semula). Rentang dibatasi MAX_RECAP_MONTHS.
+    """
+    start = (args.get('recap_year', today.year, type=int), args.get('recap_month', today.month, type=int))
+    end = (args.get('recap_end_year', start[0], type=int), args.get('recap_end_month', start[1], type=int))
+    if not 1 <= start[1] <= 12:
+        start = (start[0], today.month)
+    if not 1 <= end[1] <= 12 or end < start:
+        end = start
+    months = month_span(start, end)[:MAX_RECAP_MONTHS]
+    return months[0], months[-1]
+
+
+# --- AGREGASI ---
+
+def _duty_dates_stmt(start_date, end_date):
+    """Pasangan unik (nama personel, tanggal) yang tercatat sebagai ATC on duty."""
+    return (
+        sa.select(ATCPersonnel.name, LogbookEntry.log_date)
+        .join(atc_duty_association, atc_duty_association.c.atc_personnel_id == ATCPersonnel.id)
+        .join(LogbookEntry, LogbookEntry.id == atc_duty_association.c.logbook_entry_id)
+        .where(LogbookEntry.log_date >= start_date, LogbookEntry.log_date <= end_date)
+        .group_by(ATCPersonnel.name, LogbookEntry.log_date)
+    )
+
+
+def _slot_hours_stmt(start_date, end_date):
+    """Jumlah slot posisi per (bulan, nama di slot, string header jam); durasi header dihitung di Python."""
+    month = sa.func.strftime('%Y-%m', LogbookEntry.log_date)
+    slots = []
+    for i in TIME_SLOTS:
+        slot, header = getattr(ATCPosition, f'time_slot_{i}'), getattr(ATCPositionHeader, f'header_{i}')
+        slots.append(
+            sa.select(month.label('month'), slot.label('name'), header.label('header'))
+            .join(ATCPositionHeader, ATCPositionHeader.logbook_id == ATCPosition.logbook_id)
+            .join(LogbookEntry, LogbookEntry.id == ATCPosition.logbook_id)
+            .where(LogbookEntry.log_date >= start_date, LogbookEntry.log_date <= end_date,
+                   slot != '', header != '')
+        )
+    union = sa.union_all(*slots).subquery()
+    return (
+        sa.select(union.c.month, union.c.name, union.c.header, sa.func.count())
+        .group_by(union.c.month, union.c.name, union.c.header)
+    )
+
+
+def personnel_recap(start_month, end_month):
+    """Matriks rekap hari bertugas dan jam posisi per personel per bulan, dalam satu pass berkelompok.
+
+    Angkanya sama dengan logika rekap per bulan: hari = tanggal unik sebagai ATC on duty, jam = jumlah
+    durasi header untuk setiap slot posisi yang berisi nama personel. Mengembalikan (daftar bulan, baris);
+    setiap baris berisi name, months ([{'days', 'hours'}] per bulan), days, dan hours (total).
+    """
+    from .snapshot import fresh_snapshots, month_recap
+
+    months = month_span(start_month, end_month)
+    # Bulan dengan snapshot kolumnar yang masih segar dihitung dari snapshot; sisanya dari database
+    snapshots = fresh_snapshots(months)
+    pending = [month for month in months if month not in snapshots]
+    snapshot_months = {f'{year:04d}-{month:02d}' for year, month in snapshots}
+
+    duty_dates = defaultdict(set)
+    slot_hours = defaultdict(timedelta)
+    days_per_month = defaultdict(int)
+
+    def collect(session):
+        for name, log_date in session.execute(_duty_dates_stmt(start_date, end_date)):
+            if (log_date.year, log_date.month) not in snapshots:
+                duty_dates[name].add(log_date)
+        for month, name, header, count in session.execute(_slot_hours_stmt(start_date, end_date)):
+            if month not in snapshot_months:
+                slot_hours[name, month] += parse_duration(header) * count
+
+    if pending:
+        start_date = date(*pending[0], 1)
+        end_date = date(*pending[-1], calendar.monthrange(*pending[-1])[1])
+        collect(db.session)
+        for archive in archives_in_range(start_date, end_date):
+            with archive_session(archive) as session:
+                collect(session)
+    for name, dates in duty_dates.items():
+        for log_date in dates:
+            days_per_month[name, log_date.year, log_date.month] += 1
+    for (year, month), snapshot in snapshots.items():
+        for name, (days, minutes) in month_recap(snapshot).items():
+            days_per_month[name, year, month] += days
+            slot_hours[name, f'{year:04d}-{month:02d}'] += timedelta(minutes=minutes)
+
+    rows = []
+    for person in reference_data()['personnel']:
+        cells, total_hours = [], timedelta(0)
+        for year, month in months:
+            hours = slot_hours.get((person.name, f'{year:04d}-{month:02d}'), timedelta(0))
+            total_hours += hours
+            cells.append({'days': days_per_month[person.name, year, month],
+                          'hours': round(hours.total_seconds() / 3600, 2)})
+        rows.append({
+            'name': person.name, 'months': cells,
+            'days': sum(cell['days'] for cell in cells), 'hours': round(total_hours.total_seconds() / 3600, 2),
+        })
+    return months, rows
+
+
+# --- LOGBOOK PERSONAL ---
+
+# Posisi yang dihitung sebagai jam Controller (CTR) dan Assistance/Supervisor (ASS) di logbook personal
+CTR_POSITIONS = ('Controller', 'CONTROLLER RADAR 123.4 Mhz', 'CONTROLLER RADAR 120.2 Mhz')
+ASS_POSITIONS = ('Supervisor', 'ASSISTANCE RADAR 123.4 Mhz', 'ASSISTANCE RADAR 120.2 Mhz')
+
+
+def _personal_slots_stmt(start_date, end_date, names=None):
+    """Setiap slot posisi terisi (nama + header jam) dalam rentang, urut logbook, posisi, lalu slot."""
+    slots = []
+    for i in TIME_SLOTS:
+        slot, header = getattr(ATCPosition, f'time_slot_{i}'), getattr(ATCPositionHeader, f'header_{i}')
+        stmt = (
+            sa.select(LogbookEntry.id.label('log_id'), ATCPosition.id.label('position_id'), sa.literal(i).label('slot'),
+                      LogbookEntry.log_date, LogbookEntry.shift, LogbookEntry.logbook_type,
+                      ATCPosition.position_name, slot.label('name'), header.label('header'))
+            .join(ATCPosition, ATCPosition.logbook_id == LogbookEntry.id)
+            .join(ATCPositionHeader, ATCPositionHeader.logbook_id == LogbookEntry.id)
+            .where(LogbookEntry.log_date >= start_date, LogbookEntry.log_date <= end_date,
+                   slot != '', header != '')
+        )
+        if names is not None:
+            stmt = stmt.where(slot.in_(names))
+        slots.append(stmt)
+    union = sa.union_all(*slots).subquery()
+    return sa.select(union).order_by(union.c.log_id, union.c.position_id, union.c.slot)
+
+
+def personal_logbooks(year, month, names=None):
+    """Logbook personal satu bulan untuk banyak personel sekaligus, dari satu pass atas slot posisi bulan itu.
+
+    Mengembalikan {nama: (duty per tanggal, ringkasan)} untuk setiap nama di names (default: semua personel);
+    bentuknya sama dengan personal_log_data dan personal_log_summary di tab personal dashboard.
+    """
+    if names is None:
+        names = [person.name for person in reference_data()['personnel']]
+    from .snapshot import fresh_snapshots, month_personal_records
+
+    start_date, end_date = date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+    records = defaultdict(list)
+
+    def collect(session):
+        for row in session.execute(_personal_slots_stmt(start_date, end_date, names)):
+            records[row.name].append({
+                'date': row.log_date, 'shift': row.shift, 'unit': row.logbook_type,
+                'position': row.position_name, 'duration': parse_duration(row.header),
+            })
+
+    if (snapshot := fresh_snapshots([(year, month)]).get((year, month))) is not None:
+        records.update(month_personal_records(snapshot, names))
+    else:
+        collect(db.session)
+        for archive in archives_in_range(start_date, end_date):
+            with archive_session(archive) as session:
+                collect(session)
+
+    logbooks = {}
+    for name in names:
+        grouped_duties = defaultdict(list)
+        total_ctr_duration, total_ass_duration = timedelta(0), timedelta(0)
+        for record in records.get(name, ()):
+            grouped_duties[record['date'].day].append(record)
+            if record['position'] in CTR_POSITIONS:
+                total_ctr_duration += record['duration']
+            elif record['position'] in ASS_POSITIONS:
+                total_ass_duration += record['duration']
+        logbooks[name] = (dict(sorted(grouped_duties.items())), {
+            'selected_personnel_name': name,
+            'total_ctr_hours': round(total_ctr_duration.total_seconds() / 3600, 2),
+            'total_ass_hours': round(total_ass_duration.total_seconds() / 3600, 2),
+            'grand_total_hours': round((total_ctr_duration + total_ass_duration).total_seconds() / 3600, 2),
+            'num_days': calendar.monthrange(year, month)[1],
+        })
+    return logbooks
@@ -0,0 +1,73 @@
+# app/reference.py
+
+import hashlib
+from collections import namedtuple
+
+from flask import current_app
+
+from .models import db, Facility, FacilityApp, CNSDFacility, ATCPersonnel
+
+# Tabel referensi yang isinya ikut dirender ke form (daftar fasilitas & personel)
+REFERENCE_MODELS = (Facility, FacilityApp, CNSDFacility, ATCPersonnel)
+
+# Salinan baca-saja data referensi: tuple biasa (bukan objek ORM) yang dibangun sekali per versi,
+# sehingga bisa dibangun di proses master gunicorn sebelum fork dan dibagi worker secara copy-on-write.
+FacilityRef = namedtuple('FacilityRef', 'id name remark category')
+CNSDFacilityRef = namedtuple('CNSDFacilityRef', 'id name sub_name category airport_code')
+PersonnelRef = namedtuple('PersonnelRef', 'id name')
+
+
+def compute_reference_version():
+    """Sidik jari isi tabel referensi; berubah setiap kali ada fasilitas/personel yang diubah."""
+    digest = hashlib.sha1()
+    for model in REFERENCE_MODELS:
+        columns = list(model.__table__.columns)
+        digest.update(model.__tablename__.encode())
+        for row in db.session.execute(db.select(*columns).order_by(model.id)):
+            digest.update(repr(tuple(row)).encode())
+    return digest.hexdigest()[:12]
+
+
+def build_reference_data():
+    """Fasilitas TWR/APP, fasilitas CNSD per bandara, dan personel ATC (urut nama) sebagai tuple baca-saja."""
+    def rows(*columns):
+        return db.session.execute(db.select(*columns).order_by(columns[0]))
+
+    cnsd_facilities = {}
+    for row in rows(CNSDFacility.id, CNSDFacility.name, CNSDFacility.sub_name, CNSDFacility.category,
+                    CNSDFacility.airport_code):
+        cnsd_facilities.setdefault(row.airport_code, []).append(CNSDFacilityRef(*row))
+    personnel = db.session.execute(db.select(ATCPersonnel.id, ATCPersonnel.name).order_by(ATCPersonnel.name))
+    return {
+        'facilities': {
+            'TWR': tuple(FacilityRef(*row) for row in rows(Facility.id, Facility.name, Facility.remark,
+                                                           Facility.category)),
+            'APP': tuple(FacilityRef(*row) for row in rows(FacilityApp.id, FacilityApp.name, FacilityApp.remark,
+                                                           FacilityApp.category)),
+        },
+        'cnsd_facilities': {code: tuple(facilities) for code, facilities in cnsd_facilities.items()},
+        'personnel': tuple(PersonnelRef(*row) for row in personnel),
+    }
+
+
+def refresh_reference_version(app=None):
+    """Menghitung ulang versi dan salinan data referensi, lalu mengosongkan cache fragmen template app."""
+    app = app or current_app
+    app.extensions['reference_version'] = compute_reference_version()
+    app.extensions['reference_data'] = build_reference_data()
+    app.extensions.setdefault('fragment_cache', {}).clear()
+    return app.extensions['reference_version']
+
+
+def reference_version():
+    """Versi data referensi untuk app aktif (dihitung saat boot, lihat create_app)."""
+    if 'reference_version' not in current_app.extensions:
+        return refresh_reference_version()
+    return current_app.extensions['reference_version']
+
+
+def reference_data():
+    """Salinan data referensi untuk app aktif (lihat build_reference_data)."""
+    if 'reference_data' not in current_app.extensions:
+        refresh_reference_version()
+    return current_app.extensions['reference_data']
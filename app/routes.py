@@ -1,32 +1,128 @@
 # app/routes.py
 
 import os
-import calendar
-from flask import render_template, request, redirect, url_for, flash, Blueprint, current_app, session
+from itertools import product
+import sqlalchemy as sa
+from flask import render_template, request, redirect, url_for, flash, Blueprint, current_app, session, abort, make_response
 from flask_login import login_required, current_user
-from .models import (db, User, LogbookEntry, Facility, FacilityApp, FacilityStatus, OperationalLog, ATCPosition, 
+from .models import (db, User, LogbookEntry, OperationalLog, ATCPosition, 
                      ATCPositionHeader, CNSDLogbook, CNSDPersonnel, 
-                     CNSDFacility, CNSDFacilityStatus, CNSDUraianKegiatan, ATCPersonnel, FacilityCondition)
-from datetime import datetime, timedelta
-from collections import OrderedDict, defaultdict
+                     CNSDUraianKegiatan, ATCPersonnel, FacilityCondition)
+from datetime import datetime
+from collections import OrderedDict
 from flask_weasyprint import HTML, render_pdf
 from werkzeug.utils import secure_filename
-import sqlalchemy as sa
+from sqlalchemy.orm import joinedload, selectinload
+from .instrumentation import measure
+from .archive import all_with_archive, get_with_archive
+from .reference import reference_data
+from .recap import personal_logbooks, personnel_recap, recap_range_from_args
+from .facilitystatus import OPERASI, CNSD, latest_facility_state, save_facility_statuses, status_key
+from .dutytime import refresh_duty_intervals
+from .coverage import month_coverage
 
 main_bp = Blueprint('main', __name__)
 
+# --- OPSI PEMUATAN RELASI PER ROUTE ---
+# Relasi model memakai lazy='raise', jadi setiap route memuat persis graf yang dirender template-nya
+# dalam jumlah round-trip yang tetap (tidak bergantung pada jumlah baris).
+LOAD_LOGBOOK_LIST = (selectinload(LogbookEntry.atc_on_duty_personnel),)
+LOAD_LOGBOOK_DUTY = (joinedload(LogbookEntry.atc_position_header), selectinload(LogbookEntry.atc_positions))
+LOAD_LOGBOOK_DETAIL = LOAD_LOGBOOK_LIST + LOAD_LOGBOOK_DUTY + (
+    selectinload(LogbookEntry.facility_status_history),
+    selectinload(LogbookEntry.operational_logs),
+)
+LOAD_CNSD_LIST = (selectinload(CNSDLogbook.user),)
+LOAD_CNSD_DETAIL = (
+    selectinload(CNSDLogbook.personnel),
+    selectinload(CNSDLogbook.facility_status_history),
+    selectinload(CNSDLogbook.uraian_kegiatan),
+)
+
+# --- STATEMENT QUERY YANG SERING DIPAKAI ---
+# Dibangun sekali saat modul dimuat dan nilainya dikirim lewat bindparam saat dieksekusi: cache key statement
+# sudah di-memo dan SQL-nya diambil dari compiled cache, tanpa menyusun Query baru di setiap request.
+
+def _history_statements(parent, group_column, options):
+    """{(ada start_date, ada end_date): select} untuk daftar riwayat satu tipe/bandara, tanggal terbaru dulu."""
+    statements = {}
+    for has_start, has_end in product((False, True), repeat=2):
+        stmt = sa.select(parent).where(group_column == sa.bindparam('group'))
+        if has_start:
+            stmt = stmt.where(parent.log_date >= sa.bindparam('start_date'))
+        if has_end:
+            stmt = stmt.where(parent.log_date <= sa.bindparam('end_date'))
+        statements[has_start, has_end] = stmt.options(*options).order_by(parent.log_date.desc())
+    return statements
+
+LOGBOOK_HISTORY_STMTS = _history_statements(LogbookEntry, LogbookEntry.logbook_type, LOAD_LOGBOOK_LIST)
+CNSD_HISTORY_STMTS = _history_statements(CNSDLogbook, CNSDLogbook.airport, LOAD_CNSD_LIST)
+SELECTED_PERSONNEL_STMT = sa.select(ATCPersonnel).where(ATCPersonnel.id.in_(sa.bindparam('ids', expanding=True)))
+NOTAM_STMT = sa.select(LogbookEntry.notam).where(LogbookEntry.id == sa.bindparam('log_id'))
+
 def allowed_file(filename):
     """Memeriksa apakah ekstensi file diizinkan."""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
 
+def get_logbook_entry_or_404(log_id, options=LOAD_LOGBOOK_DETAIL, include_archive=True):
+    """Mengambil logbook beserta relasi yang dibutuhkan; populate_existing juga memuat ulang setelah rollback.
+
+    Logbook yang sudah dipindahkan ke arsip hanya dicari jika include_archive (arsip bersifat baca-saja).
+    """
+    log_entry = get_with_archive(LogbookEntry, log_id, options, populate_existing=True) \
+        if include_archive else db.session.get(LogbookEntry, log_id, options=options, populate_existing=True)
+    if log_entry is None:
+        abort(404)
+    return log_entry
+
+def get_cnsd_log_or_404(log_id, options=LOAD_CNSD_DETAIL, include_archive=True):
+    log = get_with_archive(CNSDLogbook, log_id, options, populate_existing=True) \
+        if include_archive else db.session.get(CNSDLogbook, log_id, options=options, populate_existing=True)
+    if log is None:
+        abort(404)
+    return log
+
+def get_selected_personnel():
+    """Mengambil personel ATC yang dipilih di form dalam satu query."""
+    personnel_ids = request.form.getlist('atc_on_duty_personnel[]', type=int)
+    return db.session.scalars(SELECTED_PERSONNEL_STMT, {'ids': personnel_ids}).all() if personnel_ids else []
+
+def history_entries(statements, group, start_date=None, end_date=None):
+    """Daftar riwayat dari statement _history_statements; arsip hanya dibaca jika filter tanggal diisi."""
+    stmt = statements[start_date is not None, end_date is not None]
+    params = {'group': group, 'start_date': start_date, 'end_date': end_date}
+    params = {key: value for key, value in params.items() if value is not None}
+    if start_date or end_date:
+        log_entries = all_with_archive(stmt, params, start_date, end_date)
+        log_entries.sort(key=lambda log: log.log_date, reverse=True)
+        return log_entries
+    return db.session.scalars(stmt, params).all()
+
+def create_form_prefill(family, group):
+    """Isian awal form create dari logbook terakhir tipe/bandara yang sama (lihat facilitystatus.latest_log).
+
+    Mengembalikan tanggal & shift logbook asal dan fields {nama field form: nilai} untuk kondisi, catatan
+    fasilitas, dan NOTAM; None jika belum ada logbook.
+    """
+    log, state = latest_facility_state(db.session, family, group)
+    if log is None:
+        return None
+    fields = {}
+    for facility_id, (condition, *notes) in state.items():
+        fields[f'facility_{facility_id}_condition'] = getattr(condition, 'value', condition)
+        if notes and notes[0]:
+            fields[f'facility_{facility_id}_notes'] = notes[0]
+    if family is OPERASI and (notam := db.session.execute(NOTAM_STMT, {'log_id': log.id}).scalar()):
+        fields['notam'] = notam
+    return {'log_date': log.log_date, 'shift': log.shift, 'fields': fields}
+
 def get_ordered_facilities(logbook_type='TWR'):
     """Mengambil dan mengurutkan fasilitas berdasarkan tipe logbook."""
+    all_facilities = reference_data()['facilities']['APP' if logbook_type == 'APP' else 'TWR']
     if logbook_type == 'APP':
-        all_facilities = FacilityApp.query.all()
         category_order = ['COM. & NAV.', 'FACILITIES']
     else: # Default ke TWR
-        all_facilities = Facility.query.all()
         category_order = [
             'Internal Facilities - COM. & NAV.', 'Internal Support Facility',
             'External Support Facilities', 'Airfield Lighting Control System (ALS Cat.1)'
@@ -39,28 +135,9 @@ def get_ordered_facilities(logbook_type='TWR'):
     
     return grouped
 
-def parse_duration(time_str: str) -> timedelta:
-    """Menghitung durasi dari string format 'HH:MM-HH:MM'."""
-    if not time_str or '-' not in time_str:
-        return timedelta(0)
-    try:
-        start_str, end_str = time_str.split('-')
-        start_time = datetime.strptime(start_str.strip(), '%H:%M').time()
-        end_time = datetime.strptime(end_str.strip(), '%H:%M').time()
-        
-        start_dt = datetime.combine(datetime.today(), start_time)
-        end_dt = datetime.combine(datetime.today(), end_time)
-
-        if end_dt < start_dt:
-            end_dt += timedelta(days=1)
-            
-        return end_dt - start_dt
-    except (ValueError, IndexError):
-        return timedelta(0)
-
 def get_cnsd_facilities_ordered(airport_code):
     """Mengambil dan mengurutkan fasilitas CNSD berdasarkan bandara dan kategori."""
-    all_facilities = CNSDFacility.query.filter_by(airport_code=airport_code).all()
+    all_facilities = reference_data()['cnsd_facilities'].get(airport_code, ())
     
     # Tentukan urutan kategori yang diinginkan
     category_order = ['COMMUNICATION', 'NAVIGATION', 'SURVEILLANCE', 'DATA PROCESSING']
@@ -87,146 +164,123 @@ def index():
         return redirect(url_for('main.dashboard_teknik'))
     return "Unknown division", 403
 
+# --- DASHBOARD OPERASI: SATU FUNGSI KONTEKS PER TAB ---
+# Halaman penuh hanya menjalankan query tab yang aktif; tab lain dimuat belakangan lewat
+# dashboard_operasi_tab (fragmen HTML) saat dipilih.
+
+DASHBOARD_TABS = ('history', 'recap', 'personal', 'calendar')
+# Cache browser untuk fragmen recap/personal: periode yang sudah lewat jarang berubah
+FRAGMENT_MAX_AGE_CLOSED_PERIOD = 300
+FRAGMENT_MAX_AGE_OPEN_PERIOD = 60
+
+def history_tab_context(args, logbook_type):
+    start_date_str = args.get('start_date', '')
+    end_date_str = args.get('end_date', '')
+    start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date() if start_date_str else None
+    end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date() if end_date_str else None
+    log_entries = history_entries(LOGBOOK_HISTORY_STMTS, logbook_type, start_date, end_date)
+    return {'log_entries': log_entries, 'start_date': start_date_str, 'end_date': end_date_str}
+
+def recap_tab_context(args, current_time):
+    # Satu bulan (recap_month/recap_year) atau rentang bulan (sampai recap_end_month/recap_end_year)
+    recap_start, recap_end = recap_range_from_args(args, current_time)
+    recap_months, recap_data = personnel_recap(recap_start, recap_end)
+    return {
+        'recap_data': recap_data, 'recap_months': recap_months,
+        'recap_month': recap_start[1], 'recap_year': recap_start[0],
+        'recap_end_month': recap_end[1], 'recap_end_year': recap_end[0],
+        'period_end': recap_end,
+    }
+
+def personal_tab_context(args, current_time):
+    personal_log_data = {}
+    personal_log_summary = {}
+    all_atc_personnel = reference_data()['personnel']
+    
+    selected_personnel_id = args.get('personnel_id', type=int)
+    personal_month = args.get('personal_month', current_time.month, type=int)
+    personal_year = args.get('personal_year', current_time.year, type=int)
+
+    selected_personnel = next((p for p in all_atc_personnel if p.id == selected_personnel_id), None)
+    if selected_personnel:
+        personal_log_data, personal_log_summary = personal_logbooks(
+            personal_year, personal_month, [selected_personnel.name]
+        )[selected_personnel.name]
+
+    return {
+        'all_atc_personnel': all_atc_personnel,
+        'selected_personnel_id': selected_personnel_id,
+        'personal_month': personal_month,
+        'personal_year': personal_year,
+        'personal_log_data': personal_log_data,
+        'personal_log_summary': personal_log_summary,
+        'period_end': (personal_year, personal_month),
+    }
+
+def calendar_month_from_args(args, current_time):
+    year = args.get('calendar_year', current_time.year, type=int)
+    month = args.get('calendar_month', current_time.month, type=int)
+    return (year, month) if 1 <= month <= 12 else (year, current_time.month)
+
+def calendar_tab_context(args, current_time):
+    # Cakupan logbook TWR & APP per tanggal dan shift dalam satu bulan (tanpa memuat logbook)
+    year, month = calendar_month_from_args(args, current_time)
+    return {
+        'coverage': month_coverage(LogbookEntry, ('TWR', 'APP'), year, month, current_time.date()),
+        'calendar_month': month, 'calendar_year': year,
+        'period_end': (year, month),
+    }
+
+def dashboard_tab_context(tab, args, logbook_type):
+    current_time = datetime.now()
+    if tab == 'recap':
+        return recap_tab_context(args, current_time)
+    if tab == 'personal':
+        return personal_tab_context(args, current_time)
+    if tab == 'calendar':
+        return calendar_tab_context(args, current_time)
+    return history_tab_context(args, logbook_type)
+
 @main_bp.route('/dashboard/operasi')
 @login_required
 def dashboard_operasi():
     logbook_type = request.args.get('type', 'TWR')
     active_tab = request.args.get('tab', 'history')
-    
-    # --- LOGIKA UNTUK TAB LOGBOOK HISTORY ---
-    start_date_str = request.args.get('start_date', '')
-    end_date_str = request.args.get('end_date', '')
-    log_entries = []
-    if active_tab == 'history':
-        query = LogbookEntry.query.filter_by(logbook_type=logbook_type)
-        if start_date_str:
-            query = query.filter(LogbookEntry.log_date >= datetime.strptime(start_date_str, '%Y-%m-%d').date())
-        if end_date_str:
-            query = query.filter(LogbookEntry.log_date <= datetime.strptime(end_date_str, '%Y-%m-%d').date())
-        log_entries = query.order_by(LogbookEntry.log_date.desc()).all()
-
-    # --- LOGIKA UNTUK TAB PERSONNEL RECAP ---
-    recap_data = []
-    current_time = datetime.now()
-    recap_month_str = request.args.get('recap_month', str(current_time.month))
-    recap_year_str = request.args.get('recap_year', str(current_time.year))
-    if active_tab == 'recap':
-        recap_month = int(recap_month_str)
-        recap_year = int(recap_year_str)
-        logs_in_month = LogbookEntry.query.filter(
-            sa.extract('month', LogbookEntry.log_date) == recap_month,
-            sa.extract('year', LogbookEntry.log_date) == recap_year
-        ).all()
-        
-        personnel_days = defaultdict(set)
-        for log in logs_in_month:
-            for person in log.atc_on_duty_personnel:
-                personnel_days[person.name].add(log.log_date)
-
-        personnel_hours = defaultdict(timedelta)
-        log_ids_in_month = [log.id for log in logs_in_month]
-        positions_in_month = ATCPosition.query.filter(ATCPosition.logbook_id.in_(log_ids_in_month)).all()
-        
-        for pos in positions_in_month:
-            header = pos.logbook_entry.atc_position_header
-            if not header: continue
-            for i in range(1, 7):
-                person_name = getattr(pos, f'time_slot_{i}', None)
-                time_header = getattr(header, f'header_{i}', None)
-                if person_name and time_header:
-                    personnel_hours[person_name] += parse_duration(time_header)
-
-        all_personnel = ATCPersonnel.query.order_by(ATCPersonnel.name).all()
-        for person in all_personnel:
-            total_days = len(personnel_days.get(person.name, set()))
-            total_hours = personnel_hours.get(person.name, timedelta(0)).total_seconds() / 3600
-            recap_data.append({'name': person.name, 'days': total_days, 'hours': round(total_hours, 2)})
-
-    # --- LOGIKA UNTUK TAB PERSONAL ATC LOGBOOK ---
-    personal_log_data = {}
-    personal_log_summary = {}
-    all_atc_personnel = ATCPersonnel.query.order_by(ATCPersonnel.name).all()
-    
-    selected_personnel_id = request.args.get('personnel_id', type=int)
-    personal_month_str = request.args.get('personal_month', str(current_time.month))
-    personal_year_str = request.args.get('personal_year', str(current_time.year))
-
-    if active_tab == 'personal' and selected_personnel_id:
-        selected_personnel = ATCPersonnel.query.get(selected_personnel_id)
-        if selected_personnel:
-            personal_month = int(personal_month_str)
-            personal_year = int(personal_year_str)
-            
-            logs_in_month = LogbookEntry.query.filter(
-                sa.extract('month', LogbookEntry.log_date) == personal_month,
-                sa.extract('year', LogbookEntry.log_date) == personal_year
-            ).all()
-            
-            log_ids = [log.id for log in logs_in_month]
-            
-            duty_records = []
-            positions_in_month = ATCPosition.query.filter(ATCPosition.logbook_id.in_(log_ids)).all()
-
-            for pos in positions_in_month:
-                for i in range(1, 7):
-                    person_name_in_slot = getattr(pos, f'time_slot_{i}')
-                    if person_name_in_slot == selected_personnel.name:
-                        log_entry = pos.logbook_entry
-                        header = log_entry.atc_position_header
-                        duration_str = getattr(header, f'header_{i}') if header else None
-                        
-                        if duration_str:
-                            duty_records.append({
-                                'date': log_entry.log_date,
-                                'shift': log_entry.shift, # <-- Baris ini ditambahkan
-                                'unit': log_entry.logbook_type,
-                                'position': pos.position_name,
-                                'duration': parse_duration(duration_str)
-                            })
-            
-            grouped_duties = defaultdict(list)
-            for record in duty_records:
-                grouped_duties[record['date'].day].append(record)
-            
-            total_ctr_duration = timedelta(0)
-            total_ass_duration = timedelta(0)
-            ctr_positions = ['Controller', 'CONTROLLER RADAR 123.4 Mhz', 'CONTROLLER RADAR 120.2 Mhz']
-            ass_positions = ['Supervisor', 'ASSISTANCE RADAR 123.4 Mhz', 'ASSISTANCE RADAR 120.2 Mhz']
-
-            for record in duty_records:
-                if record['position'] in ctr_positions:
-                    total_ctr_duration += record['duration']
-                elif record['position'] in ass_positions:
-                    total_ass_duration += record['duration']
-            
-            personal_log_data = dict(sorted(grouped_duties.items()))
-            personal_log_summary = {
-                'selected_personnel_name': selected_personnel.name,
-                'total_ctr_hours': round(total_ctr_duration.total_seconds() / 3600, 2),
-                'total_ass_hours': round(total_ass_duration.total_seconds() / 3600, 2),
-                'grand_total_hours': round((total_ctr_duration + total_ass_duration).total_seconds() / 3600, 2),
-                'num_days': calendar.monthrange(personal_year, personal_month)[1]
-            }
+    if active_tab not in DASHBOARD_TABS:
+        active_tab = 'history'
 
     return render_template(
         'dashboard.html', 
-        log_entries=log_entries, 
         title=f"{'Approach Control Unit' if logbook_type == 'APP' else 'Aerodrome Control Tower'} Dashboard", 
-        start_date=start_date_str, 
-        end_date=end_date_str, 
         active_tab=active_tab, 
-        recap_data=recap_data, 
-        recap_month=int(recap_month_str), 
-        recap_year=int(recap_year_str), 
         logbook_type=logbook_type,
-        all_atc_personnel=all_atc_personnel,
-        selected_personnel_id=selected_personnel_id,
-        personal_month=int(personal_month_str),
-        personal_year=int(personal_year_str),
-        personal_log_data=personal_log_data,
-        personal_log_summary=personal_log_summary
+        **dashboard_tab_context(active_tab, request.args, logbook_type)
     )
 
+@main_bp.route('/dashboard/operasi/tab/<string:tab>')
+@login_required
+def dashboard_operasi_tab(tab):
+    """Fragmen HTML satu tab dashboard operasi (dipakai saat berpindah tab tanpa memuat ulang halaman)."""
+    if tab not in DASHBOARD_TABS:
+        abort(404)
+    logbook_type = request.args.get('type', 'TWR')
+    context = dashboard_tab_context(tab, request.args, logbook_type)
+    response = make_response(render_template(
+        f'dashboard_tab_{tab}.html', active_tab=tab, logbook_type=logbook_type, **context
+    ))
+
+    # Riwayat selalu divalidasi ulang (ETag weak: tetap valid setelah kompresi); recap/personal boleh
+    # dipakai ulang browser sebentar, lebih lama untuk periode yang sudah lewat
+    response.cache_control.private = True
+    if tab == 'history':
+        response.cache_control.no_cache = True
+    else:
+        today = datetime.now()
+        closed = context['period_end'] < (today.year, today.month)
+        response.cache_control.max_age = FRAGMENT_MAX_AGE_CLOSED_PERIOD if closed else FRAGMENT_MAX_AGE_OPEN_PERIOD
+    response.add_etag(weak=True)
+    return response.make_conditional(request)
+
 @main_bp.route('/log/new/<string:logbook_type>', methods=['GET', 'POST'])
 @login_required
 def create_log_entry(logbook_type):
@@ -235,10 +289,8 @@ def create_log_entry(logbook_type):
 
     if request.method == 'POST':
         try:
-            new_log = LogbookEntry(logbook_type=logbook_type, log_date=datetime.strptime(request.form['log_date'], '%Y-%m-%d').date(), shift=request.form['shift'], notam=request.form.get('notam'), user_id=current_user.id)
-            for p_id in request.form.getlist('atc_on_duty_personnel[]'):
-                if p_id and (personnel := ATCPersonnel.query.get(p_id)):
-                    new_log.atc_on_duty_personnel.append(personnel)
+            new_log = LogbookEntry(logbook_type=logbook_type, log_date=datetime.strptime(request.form['log_date'], '%Y-%m-%d').date(), shift=request.form['shift'].strip(), notam=request.form.get('notam'), user_id=current_user.id)
+            new_log.atc_on_duty_personnel = get_selected_personnel()
             db.session.add(new_log)
             db.session.flush()
 
@@ -259,10 +311,13 @@ def create_log_entry(logbook_type):
                     setattr(pos_entry, f'time_slot_{i}', request.form.get(f'position_{pos_key}_{i}'))
                 db.session.add(pos_entry)
             
-            FacilityModel = FacilityApp if logbook_type == 'APP' else Facility
-            for facility in FacilityModel.query.all():
-                if condition_val := request.form.get(f'facility_{facility.id}_condition'):
-                    db.session.add(FacilityStatus(logbook_entry=new_log, facility_id=facility.id, facility_type=logbook_type, condition=condition_val, notes=request.form.get(f'facility_{facility.id}_notes')))
+            facilities = reference_data()['facilities'][logbook_type]
+            save_facility_statuses(
+                new_log,
+                {facility.id: request.form.get(f'facility_{facility.id}_condition') for facility in facilities},
+                {facility.id: request.form.get(f'facility_{facility.id}_notes') for facility in facilities},
+            )
+            refresh_duty_intervals(db.session, [new_log.id])
 
             for key in [k for k in request.form.keys() if k.startswith('op_log_time_')]:
                 index = key.replace('op_log_time_', '')
@@ -288,32 +343,34 @@ def create_log_entry(logbook_type):
     return render_template(
         template_name, 
         grouped_facilities=get_ordered_facilities(logbook_type), 
-        atc_personnel_list=ATCPersonnel.query.order_by(ATCPersonnel.name).all(), 
+        atc_personnel_list=reference_data()['personnel'], 
         title=title, 
         logbook_type=logbook_type,
-        FacilityCondition=FacilityCondition
+        FacilityCondition=FacilityCondition,
+        prefill=create_form_prefill(OPERASI, logbook_type)
     )
 
 @main_bp.route('/log/edit/<int:log_id>', methods=['GET', 'POST'])
 @login_required
 def edit_log(log_id):
-    log_entry = LogbookEntry.query.get_or_404(log_id)
+    log_entry = get_logbook_entry_or_404(log_id, include_archive=False)
     logbook_type = log_entry.logbook_type
     
-    if current_user.id != log_entry.creator.id:
+    if current_user.id != log_entry.user_id:
         flash('You are not authorized to edit this log entry.', 'danger')
         return redirect(url_for('main.dashboard_operasi', type=logbook_type))
         
     if request.method == 'POST':
         try:
+            previous_key = status_key(log_entry)
+            # Fasilitas yang tidak dikirim form tetap memakai kondisi lamanya
+            conditions = {status.facility_id: status.condition for status in log_entry.facility_statuses}
+            notes = {status.facility_id: status.notes for status in log_entry.facility_statuses}
             log_entry.log_date = datetime.strptime(request.form['log_date'], '%Y-%m-%d').date()
-            log_entry.shift = request.form['shift']
+            log_entry.shift = request.form['shift'].strip()
             log_entry.notam = request.form.get('notam')
             
-            log_entry.atc_on_duty_personnel.clear()
-            for p_id in request.form.getlist('atc_on_duty_personnel[]'):
-                if p_id and (personnel := ATCPersonnel.query.get(p_id)):
-                    log_entry.atc_on_duty_personnel.append(personnel)
+            log_entry.atc_on_duty_personnel = get_selected_personnel()
             
             header = log_entry.atc_position_header or ATCPositionHeader(logbook_entry=log_entry)
             for i in range(1, 7): setattr(header, f'header_{i}', request.form.get(f'time_header_{i}'))
@@ -330,16 +387,12 @@ def edit_log(log_id):
                 for i in range(1, 7): setattr(pos_entry, f'time_slot_{i}', request.form.get(f'position_{pos_key}_{i}'))
                 db.session.add(pos_entry)
 
-            statuses_map = {(status.facility_id, status.facility_type): status for status in log_entry.facility_statuses}
-            FacilityModel = FacilityApp if logbook_type == 'APP' else Facility
-            for facility in FacilityModel.query.all():
+            for facility in reference_data()['facilities'][logbook_type]:
                 if condition_val := request.form.get(f'facility_{facility.id}_condition'):
-                    status_key = (facility.id, logbook_type)
-                    if status := statuses_map.get(status_key):
-                        status.condition = condition_val
-                        status.notes = request.form.get(f'facility_{facility.id}_notes')
-                    else:
-                        db.session.add(FacilityStatus(logbook_id=log_id, facility_id=facility.id, facility_type=logbook_type, condition=condition_val, notes=request.form.get(f'facility_{facility.id}_notes')))
+                    conditions[facility.id] = condition_val
+                    notes[facility.id] = request.form.get(f'facility_{facility.id}_notes')
+            save_facility_statuses(log_entry, conditions, notes, previous_key)
+            refresh_duty_intervals(db.session, [log_id])
 
             OperationalLog.query.filter_by(logbook_id=log_id).delete()
             for key in [k for k in request.form.keys() if k.startswith('op_log_time_')]:
@@ -362,6 +415,7 @@ def edit_log(log_id):
         except Exception as e:
             db.session.rollback()
             flash(f'An error occurred during update: {e}', 'danger')
+            log_entry = get_logbook_entry_or_404(log_id, include_archive=False)
 
     template_name = 'edit_log_app.html' if logbook_type == 'APP' else 'edit_log.html'
     title = "Edit Approach Control Unit Log" if logbook_type == 'APP' else "Edit Aerodrome Control Tower Log"
@@ -372,14 +426,14 @@ def edit_log(log_id):
         grouped_facilities=get_ordered_facilities(logbook_type),
         atc_positions={pos.position_name: pos for pos in log_entry.atc_positions},
         FacilityCondition=FacilityCondition,
-        atc_personnel_list=ATCPersonnel.query.order_by(ATCPersonnel.name).all(),
+        atc_personnel_list=reference_data()['personnel'],
         title=title
     )
 
 @main_bp.route('/log/view/<int:log_id>')
 @login_required
 def view_log(log_id):
-    log_entry = LogbookEntry.query.get_or_404(log_id)
+    log_entry = get_logbook_entry_or_404(log_id)
     logbook_type = log_entry.logbook_type
     
     template_name = 'view_log_app.html' if logbook_type == 'APP' else 'view_log.html'
@@ -397,7 +451,7 @@ def view_log(log_id):
 @main_bp.route('/log/download/<int:log_id>')
 @login_required
 def download_log_pdf(log_id):
-    log_entry = LogbookEntry.query.get_or_404(log_id)
+    log_entry = get_logbook_entry_or_404(log_id)
     logbook_type = log_entry.logbook_type
 
     logo_path = os.path.join(current_app.static_folder, 'img', 'airnav.png')
@@ -419,7 +473,8 @@ def download_log_pdf(log_id):
         logo_path=logo_path,
         signature_paths=signature_paths
     )
-    return render_pdf(HTML(string=html))
+    with measure('pdf'):
+        return render_pdf(HTML(string=html))
 
 # --- RUTE TEKNIK (Tidak ada perubahan signifikan) ---
 
@@ -455,14 +510,9 @@ def cnsd_dashboard(airport_code):
     start_date_str = request.args.get('start_date')
     end_date_str = request.args.get('end_date')
     
-    query = CNSDLogbook.query.filter_by(airport=airport_code)
-    
-    if start_date_str:
-        query = query.filter(CNSDLogbook.log_date >= datetime.strptime(start_date_str, '%Y-%m-%d').date())
-    if end_date_str:
-        query = query.filter(CNSDLogbook.log_date <= datetime.strptime(end_date_str, '%Y-%m-%d').date())
-
-    log_entries = query.order_by(CNSDLogbook.log_date.desc()).all()
+    start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date() if start_date_str else None
+    end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date() if end_date_str else None
+    log_entries = history_entries(CNSD_HISTORY_STMTS, airport_code, start_date, end_date)
     
     return render_template(
         'cnsd_dashboard.html', 
@@ -473,6 +523,22 @@ def cnsd_dashboard(airport_code):
         end_date=end_date_str
     )
 
+@main_bp.route('/cnsd/calendar/<string:airport_code>')
+@login_required
+def cnsd_calendar(airport_code):
+    """Kalender cakupan logbook CNSD satu bandara per tanggal dan shift (?calendar_month=&calendar_year=)."""
+    if session.get('unlocked_airport') != airport_code:
+        flash('Akses ditolak. Silakan masukkan kata sandi yang benar.', 'warning')
+        return redirect(url_for('main.dashboard_teknik'))
+    current_time = datetime.now()
+    year, month = calendar_month_from_args(request.args, current_time)
+    return render_template(
+        'cnsd_calendar.html',
+        coverage=month_coverage(CNSDLogbook, (airport_code,), year, month, current_time.date()),
+        airport_code=airport_code, calendar_month=month, calendar_year=year,
+        title=f"Kalender Logbook CNSD - {airport_code}"
+    )
+
 @main_bp.route('/cnsd/log/new/<string:airport_code>', methods=['GET', 'POST'])
 @login_required
 def create_cnsd_log(airport_code):
@@ -484,7 +550,7 @@ def create_cnsd_log(airport_code):
             new_log = CNSDLogbook(
                 airport=airport_code,
                 log_date=datetime.strptime(request.form['log_date'], '%Y-%m-%d').date(),
-                shift=request.form['shift'],
+                shift=request.form['shift'].strip(),
                 user_id=current_user.id
             )
             db.session.add(new_log)
@@ -509,12 +575,8 @@ def create_cnsd_log(airport_code):
                         personnel.signature_path = sig_filename
                     db.session.add(personnel)
 
-            facilities = CNSDFacility.query.filter_by(airport_code=airport_code).all()
-            for facility in facilities:
-                condition = request.form.get(f'facility_{facility.id}_condition')
-                if condition:
-                    status = CNSDFacilityStatus(cnsd_logbook_id=new_log.id, cnsd_facility_id=facility.id, condition=condition)
-                    db.session.add(status)
+            facilities = reference_data()['cnsd_facilities'].get(airport_code, ())
+            save_facility_statuses(new_log, {facility.id: request.form.get(f'facility_{facility.id}_condition') for facility in facilities})
 
             event_times = request.form.getlist('event_time[]')
             descriptions = request.form.getlist('description[]')
@@ -532,12 +594,13 @@ def create_cnsd_log(airport_code):
             return redirect(url_for('main.create_cnsd_log', airport_code=airport_code))
 
     grouped_facilities = get_cnsd_facilities_ordered(airport_code)
-    return render_template('create_cnsd_log.html', grouped_facilities=grouped_facilities, airport_code=airport_code, title=f"Buat Logbook CNSD - {airport_code}")
+    return render_template('create_cnsd_log.html', grouped_facilities=grouped_facilities, airport_code=airport_code, title=f"Buat Logbook CNSD - {airport_code}",
+                           prefill=create_form_prefill(CNSD, airport_code))
 
 @main_bp.route('/cnsd/log/view/<int:log_id>')
 @login_required
 def view_cnsd_log(log_id):
-    log = CNSDLogbook.query.get_or_404(log_id)
+    log = get_cnsd_log_or_404(log_id)
     if session.get('unlocked_airport') != log.airport:
         return redirect(url_for('main.dashboard_teknik'))
     
@@ -547,14 +610,19 @@ def view_cnsd_log(log_id):
 @main_bp.route('/cnsd/log/edit/<int:log_id>', methods=['GET', 'POST'])
 @login_required
 def edit_cnsd_log(log_id):
-    log = CNSDLogbook.query.get_or_404(log_id)
+    # POST hanya mengubah kolom skalar lalu redirect, jadi relasi cukup dimuat untuk GET
+    log = get_cnsd_log_or_404(log_id, LOAD_CNSD_DETAIL if request.method == 'GET' else (), include_archive=False)
     if session.get('unlocked_airport') != log.airport:
         return redirect(url_for('main.dashboard_teknik'))
         
     if request.method == 'POST':
         try:
+            previous_key = status_key(log)
             log.log_date = datetime.strptime(request.form['log_date'], '%Y-%m-%d').date()
-            log.shift = request.form['shift']
+            log.shift = request.form['shift'].strip()
+            if status_key(log) != previous_key:
+                # Posisi logbook dalam urutan berubah: kondisi fasilitasnya ditulis ulang di posisi baru
+                save_facility_statuses(log, previous_key=previous_key)
             db.session.commit()
             flash('Logbook CNSD berhasil diperbarui!', 'success')
             return redirect(url_for('main.cnsd_dashboard', airport_code=log.airport))
@@ -569,7 +637,7 @@ def edit_cnsd_log(log_id):
 @main_bp.route('/cnsd/log/download/<int:log_id>')
 @login_required
 def download_cnsd_log_pdf(log_id):
-    log = CNSDLogbook.query.get_or_404(log_id)
+    log = get_cnsd_log_or_404(log_id)
     if session.get('unlocked_airport') != log.airport:
         return redirect(url_for('main.dashboard_teknik'))
         
@@ -598,4 +666,5 @@ def download_cnsd_log_pdf(log_id):
         grouped_facilities=grouped_facilities,
         airport_full_name=airport_full_names.get(log.airport, log.airport)
     )
-    return render_pdf(HTML(string=html))
+    with measure('pdf'):
+        return render_pdf(HTML(string=html))
@@ -0,0 +1,172 @@
+# app/sharding.py
+
+import os
+
+import click
+import sqlalchemy as sa
+from flask import current_app
+from flask.cli import with_appcontext
+
+from .models import db, CNSDLogbook
+from .shardrouting import SHARDED_TABLES, shard_engines, current_cnsd_airport, use_cnsd_shard
+
+# Tabel anak logbook CNSD (tabel, kolom FK ke cnsd_logbook)
+SHARDED_CHILDREN = [
+    ('cnsd_personnel', 'cnsd_logbook_id'), ('cnsd_facility_status', 'cnsd_logbook_id'),
+    ('cnsd_uraian_kegiatan', 'cnsd_logbook_id'),
+]
+# Setiap shard memakai rentang id sendiri: AUTOINCREMENT dimulai dari (urutan bandara + 1) * SHARD_ID_STRIDE,
+# jadi id tetap unik lintas bandara (identity map, arsip per tahun, URL /cnsd/log/view/<id>).
+# Bandara baru harus ditambahkan di akhir AIRPORT_PASSWORDS agar urutannya tidak bergeser.
+SHARD_ID_STRIDE = 1_000_000_000
+# Tabel pencatat yang juga dibuat di setiap shard: barisnya ditulis (dengan bind eksplisit, lihat cnsd_bind)
+# ke database yang sama dengan logbook CNSD yang dicatatnya, jadi ikut di-commit dalam transaksi yang sama
+SHARD_LOCAL_TABLES = ('import_checkpoint', 'sync_submission')
+
+
+def sharding_enabled():
+    return bool(shard_engines())
+
+
+def shard_airports():
+    return list(shard_engines())
+
+
+def cnsd_bind(airport_code):
+    """Engine tempat logbook CNSD bandara ini disimpan: shard-nya, atau database hot jika sharding mati."""
+    return shard_engines().get(airport_code, db.engine)
+
+
+def shard_path(airport_code):
+    return os.path.join(current_app.config['CNSD_SHARD_FOLDER'], f'cnsd_{airport_code}.db')
+
+
+# --- PEMBUATAN SHARD ---
+
+def _create_shard_engine(path, hot_path):
+    engine = sa.create_engine('sqlite:///' + path)
+    if hot_path:
+        @sa.event.listens_for(engine, 'connect')
+        def attach_hot_database(dbapi_connection, connection_record):
+            # Tabel non-shard (user, cnsd_facility) tetap bisa di-JOIN dengan nama tanpa skema
+            dbapi_connection.execute('ATTACH DATABASE ? AS hot', (hot_path,))
+    return engine
+
+
+def _seed_id_range(conn, index):
+    floor = (index + 1) * SHARD_ID_STRIDE
+    for table in SHARDED_TABLES:
+        conn.exec_driver_sql(
+            'INSERT INTO sqlite_sequence (name, seq) SELECT ?, ? '
+            'WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)', (table, floor, table)
+        )
+
+
+def init_sharding(app):
+    """Membuka (dan membuat bila belum ada) satu database CNSD per bandara; dipanggil di dalam app context."""
+    if not app.config.get('CNSD_SHARDING_ENABLED'):
+        return
+    os.makedirs(app.config['CNSD_SHARD_FOLDER'], exist_ok=True)
+    hot_path = db.engine.url.database
+    tables = [db.metadata.tables[name] for name in [*sorted(SHARDED_TABLES), *SHARD_LOCAL_TABLES]]
+    shards = {}
+    for index, airport_code in enumerate(app.config['AIRPORT_PASSWORDS']):
+        engine = _create_shard_engine(shard_path(airport_code), hot_path)
+        db.metadata.create_all(engine, tables=tables)
+        with engine.begin() as conn:
+            _seed_id_range(conn, index)
+        shards[airport_code] = engine
+    app.extensions['cnsd_shards'] = shards
+
+    with db.engine.connect() as conn:
+        if conn.execute(sa.select(CNSDLogbook.id).limit(1)).first() is not None:
+            print("Peringatan: masih ada logbook CNSD di database hot; jalankan 'flask shard-cnsd-logbooks'.")
+
+
+def next_shard_id(model):
+    """Batas bawah id berikutnya di shard aktif (dari sqlite_sequence); 1 jika tidak sedang di shard."""
+    if current_cnsd_airport() not in shard_engines():
+        return 1
+    seq = db.session.execute(
+        sa.text('SELECT seq FROM main.sqlite_sequence WHERE name = :name'), {'name': model.__tablename__},
+        bind_arguments={'mapper': sa.inspect(model)},
+    ).scalar()
+    return (seq or 0) + 1
+
+
+# --- PEMBACA LINTAS BANDARA ---
+
+def fan_out_all(query):
+    """query.all() di setiap shard bandara lalu digabung; tanpa sharding cukup satu query ke database hot."""
+    if not sharding_enabled():
+        return query.all()
+    rows = []
+    for airport_code in shard_airports():
+        with use_cnsd_shard(airport_code):
+            rows.extend(query.all())
+    return rows
+
+
+def get_from_shards(model, ident, options=(), populate_existing=False):
+    """Session.get(model, ident) tanpa bandara aktif: shard ditebak dari rentang id, lalu semua shard (id lama hasil migrasi)."""
+    if not sharding_enabled():
+        return db.session.get(model, ident, options=options, populate_existing=populate_existing)
+    airports = shard_airports()
+    index = ident // SHARD_ID_STRIDE - 1
+    candidates = [airports[index]] if 0 <= index < len(airports) else airports
+    for airport_code in candidates:
+        with use_cnsd_shard(airport_code):
+            obj = db.session.get(model, ident, options=options, populate_existing=populate_existing)
+            if obj is not None:
+                return obj
+    return None
+
+
+# --- MIGRASI DARI DATABASE HOT ---
+
+def _column_list(table_name):
+    return ', '.join(f'"{c.name}"' for c in db.metadata.tables[table_name].columns)
+
+
+def migrate_to_shards(dry_run=False, echo=print):
+    """Memindahkan logbook CNSD dari database hot ke shard bandaranya (id dipertahankan); satu transaksi per bandara."""
+    moved = {}
+    for airport_code in shard_airports():
+        with db.engine.connect() as conn:
+            # ATTACH harus di luar transaksi SQLite
+            conn.exec_driver_sql('ATTACH DATABASE ? AS shard', (shard_path(airport_code),))
+            try:
+                count = conn.exec_driver_sql(
+                    'SELECT count(*) FROM main.cnsd_logbook WHERE airport = ?', (airport_code,)
+                ).scalar()
+                if count and not dry_run:
+                    parent_ids = 'SELECT id FROM main.cnsd_logbook WHERE airport = ?'
+                    conn.exec_driver_sql(f'INSERT INTO shard.cnsd_logbook ({_column_list("cnsd_logbook")}) '
+                                         f'SELECT {_column_list("cnsd_logbook")} FROM main.cnsd_logbook '
+                                         f'WHERE airport = ?', (airport_code,))
+                    for child, fk in SHARDED_CHILDREN:
+                        conn.exec_driver_sql(f'INSERT INTO shard."{child}" ({_column_list(child)}) '
+                                             f'SELECT {_column_list(child)} FROM main."{child}" '
+                                             f'WHERE "{fk}" IN ({parent_ids})', (airport_code,))
+                    for child, fk in SHARDED_CHILDREN:
+                        conn.exec_driver_sql(f'DELETE FROM main."{child}" WHERE "{fk}" IN ({parent_ids})',
+                                             (airport_code,))
+                    conn.exec_driver_sql('DELETE FROM main.cnsd_logbook WHERE airport = ?', (airport_code,))
+                    conn.commit()
+            finally:
+                conn.rollback()
+                conn.exec_driver_sql('DETACH DATABASE shard')
+        moved[airport_code] = count
+        echo(f"{'[dry-run] ' if dry_run else ''}{airport_code}: {count} logbook CNSD -> {shard_path(airport_code)}")
+    return moved
+
+
+@click.command('shard-cnsd-logbooks')
+@click.option('--dry-run', is_flag=True, help='Hanya tampilkan jumlah logbook per bandara.')
+@with_appcontext
+def shard_cnsd_logbooks_command(dry_run):
+    """Memindahkan logbook CNSD yang masih di database hot ke database shard per bandara."""
+    if not sharding_enabled():
+        raise click.ClickException('Sharding CNSD tidak aktif (set CNSD_SHARDING_ENABLED=1).')
+    moved = migrate_to_shards(dry_run=dry_run, echo=click.echo)
+    click.echo(f"Selesai: {sum(moved.values())} logbook CNSD {'akan ' if dry_run else ''}dipindahkan.")
@@ -0,0 +1,64 @@
+# app/shardrouting.py
+
+from contextlib import contextmanager
+
+import sqlalchemy as sa
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.util import find_tables
+
+# Tabel logbook CNSD yang disimpan di database shard per bandara (lihat app/sharding.py);
+# tabel lain (user, cnsd_facility, ...) tetap di database hot.
+SHARDED_TABLES = frozenset({'cnsd_logbook', 'cnsd_personnel', 'cnsd_facility_status', 'cnsd_uraian_kegiatan'})
+
+
+class RoutingSession(Session):
+    """Session Flask-SQLAlchemy yang mengarahkan query/flush tabel CNSD ke shard bandara yang sedang aktif.
+
+    Tanpa shard (sharding mati) atau tanpa bandara aktif, semuanya tetap ke database hot.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and (engine := _shard_bind(mapper, clause)) is not None:
+            return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def shard_engines():
+    """Engine shard per kode bandara (urut AIRPORT_PASSWORDS); kosong jika sharding mati."""
+    return current_app.extensions.get('cnsd_shards', {})
+
+
+def current_cnsd_airport():
+    """Bandara tujuan routing: dari use_cnsd_shard(), atau bandara yang dibuka di sesi request."""
+    if (airport_code := g.get('cnsd_shard_airport')) is not None:
+        return airport_code
+    if has_request_context():
+        return session.get('unlocked_airport')
+    return None
+
+
+@contextmanager
+def use_cnsd_shard(airport_code):
+    """Mengarahkan query CNSD ke shard bandara tertentu (CLI, API key, pembaca lintas bandara)."""
+    previous = g.get('cnsd_shard_airport')
+    g.cnsd_shard_airport = airport_code
+    try:
+        yield
+    finally:
+        g.cnsd_shard_airport = previous
+
+
+def _touches_sharded_table(mapper, clause):
+    if mapper is not None and sa.inspect(mapper).local_table.name in SHARDED_TABLES:
+        return True
+    if clause is not None:
+        return any(getattr(table, 'name', None) in SHARDED_TABLES for table in find_tables(clause, include_crud=True))
+    return False
+
+
+def _shard_bind(mapper, clause):
+    shards = shard_engines()
+    if not shards or not _touches_sharded_table(mapper, clause):
+        return None
+    return shards.get(current_cnsd_airport())
@@ -0,0 +1,461 @@
+# app/snapshot.py
+
+import calendar
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+
+import click
+import sqlalchemy as sa
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .models import db, LogbookEntry, CNSDLogbook, FacilityStatus, CNSDFacilityStatus, ATCPersonnel, ReportMonth, \
+    atc_duty_association, shift_rank
+from .archive import archives_in_range, archive_session
+from .facilitystatus import OPERASI, CNSD
+from .live import CHILD_MODELS
+from .recap import _personal_slots_stmt, parse_duration
+from .sharding import shard_airports, sharding_enabled
+from .shardrouting import RoutingSession, use_cnsd_shard
+
+# numpy opsional: dengan numpy agregasi berjalan tervektorisasi di atas kolom mmap; tanpa numpy kolom dibaca
+# sebagai memoryview dan diagregasi dengan loop Python (hasilnya sama)
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# --- FORMAT FILE ---
+# Satu file per bulan (YYYY-MM.snap): MAGIC, panjang header (uint64 LE), header JSON (kamus nilai, versi data,
+# letak kolom), lalu data kolom little-endian yang masing-masing disejajarkan 8 byte agar bisa di-mmap langsung.
+
+MAGIC = b'LBSNAP\x00\x01'
+SNAPSHOT_FORMAT = 1
+ALIGNMENT = 8
+NUMPY_TYPES = {'B': 'u1', 'H': '<u2', 'i': '<i4'}
+
+# Tabel snapshot -> {kolom: typecode array}; kolom 'log' menunjuk baris tabel logs
+SCHEMA = {
+    # Setiap logbook operasi & CNSD bulan itu; kind menunjuk kamus kinds ((operasi, TWR/APP) atau (cnsd, bandara))
+    'logs': {'kind': 'B', 'day': 'B', 'shift': 'B'},
+    # Setiap slot posisi terisi: nama personel, posisi, dan durasi header jamnya dalam menit
+    'duty': {'log': 'i', 'person': 'H', 'position': 'H', 'minutes': 'i'},
+    # ATC on duty setiap logbook operasi
+    'on_duty': {'log': 'i', 'person': 'H'},
+    # Kondisi lengkap (hasil carry-forward) setiap fasilitas pada setiap logbook; condition = kode ConditionCode
+    'conditions': {'log': 'i', 'facility': 'i', 'condition': 'B'},
+}
+FAMILY_STATUS = {'operasi': FacilityStatus, 'cnsd': CNSDFacilityStatus}
+# Kondisi yang dihitung sebagai fasilitas tidak tersedia di laporan ketersediaan
+UNAVAILABLE = (OPERASI.unavailable, CNSD.unavailable)
+
+
+def month_key(year, month):
+    return f'{year:04d}-{month:02d}'
+
+
+def snapshot_path(year, month):
+    return os.path.join(current_app.config['REPORT_SNAPSHOT_FOLDER'], f'{month_key(year, month)}.snap')
+
+
+def condition_values(family):
+    """Nilai kondisi menurut kode (kode 1 = indeks 0) untuk keluarga 'operasi' atau 'cnsd'."""
+    return FAMILY_STATUS[family].__table__.c.condition.type.values
+
+
+# --- VERSI DATA PER BULAN ---
+# Setiap commit yang mengubah logbook menaikkan versi bulan logbook itu (termasuk bulan lama jika tanggalnya
+# dipindah); snapshot menyimpan versi saat dibangun dan hanya dipakai selama versinya masih sama.
+
+def mark_report_months(session, dates):
+    """Menandai bulan dari tanggal-tanggal ini berubah; versinya naik saat session di-commit."""
+    months = session.info.setdefault('report_months', set())
+    months.update(month_key(value.year, value.month) for value in dates if value is not None)
+
+
+def _collect_months(session, flush_context):
+    dates = []
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        model = type(obj)
+        if model in CHILD_MODELS:
+            parent, fk = CHILD_MODELS[model]
+            if (parent_id := getattr(obj, fk)) is None or (obj := session.get(parent, parent_id)) is None:
+                continue
+        elif model not in (LogbookEntry, CNSDLogbook):
+            continue
+        # Tanggal lama ikut ditandai: logbook yang dipindah mengubah dua bulan
+        dates.extend(sa.inspect(obj).attrs.log_date.history.sum())
+    if dates:
+        mark_report_months(session, dates)
+
+
+def _bump_months(session):
+    session.flush()
+    months = session.info.pop('report_months', None)
+    if not months:
+        return
+    stmt = sqlite_insert(ReportMonth).values([{'month': month, 'version': 1} for month in sorted(months)])
+    session.execute(stmt.on_conflict_do_update(index_elements=['month'], set_={'version': ReportMonth.version + 1}))
+
+
+def _discard_months(session, previous_transaction=None):
+    session.info.pop('report_months', None)
+
+
+def month_versions(months):
+    """{'YYYY-MM': versi} untuk daftar (tahun, bulan); bulan yang belum pernah berubah berversi 0."""
+    keys = [month_key(*month) for month in months]
+    versions = dict(db.session.execute(sa.select(ReportMonth.month, ReportMonth.version)
+                                       .where(ReportMonth.month.in_(keys))).all())
+    return {key: versions.get(key, 0) for key in keys}
+
+
+# --- DATA KOLUMNAR SATU BULAN ---
+
+class MonthData:
+    """Kolom-kolom satu bulan di memori (hasil pass database), dengan antarmuka yang sama seperti MonthSnapshot."""
+
+    def __init__(self, year, month, dictionaries, columns, version=None):
+        self.year, self.month, self.version = year, month, version
+        self.dictionaries = dictionaries
+        self.columns = columns
+
+    def dictionary(self, name):
+        return self.dictionaries[name]
+
+    def column(self, table, name):
+        values = self.columns[table, name]
+        if np is not None:
+            return np.frombuffer(values, dtype=NUMPY_TYPES[values.typecode]) if len(values) else \
+                np.empty(0, dtype=NUMPY_TYPES[values.typecode])
+        return values
+
+
+class MonthSnapshot:
+    """Snapshot satu bulan yang di-mmap baca-saja; kolom dibaca tanpa salinan (numpy array atau memoryview)."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Bukan file snapshot laporan: {path}")
+        (size,) = struct.unpack_from('<Q', self._map, len(MAGIC))
+        header_end = len(MAGIC) + 8 + size
+        self.meta = json.loads(self._map[len(MAGIC) + 8:header_end])
+        self._base = -header_end % ALIGNMENT + header_end
+        self.year, self.month, self.version = self.meta['year'], self.meta['month'], self.meta['version']
+
+    def dictionary(self, name):
+        return self.meta['dictionaries'][name]
+
+    def column(self, table, name):
+        offset, length, typecode = self.meta['columns'][f'{table}.{name}']
+        start = self._base + offset
+        if np is not None:
+            return np.frombuffer(self._map, dtype=NUMPY_TYPES[typecode], count=length, offset=start) if length else \
+                np.empty(0, dtype=NUMPY_TYPES[typecode])
+        return memoryview(self._map)[start:start + length * array(typecode).itemsize].cast(typecode)
+
+
+def _source_sessions(start_date, end_date):
+    """Session database hot lalu setiap arsip yang dijangkau rentang tanggal."""
+    yield db.session
+    for archive in archives_in_range(start_date, end_date):
+        with archive_session(archive) as session:
+            yield session
+
+
+def _cnsd_sources(session):
+    """Shard bandara yang dibaca untuk logbook CNSD: semua shard di database hot bersharding, selain itu satu."""
+    return shard_airports() if session is db.session and sharding_enabled() else [None]
+
+
+def collect_month(year, month):
+    """Membaca satu bulan dari database hot, shard CNSD, dan arsip menjadi kolom-kolom MonthData."""
+    start_date = date(year, month, 1)
+    end_date = date(year, month, calendar.monthrange(year, month)[1])
+    kinds, persons, positions, shifts = {}, {}, {}, {}
+    logs, duty, on_duty, changes = [], [], [], defaultdict(dict)
+
+    def code(dictionary, value):
+        return dictionary.setdefault(value, len(dictionary))
+
+    def read_logs(session, family, parent, status, fk, facility, group):
+        values = {value: i for i, value in enumerate(condition_values(family), start=1)}
+        for log_id, group_value, log_date, shift in session.execute(
+            sa.select(parent.id, group, parent.log_date, parent.shift)
+            .where(parent.log_date >= start_date, parent.log_date <= end_date)
+        ):
+            logs.append(((family, log_id), (family, group_value), log_date, shift))
+        # Setiap sumber menyimpan keyframe sendiri di awal bulannya (lihat split_month_for_archive)
+        for log_id, facility_id, condition in session.execute(
+            sa.select(fk, facility, status.condition)
+            .join(parent, parent.id == fk)
+            .where(parent.log_date >= start_date, parent.log_date <= end_date)
+        ):
+            changes[family, log_id][facility_id] = values.get(condition, 0)
+
+    for session in _source_sessions(start_date, end_date):
+        read_logs(session, 'operasi', LogbookEntry, FacilityStatus, FacilityStatus.logbook_id,
+                  FacilityStatus.facility_id, LogbookEntry.logbook_type)
+        for row in session.execute(_personal_slots_stmt(start_date, end_date)):
+            duty.append((row.log_id, row.position_id, row.slot, row.name, row.position_name,
+                         parse_duration(row.header)))
+        for log_id, name in session.execute(
+            sa.select(atc_duty_association.c.logbook_entry_id, ATCPersonnel.name)
+            .join(ATCPersonnel, ATCPersonnel.id == atc_duty_association.c.atc_personnel_id)
+            .join(LogbookEntry, LogbookEntry.id == atc_duty_association.c.logbook_entry_id)
+            .where(LogbookEntry.log_date >= start_date, LogbookEntry.log_date <= end_date)
+        ):
+            on_duty.append((log_id, name))
+        for airport_code in _cnsd_sources(session):
+            with use_cnsd_shard(airport_code):
+                read_logs(session, 'cnsd', CNSDLogbook, CNSDFacilityStatus, CNSDFacilityStatus.cnsd_logbook_id,
+                          CNSDFacilityStatus.cnsd_facility_id, CNSDLogbook.airport)
+
+    # Urutan rekonstruksi kondisi: per tipe/bandara, lalu (tanggal, shift, id) seperti facility_state
+    logs.sort(key=lambda log: (log[1], log[2], shift_rank(log[3]), log[0][1]))
+    columns = {(table, name): array(typecode) for table, spec in SCHEMA.items() for name, typecode in spec.items()}
+    index, state, current_kind = {}, {}, None
+    for i, (key, kind, log_date, shift) in enumerate(logs):
+        index[key] = i
+        columns['logs', 'kind'].append(code(kinds, kind))
+        columns['logs', 'day'].append(log_date.day)
+        columns['logs', 'shift'].append(code(shifts, shift))
+        if kind != current_kind:
+            state, current_kind = {}, kind
+        for facility_id, condition in changes.get(key, {}).items():
+            if condition:
+                state[facility_id] = condition
+            else:
+                state.pop(facility_id, None)
+        for facility_id, condition in sorted(state.items()):
+            columns['conditions', 'log'].append(i)
+            columns['conditions', 'facility'].append(facility_id)
+            columns['conditions', 'condition'].append(condition)
+
+    # Urutan sama dengan pass database logbook personal: logbook, posisi, lalu slot
+    for log_id, _, _, name, position_name, duration in sorted(duty, key=lambda row: row[:3]):
+        columns['duty', 'log'].append(index['operasi', log_id])
+        columns['duty', 'person'].append(code(persons, name))
+        columns['duty', 'position'].append(code(positions, position_name))
+        columns['duty', 'minutes'].append(int(duration.total_seconds()) // 60)
+    for log_id, name in on_duty:
+        columns['on_duty', 'log'].append(index['operasi', log_id])
+        columns['on_duty', 'person'].append(code(persons, name))
+
+    dictionaries = {'kinds': [list(kind) for kind in kinds], 'persons': list(persons),
+                    'positions': list(positions), 'shifts': list(shifts)}
+    return MonthData(year, month, dictionaries, columns)
+
+
+# --- MENULIS & MEMBACA SNAPSHOT ---
+
+def write_snapshot(data, path):
+    """Menulis MonthData ke file snapshot secara atomik (file sementara lalu os.replace)."""
+    layout, blobs, offset = {}, [], 0
+    for (table, name), values in data.columns.items():
+        raw = values.tobytes() if sys.byteorder == 'little' else _swapped(values).tobytes()
+        layout[f'{table}.{name}'] = [offset, len(values), values.typecode]
+        blobs.append(raw + b'\x00' * (-len(raw) % ALIGNMENT))
+        offset += len(blobs[-1])
+    header = json.dumps({
+        'format': SNAPSHOT_FORMAT, 'year': data.year, 'month': data.month, 'version': data.version,
+        'built_at': datetime.now().isoformat(timespec='seconds'), 'dictionaries': data.dictionaries,
+        'rows': {table: len(data.columns[table, next(iter(spec))]) for table, spec in SCHEMA.items()},
+        'columns': layout,
+    }, ensure_ascii=False).encode('utf-8')
+    prefix = MAGIC + struct.pack('<Q', len(header)) + header
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(prefix + b'\x00' * (-len(prefix) % ALIGNMENT))
+        for blob in blobs:
+            f.write(blob)
+    os.replace(temporary, path)
+
+
+def _swapped(values):
+    values = array(values.typecode, values)
+    values.byteswap()
+    return values
+
+
+# Snapshot yang sudah di-mmap per proses: path -> ((mtime, ukuran), MonthSnapshot); file yang dibangun ulang
+# (os.replace) punya mtime baru sehingga dibuka ulang, mmap lama dilepas saat tidak dipakai lagi
+_open_snapshots = {}
+
+
+def open_snapshot(year, month):
+    """MonthSnapshot bulan itu (dari cache proses), atau None jika belum pernah dibangun."""
+    path = snapshot_path(year, month)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _open_snapshots.get(path)
+    if cached is None or cached[0] != signature:
+        cached = _open_snapshots[path] = (signature, MonthSnapshot(path))
+    return cached[1]
+
+
+def fresh_snapshots(months):
+    """{(tahun, bulan): MonthSnapshot} untuk bulan-bulan yang snapshot-nya masih sama dengan versi datanya."""
+    if not current_app.config.get('REPORT_SNAPSHOTS_ENABLED', False) or not months:
+        return {}
+    # Versi data hanya dibaca untuk bulan yang punya file snapshot
+    opened = {month: snapshot for month in months
+              if (snapshot := open_snapshot(*month)) is not None and snapshot.meta['format'] == SNAPSHOT_FORMAT}
+    versions = month_versions(opened) if opened else {}
+    return {month: snapshot for month, snapshot in opened.items() if snapshot.version == versions[month_key(*month)]}
+
+
+def build_snapshot(year, month):
+    """Membangun (ulang) snapshot satu bulan; versi dibaca lebih dulu sehingga tulisan selama build membuatnya usang."""
+    version = month_versions([(year, month)])[month_key(year, month)]
+    data = collect_month(year, month)
+    data.version = version
+    write_snapshot(data, snapshot_path(year, month))
+    return data
+
+
+# --- AGREGASI DARI KOLOM ---
+
+def month_recap(data):
+    """{nama: (hari on duty, menit slot posisi)} untuk satu bulan; sama dengan pass rekap personnel_recap."""
+    persons = data.dictionary('persons')
+    duty_person, minutes = data.column('duty', 'person'), data.column('duty', 'minutes')
+    on_duty_person, on_duty_log = data.column('on_duty', 'person'), data.column('on_duty', 'log')
+    log_day = data.column('logs', 'day')
+    if np is not None:
+        total_minutes = np.bincount(duty_person, weights=minutes, minlength=len(persons)).round().astype(np.int64)
+        # Pasangan unik (personel, tanggal) dikodekan sebagai personel * 32 + tanggal
+        pairs = np.unique(on_duty_person.astype(np.int64) * 32 + log_day[on_duty_log])
+        days = np.bincount(pairs // 32, minlength=len(persons))
+    else:
+        total_minutes, days = [0] * len(persons), [0] * len(persons)
+        for person, value in zip(duty_person, minutes):
+            total_minutes[person] += value
+        for person, _ in {(person, log_day[log]) for person, log in zip(on_duty_person, on_duty_log)}:
+            days[person] += 1
+    return {name: (int(days[i]), int(total_minutes[i])) for i, name in enumerate(persons)
+            if days[i] or total_minutes[i]}
+
+
+def month_personal_records(data, names):
+    """{nama: [record slot]} bentuk record logbook personal (date, shift, unit, position, duration)."""
+    codes = {code: name for code, name in enumerate(data.dictionary('persons')) if name in set(names)}
+    persons = data.column('duty', 'person')
+    if np is not None:
+        rows = np.flatnonzero(np.isin(persons, np.fromiter(codes, dtype=np.int64, count=len(codes)))).tolist()
+    else:
+        rows = [i for i, person in enumerate(persons) if person in codes]
+    kinds, shifts, positions = data.dictionary('kinds'), data.dictionary('shifts'), data.dictionary('positions')
+    duty_log, duty_position, minutes = data.column('duty', 'log'), data.column('duty', 'position'), \
+        data.column('duty', 'minutes')
+    log_kind, log_day, log_shift = data.column('logs', 'kind'), data.column('logs', 'day'), data.column('logs', 'shift')
+    records = defaultdict(list)
+    for i in rows:
+        log = int(duty_log[i])
+        records[codes[int(persons[i])]].append({
+            'date': date(data.year, data.month, int(log_day[log])), 'shift': shifts[log_shift[log]],
+            'unit': kinds[log_kind[log]][1], 'position': positions[duty_position[i]],
+            'duration': timedelta(minutes=int(minutes[i])),
+        })
+    return records
+
+
+def month_availability(data):
+    """{(keluarga, tipe/bandara): {facility_id: Counter(kode kondisi -> jumlah logbook)}} satu bulan."""
+    kinds = data.dictionary('kinds')
+    log, facility, condition = data.column('conditions', 'log'), data.column('conditions', 'facility'), \
+        data.column('conditions', 'condition')
+    kind_of_log = data.column('logs', 'kind')
+    counts = defaultdict(lambda: defaultdict(Counter))
+    if np is not None:
+        # Satu kunci int64 per (kind, fasilitas, kondisi): kind << 40 | fasilitas << 8 | kondisi
+        keys = (kind_of_log[log].astype(np.int64) << 40) | (facility.astype(np.int64) << 8) | condition
+        unique, totals = np.unique(keys, return_counts=True)
+        triples = zip((unique >> 40).tolist(), ((unique >> 8) & 0xFFFFFFFF).tolist(), (unique & 0xFF).tolist(),
+                      totals.tolist())
+    else:
+        tally = Counter(zip((kind_of_log[i] for i in log), facility, condition))
+        triples = ((kind, facility_id, code, total) for (kind, facility_id, code), total in tally.items())
+    for kind, facility_id, code, total in triples:
+        counts[tuple(kinds[kind])][facility_id][code] = total
+    return counts
+
+
+def month_data(year, month):
+    """Snapshot segar bulan itu, atau kolom yang sama dibaca langsung dari database."""
+    return fresh_snapshots([(year, month)]).get((year, month)) or collect_month(year, month)
+
+
+def facility_availability(year, month, family, group):
+    """Ketersediaan fasilitas satu tipe logbook (TWR/APP) atau bandara CNSD dalam satu bulan.
+
+    Setiap logbook dihitung dengan kondisi lengkap fasilitasnya (hasil carry-forward); fasilitas tersedia jika
+    kondisinya bukan U/S (operasi) atau Rusak (CNSD). Mengembalikan [{'facility_id', 'counts' {kondisi: jumlah},
+    'reports', 'available', 'availability' (persen)}] urut facility_id.
+    """
+    values = condition_values(family)
+    rows = []
+    for facility_id, counts in sorted(month_availability(month_data(year, month)).get((family, group), {}).items()):
+        by_value = {values[code - 1]: total for code, total in counts.items()}
+        reports = sum(by_value.values())
+        available = sum(total for value, total in by_value.items() if value not in UNAVAILABLE)
+        rows.append({'facility_id': facility_id, 'counts': by_value, 'reports': reports, 'available': available,
+                     'availability': round(available * 100 / reports, 2) if reports else None})
+    return rows
+
+
+# --- PERINTAH & INISIALISASI ---
+
+def data_months():
+    """Semua (tahun, bulan) yang punya logbook operasi atau CNSD, di database hot, shard, dan arsip."""
+    months = set()
+    for session in _source_sessions(None, None):
+        for parent, sources in ((LogbookEntry, [None]), (CNSDLogbook, _cnsd_sources(session))):
+            for airport_code in sources:
+                with use_cnsd_shard(airport_code):
+                    months.update(session.execute(sa.select(sa.func.strftime('%Y-%m', parent.log_date)).distinct())
+                                  .scalars())
+    return sorted(tuple(int(part) for part in month.split('-')) for month in months)
+
+
+@click.command('build-report-snapshots')
+@click.option('--month', 'months', multiple=True, type=click.DateTime(formats=['%Y-%m']),
+              help='Bulan yang dibangun (YYYY-MM, boleh diulang); default: semua bulan berdata.')
+@click.option('--force', is_flag=True, help='Bangun ulang meskipun snapshot masih segar.')
+@with_appcontext
+def build_report_snapshots_command(months, force):
+    """Membangun snapshot kolumnar per bulan untuk rekap, logbook personal, dan ketersediaan fasilitas.
+
+    Jalankan berkala (mis. cron tiap malam); bulan yang snapshot-nya masih segar dilewati.
+    """
+    months = [(value.year, value.month) for value in months] or data_months()
+    fresh = {} if force else fresh_snapshots(months) if current_app.config['REPORT_SNAPSHOTS_ENABLED'] else {}
+    for year, month in months:
+        if (year, month) in fresh:
+            click.echo(f"{month_key(year, month)}: masih segar (versi {fresh[year, month].version}).")
+            continue
+        data = build_snapshot(year, month)
+        rows = ', '.join(f"{table} {len(data.columns[table, next(iter(spec))])}" for table, spec in SCHEMA.items())
+        click.echo(f"{month_key(year, month)}: versi {data.version}, {rows}.")
+    db.session.rollback()
+
+
+def init_report_snapshots(app):
+    """Memasang penanda bulan berubah pada session agar snapshot yang usang tidak dipakai laporan."""
+    if not sa.event.contains(RoutingSession, 'after_flush', _collect_months):
+        sa.event.listen(RoutingSession, 'after_flush', _collect_months)
+        sa.event.listen(RoutingSession, 'before_commit', _bump_months)
+        sa.event.listen(RoutingSession, 'after_soft_rollback', _discard_months)
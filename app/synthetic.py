@@ -0,0 +1,146 @@
+# app/synthetic.py
+
+import random
+from datetime import date, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from .models import User, Facility, FacilityApp, CNSDFacility, ATCPersonnel, FacilityCondition
+from .importer import ATC_POSITIONS, import_records
+
+# Jam dinas tiap shift; setiap shift dibagi menjadi 6 slot posisi ATC
+SHIFT_HOURS = [('Pagi', 7, 6), ('Siang', 13, 6), ('Malam', 19, 12)]
+
+CONDITION_WEIGHTS = {
+    'default': ([FacilityCondition.GOOD, FacilityCondition.FAIR, FacilityCondition.POOR, FacilityCondition.UNSERVICEABLE],
+                [0.94, 0.03, 0.01, 0.02]),
+    'readability': ([FacilityCondition.READABLE_5, FacilityCondition.READABLE_4, FacilityCondition.READABLE_3],
+                    [0.95, 0.04, 0.01]),
+}
+OPERATIONAL_EVENTS = [
+    'Runway inspection completed', 'ILS flight check coordination', 'Bird activity reported on RWY 11',
+    'NOTAM received and distributed', 'Handover with APP completed', 'VVIP movement coordination',
+    'Power failure, switched to UPS', 'Weather deterioration, visibility reduced',
+]
+CNSD_ACTIVITIES = [
+    'Pengecekan rutin peralatan', 'Pemeliharaan preventif', 'Restart server ATIS',
+    'Koordinasi dengan BMKG', 'Penggantian UPS battery', 'Flight check ILS',
+]
+
+
+def _slot_headers(start_hour, length_hours):
+    step = length_hours // 6
+    headers = []
+    for i in range(6):
+        start = (start_hour + i * step) % 24
+        end = (start_hour + (i + 1) * step) % 24
+        headers.append(f"{start:02d}:00-{end:02d}:00")
+    return headers
+
+
+def _facility_key(facility, detail, ambiguous):
+    return f"{facility.name} [{detail or ''}]" if facility.name in ambiguous else facility.name
+
+
+def _reference_data():
+    """Nama fasilitas dan personel sesuai format impor, diambil dari data referensi di database."""
+    def keys(facilities, detail_attr):
+        names = [f.name for f in facilities]
+        ambiguous = {n for n in names if names.count(n) > 1}
+        return [(_facility_key(f, getattr(f, detail_attr), ambiguous), f) for f in facilities]
+
+    return {
+        'TWR': keys(Facility.query.order_by(Facility.id).all(), 'remark'),
+        'APP': keys(FacilityApp.query.order_by(FacilityApp.id).all(), 'remark'),
+        'CNSD': {
+            code: [(f"{f.name} [{f.sub_name or ''}]", f)
+                   for f in CNSDFacility.query.filter_by(airport_code=code).order_by(CNSDFacility.id)]
+            for code in current_app.config['AIRPORT_PASSWORDS']
+        },
+        'personnel': [p.name for p in ATCPersonnel.query.order_by(ATCPersonnel.name).all()],
+    }
+
+
+def _condition_for(rng, facility):
+    kind = 'default' if ('Support' in facility.category or 'Lighting' in facility.category
+                         or facility.category == 'FACILITIES') else 'readability'
+    choices, weights = CONDITION_WEIGHTS[kind]
+    return rng.choices(choices, weights)[0].value
+
+
+def generate_records(days, start_date, seed=42):
+    """Menghasilkan record logbook sintetis (format importer) secara deterministik untuk `days` hari.
+
+    Setiap hari berisi 3 shift untuk TWR, APP, dan keempat bandara CNSD.
+    """
+    rng = random.Random(seed)
+    refs = _reference_data()
+    roster = refs['personnel']
+
+    for day_offset in range(days):
+        log_date = (start_date + timedelta(days=day_offset)).isoformat()
+        for shift, start_hour, length in SHIFT_HOURS:
+            headers = _slot_headers(start_hour, length)
+            for kind in ('TWR', 'APP'):
+                team = rng.sample(roster, 6)
+                positions = {}
+                for position_name in ATC_POSITIONS[kind]:
+                    positions[position_name] = [rng.choice(team) for _ in range(6)]
+                yield {
+                    'kind': kind,
+                    'log_date': log_date,
+                    'shift': shift,
+                    'notam': rng.choice([None, None, 'A0123/24 RWY 11/29 CLSD DUE MAINT 1700-2100 UTC',
+                                         'B0456/24 ILS RWY 11 U/S']),
+                    'personnel': team,
+                    'position_headers': headers,
+                    'positions': positions,
+                    'facilities': [{'facility': key, 'condition': _condition_for(rng, facility), 'notes': None}
+                                   for key, facility in refs[kind]],
+                    'operational_logs': [
+                        {'time': f"{(start_hour + rng.randrange(length)) % 24:02d}:{rng.randrange(60):02d}",
+                         'description': rng.choice(OPERATIONAL_EVENTS), 'remarks': None}
+                        for _ in range(rng.randint(1, 5))
+                    ],
+                }
+            for airport_code, facilities in refs['CNSD'].items():
+                yield {
+                    'kind': 'CNSD',
+                    'airport': airport_code,
+                    'log_date': log_date,
+                    'shift': shift.upper(),
+                    'personnel': [f"Teknisi {airport_code} {rng.randint(1, 12)}" for _ in range(rng.randint(2, 4))],
+                    'facilities': {key: ('Rusak' if rng.random() < 0.02 else 'Baik') for key, _ in facilities},
+                    'activities': [
+                        {'time': f"{(start_hour + rng.randrange(length)) % 24:02d}:{rng.randrange(60):02d}",
+                         'description': rng.choice(CNSD_ACTIVITIES)}
+                        for _ in range(rng.randint(0, 3))
+                    ],
+                }
+
+
+def seed_synthetic_data(days, start_date=None, seed=42, echo=print):
+    """Mengisi database dengan data sintetis; tanggal berakhir pada hari ini jika start_date kosong."""
+    start_date = start_date or (date.today() - timedelta(days=days - 1))
+    default_users = {
+        'operasi': User.query.filter_by(division='operasi').first().id,
+        'teknik': User.query.filter_by(division='teknik').first().id,
+    }
+    return import_records(
+        generate_records(days, start_date, seed), f"synthetic:{seed}:{start_date}:{days}",
+        batch_size=5000, default_users=default_users, echo=echo
+    )
+
+
+@click.command('seed-synthetic')
+@click.option('--days', default=365, show_default=True, help='Jumlah hari data yang dibuat.')
+@click.option('--start', 'start_date', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Tanggal awal (default: berakhir hari ini).')
+@click.option('--seed', default=42, show_default=True, help='Seed acak; seed yang sama menghasilkan data yang sama.')
+@with_appcontext
+def seed_synthetic_command(days, start_date, seed):
+    """Mengisi database dengan logbook sintetis yang realistis (untuk benchmark/pengujian)."""
+    stats = seed_synthetic_data(days, start_date.date() if start_date else None, seed, echo=click.echo)
+    click.echo(f"Selesai: {stats['imported']} logbook sintetis, {stats['rows']} baris.")
@@ -0,0 +1,44 @@
+# app/templating.py
+
+import os
+
+from flask import current_app
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from .reference import reference_version
+
+
+class FragmentCacheExtension(Extension):
+    """Tag `{% cache 'nama', kunci... %}...{% endcache %}` untuk blok HTML yang hanya bergantung pada data referensi.
+
+    Hasil render disimpan per proses dengan kunci (versi data referensi, nama, kunci...), jadi isi
+    blok tidak boleh memakai data per request/per logbook (nilai terpilih, pesan flash, dsb.).
+    """
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render_cached', [nodes.List(args)]), [], [], body).set_lineno(lineno)
+
+    def _render_cached(self, key_parts, caller):
+        if not current_app.config.get('TEMPLATE_FRAGMENT_CACHE', True):
+            return caller()
+        cache = current_app.extensions.setdefault('fragment_cache', {})
+        key = (reference_version(), *key_parts)
+        if (fragment := cache.get(key)) is None:
+            fragment = cache[key] = str(caller())
+        return Markup(fragment)
+
+
+def init_templating(app):
+    """Memasang cache bytecode Jinja di folder instance dan tag {% cache %} untuk fragmen template."""
+    cache_dir = app.config.get('JINJA_BYTECODE_CACHE_DIR') or os.path.join(app.instance_path, 'jinja_cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    app.jinja_env.add_extension(FragmentCacheExtension)
@@ -0,0 +1,256 @@
+# app/textstore.py
+
+import hashlib
+import os
+from datetime import datetime
+
+import click
+import sqlalchemy as sa
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from flask import current_app
+from flask.cli import with_appcontext
+
+from .models import db, LogbookEntry, OperationalLog, TextBlob, StoredText
+from .shardrouting import RoutingSession
+
+# Atribut teks yang disimpan di text_blob: {model: ((atribut, kolom id), ...)}
+TEXT_FIELDS = {
+    LogbookEntry: (('notam', 'notam_id'),),
+    OperationalLog: (('remarks', 'remarks_id'),),
+}
+# Jumlah hash per SELECT ... WHERE hash IN (...)
+LOOKUP_CHUNK = 500
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+# --- PENYIMPANAN TEKS ---
+
+def intern_texts(connection, texts):
+    """{teks: id text_blob} untuk setiap teks yang tidak kosong; teks yang belum ada disisipkan sekali per hash.
+
+    connection boleh Session atau Connection. Biasanya satu SELECT; teks baru menambah satu INSERT (executemany)
+    dan satu SELECT untuk id-nya. ON CONFLICT DO NOTHING menangani teks sama yang disisipkan request lain.
+    """
+    by_hash = {text_hash(text): text for text in set(texts) if text}
+    ids = {}
+
+    def lookup(hashes):
+        for start in range(0, len(hashes), LOOKUP_CHUNK):
+            chunk = hashes[start:start + LOOKUP_CHUNK]
+            ids.update(connection.execute(sa.select(TextBlob.hash, TextBlob.id).where(TextBlob.hash.in_(chunk))).all())
+
+    lookup(list(by_hash))
+    if missing := [digest for digest in by_hash if digest not in ids]:
+        connection.execute(sqlite_insert(TextBlob).on_conflict_do_nothing(index_elements=['hash']),
+                           [{'hash': digest, 'content': by_hash[digest]} for digest in missing])
+        lookup(missing)
+    return {text: ids[digest] for digest, text in by_hash.items()}
+
+
+def intern_rows(connection, model, rows):
+    """Mengganti atribut teks di baris insert Core (dict, mis. dari importer) dengan kolom id text_blob-nya."""
+    fields = TEXT_FIELDS[model]
+    ids = intern_texts(connection, [row.get(attr) for row in rows for attr, _ in fields])
+    for row in rows:
+        for attr, id_column in fields:
+            row[id_column] = ids.get(row.pop(attr, None))
+    return rows
+
+
+def _intern_assigned_texts(session, flush_context, instances):
+    """before_flush: notam/remarks yang di-set pada objek baru atau yang diedit diubah menjadi id text_blob."""
+    assigned = []
+    for obj in [*session.new, *session.dirty]:
+        for attr, id_column in TEXT_FIELDS.get(type(obj), ()):
+            history = sa.inspect(obj).attrs[attr].history
+            if history.added:
+                assigned.append((obj, attr, id_column, history.added[0]))
+    if not assigned:
+        return
+    with session.no_autoflush:
+        ids = intern_texts(session, [text for _, _, _, text in assigned])
+    for obj, _, id_column, text in assigned:
+        setattr(obj, id_column, ids.get(text))
+    legacy = current_app.extensions.get('legacy_text_columns', ())
+    session.info.setdefault('legacy_texts', []).extend(
+        (obj, attr, text) for obj, attr, _, text in assigned if (obj.__tablename__, attr) in legacy)
+
+
+def _write_legacy_texts(session, flush_context):
+    """after_flush: selama kolom teks lama masih ada, isinya ikut diperbarui (id baris baru sudah terisi di sini)."""
+    for obj, attr, text in session.info.pop('legacy_texts', ()):
+        session.execute(sa.text(f'UPDATE "{obj.__tablename__}" SET "{attr}" = :text WHERE id = :id'),
+                        {'text': text, 'id': obj.id}, bind_arguments={'mapper': sa.inspect(type(obj))})
+
+
+# --- MIGRASI KOLOM TEKS LAMA ---
+# Startup hanya menambah kolom id dan mengisinya dari kolom teks lama (notam, remarks). Kolom lama tetap ada dan
+# ikut diisi saat logbook dibuat/diedit lewat ORM sampai `flask migrate-texts --drop-old-columns` dijalankan,
+# jadi versi lama masih bisa dipakai lagi (setelah `flask migrate-texts --restore-old-columns` untuk logbook
+# hasil import-logbooks, yang ditulis lewat Core).
+
+def _declared_columns(conn, table):
+    return {row[1] for row in conn.exec_driver_sql(f'PRAGMA main.table_info("{table.name}")')}
+
+
+def _legacy_columns(conn):
+    """[(tabel, atribut, kolom id)] untuk kolom teks lama yang masih ada di database ini."""
+    return [(model.__table__, attr, id_column) for model, fields in TEXT_FIELDS.items()
+            for attr, id_column in fields if attr in _declared_columns(conn, model.__table__)]
+
+
+def backfill_text_ids(engine):
+    """Menambah kolom id text_blob bila belum ada dan mengisinya dari kolom teks lama; jumlah baris yang diisi.
+
+    Hanya baris yang id-nya masih kosong yang diproses (mis. logbook yang ditulis versi lama setelah rollback),
+    jadi aman dijalankan di setiap startup. Teks yang sama di banyak logbook hanya disimpan sekali.
+    """
+    moved = 0
+    with engine.connect() as conn:
+        TextBlob.__table__.create(conn, checkfirst=True)
+        for table, attr, id_column in _legacy_columns(conn):
+            if id_column not in _declared_columns(conn, table):
+                conn.exec_driver_sql(f'ALTER TABLE main."{table.name}" ADD COLUMN "{id_column}" INTEGER '
+                                     f'REFERENCES text_blob (id)')
+            rows = conn.exec_driver_sql(f'SELECT id, "{attr}" FROM main."{table.name}" WHERE "{id_column}" IS NULL '
+                                        f'AND "{attr}" IS NOT NULL AND "{attr}" != \'\'').all()
+            if rows:
+                ids = intern_texts(conn, [text for _, text in rows])
+                conn.execute(table.update().where(table.c.id == sa.bindparam('row_id'))
+                             .values({id_column: sa.bindparam('text_id')}),
+                             [{'row_id': row_id, 'text_id': ids[text]} for row_id, text in rows])
+                moved += len(rows)
+        conn.commit()
+    return moved
+
+
+def restore_old_columns(engine):
+    """Mengisi kolom teks lama dari text_blob untuk baris yang ditulis versi baru (sebelum rollback ke versi lama)."""
+    restored = 0
+    with engine.connect() as conn:
+        for table, attr, id_column in _legacy_columns(conn):
+            rows = conn.execute(sa.select(table.c.id, TextBlob.content)
+                                .join(TextBlob, TextBlob.id == table.c[id_column])
+                                .where(sa.text(f'"{table.name}"."{attr}" IS NULL'))).all()
+            if rows:
+                conn.exec_driver_sql(f'UPDATE main."{table.name}" SET "{attr}" = ? WHERE id = ?',
+                                     [(text, row_id) for row_id, text in rows])
+            restored += len(rows)
+        conn.commit()
+    return restored
+
+
+def drop_old_columns(engine, backup=True):
+    """Menghapus kolom teks lama setelah backfill terakhir; mengembalikan path cadangan (None jika tidak dibuat).
+
+    Tidak bisa di-rollback tanpa cadangan: sebelumnya database disalin utuh dengan VACUUM INTO.
+    """
+    backfill_text_ids(engine)
+    with engine.connect() as conn:
+        legacy = _legacy_columns(conn)
+        if not legacy:
+            return None
+        backup_path = None
+        if backup:
+            backup_path = f"{engine.url.database}.{datetime.now():%Y%m%d%H%M%S}.bak"
+            conn.exec_driver_sql('VACUUM INTO ?', (backup_path,))
+        for table, attr, _ in legacy:
+            conn.exec_driver_sql(f'ALTER TABLE main."{table.name}" DROP COLUMN "{attr}"')
+        conn.commit()
+    return backup_path
+
+
+def prune_texts(connection):
+    """Menghapus teks yang tidak lagi dirujuk logbook di database ini; mengembalikan jumlah baris yang dihapus."""
+    referenced = sa.union(*(sa.select(model.__table__.c[id_column]).where(model.__table__.c[id_column].isnot(None))
+                            for model, fields in TEXT_FIELDS.items() for _, id_column in fields))
+    return connection.execute(sa.delete(TextBlob).where(TextBlob.id.not_in(referenced))).rowcount
+
+
+def init_text_store(app):
+    """Dipanggil saat startup setelah create_all: kolom id text_blob di database hot dan arsip diisi dari kolom teks
+    lama (tanpa menghapusnya), lalu penanda before_flush dipasang agar notam/remarks yang di-set tersimpan lewat
+    text_blob."""
+    from .archive import archive_path, archives_in_range
+
+    StoredText.compress_min_bytes = app.config['TEXT_COMPRESS_MIN_BYTES']
+    if moved := backfill_text_ids(db.engine):
+        print(f"Teks NOTAM/remarks dipindah ke text_blob: {moved} baris.")
+    with db.engine.connect() as conn:
+        app.extensions['legacy_text_columns'] = {(table.name, attr) for table, attr, _ in _legacy_columns(conn)}
+    for archive in archives_in_range():
+        engine = sa.create_engine('sqlite:///' + archive_path(archive.filename))
+        if moved := backfill_text_ids(engine):
+            print(f"Teks NOTAM/remarks dipindah ke text_blob (arsip {archive.year}): {moved} baris.")
+        engine.dispose()
+    if not sa.event.contains(RoutingSession, 'before_flush', _intern_assigned_texts):
+        sa.event.listen(RoutingSession, 'before_flush', _intern_assigned_texts)
+        sa.event.listen(RoutingSession, 'after_flush', _write_legacy_texts)
+
+
+@click.command('dedupe-texts')
+@click.option('--archives', 'include_archives', is_flag=True, help='Ikut membersihkan database arsip per tahun.')
+@click.option('--vacuum', is_flag=True, help='VACUUM setiap database setelah dibersihkan agar ukuran file menyusut.')
+@with_appcontext
+def dedupe_texts_command(include_archives, vacuum):
+    """Menghapus teks NOTAM/remarks yang tidak lagi dirujuk (mis. setelah logbook diedit atau diarsipkan)."""
+    from .archive import archive_path, archives_in_range
+
+    engines = [('Database hot', db.engine)]
+    if include_archives:
+        engines += [(f"Arsip {archive.year}", sa.create_engine('sqlite:///' + archive_path(archive.filename)))
+                    for archive in archives_in_range()]
+    for label, engine in engines:
+        with engine.begin() as conn:
+            removed = prune_texts(conn)
+            remaining = conn.execute(sa.select(sa.func.count(TextBlob.id))).scalar()
+        click.echo(f"{label}: {removed} teks tidak dirujuk dihapus, {remaining} teks tersimpan.")
+        if vacuum:
+            before = os.path.getsize(engine.url.database)
+            with engine.connect() as conn:
+                conn.exec_driver_sql('VACUUM')
+            click.echo(f"  VACUUM: {before // 1024} KB -> {os.path.getsize(engine.url.database) // 1024} KB")
+        if engine is not db.engine:
+            engine.dispose()
+
+
+@click.command('migrate-texts')
+@click.option('--archives', 'include_archives', is_flag=True, help='Ikut memproses database arsip per tahun.')
+@click.option('--drop-old-columns', 'drop', is_flag=True,
+              help='Hapus kolom teks lama (notam, remarks); database dicadangkan dulu.')
+@click.option('--restore-old-columns', 'restore', is_flag=True,
+              help='Isi kolom teks lama dari text_blob sebelum rollback ke versi lama.')
+@click.option('--no-backup', is_flag=True, help='Jangan buat cadangan sebelum --drop-old-columns.')
+@with_appcontext
+def migrate_texts_command(include_archives, drop, restore, no_backup):
+    """Migrasi kolom teks NOTAM/remarks lama ke text_blob; tanpa opsi hanya mengisi kolom id (seperti startup).
+
+    Hentikan aplikasi sebelum --drop-old-columns: proses yang masih berjalan masih menulis ke kolom lama.
+    """
+    from .archive import archive_path, archives_in_range
+
+    if drop and restore:
+        raise click.UsageError('--drop-old-columns dan --restore-old-columns tidak bisa dipakai bersamaan.')
+    engines = [('Database hot', db.engine)]
+    if include_archives:
+        engines += [(f"Arsip {archive.year}", sa.create_engine('sqlite:///' + archive_path(archive.filename)))
+                    for archive in archives_in_range()]
+    for label, engine in engines:
+        if restore:
+            click.echo(f"{label}: {restore_old_columns(engine)} teks dikembalikan ke kolom lama.")
+        elif drop:
+            with engine.connect() as conn:
+                legacy = [f"{table.name}.{attr}" for table, attr, _ in _legacy_columns(conn)]
+            backup_path = drop_old_columns(engine, backup=not no_backup)
+            if not legacy:
+                click.echo(f"{label}: tidak ada kolom teks lama.")
+            else:
+                click.echo(f"{label}: kolom {', '.join(legacy)} dihapus"
+                           f"{f'; cadangan di {backup_path}' if backup_path else ''}.")
+        else:
+            click.echo(f"{label}: {backfill_text_ids(engine)} baris dipindah ke text_blob.")
+        if engine is not db.engine:
+            engine.dispose()
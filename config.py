@@ -26,3 +26,97 @@ class Config:
         'AdiSoemarmo': 'solo',
         'TunggulWulung': 'cilacap'
     }
+
+    # --- KONFIGURASI API JSON ---
+
+    # Kunci API (dipisah koma) untuk sistem lain yang membaca /api/v1 tanpa login (hanya baca; lihat SYNC_API_KEYS)
+    API_KEYS = {key.strip() for key in os.environ.get('API_KEYS', '').split(',') if key.strip()}
+
+    # --- KONFIGURASI INSTRUMENTASI ---
+
+    # Header Server-Timing, log per request, dan endpoint /metrics (Prometheus)
+    INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', '1') == '1'
+    # Alamat yang boleh membaca /metrics
+    METRICS_ALLOWED_HOSTS = {'127.0.0.1', '::1'}
+
+    # --- KONFIGURASI TEMPLATE ---
+
+    # Folder cache bytecode Jinja (default: instance/jinja_cache) agar worker tidak mengompilasi ulang template
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR')
+    # Cache fragmen {% cache %} untuk tabel fasilitas & daftar personel di form
+    TEMPLATE_FRAGMENT_CACHE = os.environ.get('TEMPLATE_FRAGMENT_CACHE', '1') == '1'
+
+    # --- KONFIGURASI KOMPRESI & ASET STATIS ---
+
+    # Kompresi brotli/gzip untuk respons HTML/JSON dan URL statis ber-fingerprint (?v=hash) dengan cache panjang
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', '1') == '1'
+
+    # --- KONFIGURASI ARSIP ---
+
+    # Folder database arsip per tahun dan batas umur logbook yang tetap di database hot
+    ARCHIVE_FOLDER = os.environ.get('ARCHIVE_FOLDER') or os.path.join(basedir, 'instance', 'archive')
+    ARCHIVE_HORIZON_DAYS = int(os.environ.get('ARCHIVE_HORIZON_DAYS', '730'))
+
+    # --- KONFIGURASI SHARD CNSD ---
+
+    # Logbook CNSD disimpan di satu database per bandara (instance/cnsd_shards/cnsd_<bandara>.db) agar commit
+    # pergantian shift di satu bandara tidak mengunci bandara lain. Setelah diaktifkan, pindahkan data lama
+    # dengan `flask shard-cnsd-logbooks`.
+    CNSD_SHARDING_ENABLED = os.environ.get('CNSD_SHARDING_ENABLED', '0') == '1'
+    CNSD_SHARD_FOLDER = os.environ.get('CNSD_SHARD_FOLDER') or os.path.join(basedir, 'instance', 'cnsd_shards')
+
+    # --- KONFIGURASI PDF LOGBOOK PERSONAL ---
+
+    # Jumlah proses yang merender PDF logbook personal seluruh personel secara paralel (unduhan ZIP & CLI)
+    PERSONAL_PDF_WORKERS = int(os.environ.get('PERSONAL_PDF_WORKERS', min(4, os.cpu_count() or 1)))
+
+    # --- KONFIGURASI PEMBARUAN LANGSUNG (SSE) ---
+
+    # Dashboard operasi & CNSD menerima logbook baru/berubah lewat Server-Sent Events. Setiap commit menulis
+    # ke tabel change_event yang dipolling satu thread per worker. Setiap klien SSE memakai satu thread/greenlet
+    # selama tersambung, jadi jalankan gunicorn dengan worker gthread atau gevent (lihat gunicorn.conf.py).
+    LIVE_UPDATES_ENABLED = os.environ.get('LIVE_UPDATES_ENABLED', '1') == '1'
+    LIVE_POLL_INTERVAL = float(os.environ.get('LIVE_POLL_INTERVAL', '1.0'))
+    LIVE_HEARTBEAT_SECONDS = int(os.environ.get('LIVE_HEARTBEAT_SECONDS', '15'))
+    # Stream ditutup berkala agar thread worker tidak tertahan klien yang sudah hilang; browser menyambung ulang
+    LIVE_STREAM_MAX_SECONDS = int(os.environ.get('LIVE_STREAM_MAX_SECONDS', '300'))
+    LIVE_EVENT_RETENTION_HOURS = int(os.environ.get('LIVE_EVENT_RETENTION_HOURS', '24'))
+
+    # --- KONFIGURASI BATAS WAKTU DINAS ---
+
+    # Batas jam dinas controller dalam jendela bergulir 24 jam, 7 hari, dan 28 hari (dari slot posisi logbook),
+    # istirahat minimum antar dinas, dan rasio batas yang mulai ditandai "mendekati batas"
+    DUTY_LIMIT_HOURS = {
+        '24h': float(os.environ.get('DUTY_LIMIT_24H_HOURS', '12')),
+        '7d': float(os.environ.get('DUTY_LIMIT_7D_HOURS', '50')),
+        '28d': float(os.environ.get('DUTY_LIMIT_28D_HOURS', '200')),
+    }
+    DUTY_MIN_REST_HOURS = float(os.environ.get('DUTY_MIN_REST_HOURS', '8'))
+    DUTY_WARNING_RATIO = float(os.environ.get('DUTY_WARNING_RATIO', '0.9'))
+
+    # --- KONFIGURASI SINKRONISASI OFFLINE ---
+
+    # Batch logbook dari bandara dengan koneksi tidak stabil (POST /api/v1/sync, JSON opsional gzip):
+    # jumlah logbook per batch dan ukuran body setelah dekompresi, termasuk paraf base64
+    SYNC_MAX_ITEMS = int(os.environ.get('SYNC_MAX_ITEMS', '50'))
+    SYNC_MAX_BYTES = int(os.environ.get('SYNC_MAX_BYTES', str(32 * 1024 * 1024)))
+    # Kunci API tulis untuk stasiun tanpa login (dipisah koma), masing-masing terikat ke satu pengguna pencatat
+    # dan, untuk logbook CNSD, satu bandara: "kunci=username@BANDARA" atau "kunci=username" (TWR/APP).
+    # Kunci API_KEYS hanya untuk baca dan ditolak di endpoint sync.
+    SYNC_API_KEYS = {key.strip(): scope.strip() for key, _, scope in
+                     (entry.partition('=') for entry in os.environ.get('SYNC_API_KEYS', '').split(','))
+                     if key.strip() and scope.strip()}
+
+    # --- KONFIGURASI SNAPSHOT LAPORAN ---
+
+    # Snapshot kolumnar per bulan (dibangun dengan `flask build-report-snapshots`, mis. tiap malam) dibaca lewat
+    # mmap oleh rekap personel, logbook personal, dan laporan ketersediaan fasilitas selama versi data bulan itu
+    # belum berubah; bulan tanpa snapshot segar tetap dihitung langsung dari database.
+    REPORT_SNAPSHOTS_ENABLED = os.environ.get('REPORT_SNAPSHOTS_ENABLED', '1') == '1'
+    REPORT_SNAPSHOT_FOLDER = os.environ.get('REPORT_SNAPSHOT_FOLDER') or os.path.join(basedir, 'instance', 'snapshots')
+
+    # --- KONFIGURASI PENYIMPANAN TEKS ---
+
+    # NOTAM dan remarks log operasional disimpan sekali per isi di tabel text_blob (app/textstore.py); teks
+    # yang panjangnya mencapai batas ini (byte) dikompresi zlib. 0 = tanpa kompresi.
+    TEXT_COMPRESS_MIN_BYTES = int(os.environ.get('TEXT_COMPRESS_MIN_BYTES', '512'))
@@ -0,0 +1,51 @@
+# gunicorn.conf.py
+"""Launcher produksi: gunicorn -c gunicorn.conf.py
+
+App dibuat sekali di proses master (preload_app), termasuk data referensi fasilitas & personel
+(lihat app/reference.py), lalu worker di-fork sehingga memori itu dibagi secara copy-on-write.
+Bandingkan pemakaian memorinya dengan: flask --app run memory-report --workers 4
+
+Variabel lingkungan:
+    GUNICORN_BIND            alamat listen (default 0.0.0.0:8000)
+    GUNICORN_WORKER_CLASS    sync, gthread (default), atau gevent (butuh paket gevent); stream SSE dashboard
+                             (app/live.py) memakai satu thread/greenlet per klien, jadi hindari sync
+    GUNICORN_WORKERS         jumlah worker (default 2 x CPU + 1)
+    GUNICORN_THREADS         thread per worker gthread (default 4)
+    GUNICORN_WORKER_CONNECTIONS  koneksi simultan per worker gevent (default 100)
+    GUNICORN_TIMEOUT         batas detik per request, cukup untuk render PDF (default 60)
+"""
+
+import multiprocessing
+import os
+
+WORKER_CLASSES = ('sync', 'gthread', 'gevent')
+
+wsgi_app = 'run:app'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+preload_app = True
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_class not in WORKER_CLASSES:
+    raise RuntimeError(f"GUNICORN_WORKER_CLASS harus salah satu dari {', '.join(WORKER_CLASSES)}.")
+if worker_class == 'gevent':
+    # Patch harus terjadi sebelum app di-preload; query SQLite tetap memblokir selama eksekusinya
+    from gevent import monkey
+    monkey.patch_all()
+
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', '4')) if worker_class == 'gthread' else 1
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '100'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '60'))
+accesslog = '-'
+
+
+def when_ready(server):
+    """Master: app sudah di-preload; tutup koneksi database dan bekukan objek sebelum worker pertama di-fork."""
+    from app.prefork import prepare_for_fork
+    prepare_for_fork(server.app.wsgi())
+
+
+def post_fork(server, worker):
+    """Worker: lepaskan pool koneksi warisan master tanpa menutupnya, worker membuka koneksinya sendiri."""
+    from app.prefork import dispose_engines
+    dispose_engines(server.app.wsgi(), close=False)
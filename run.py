@@ -4,6 +4,6 @@ from app import create_app
 app = create_app()
 
 if __name__ == '__main__':
-    # Menjalankan aplikasi dalam mode debug
+    # Menjalankan aplikasi dalam mode debug (untuk produksi: gunicorn -c gunicorn.conf.py)
     # Mode debug akan otomatis me-reload server jika ada perubahan kode
     app.run(debug=True)